@@ -1,11 +1,14 @@
 # Copyright Modal Labs 2023
 import asyncio
+import collections
 import dataclasses
 import inspect
+import os
 import textwrap
 import time
 import typing
 import warnings
+import weakref
 from collections.abc import AsyncGenerator, Sequence, Sized
 from dataclasses import dataclass
 from pathlib import PurePosixPath
@@ -51,10 +54,12 @@ from ._utils.function_utils import (
     _process_result,
     _stream_function_call_data,
     get_function_type,
+    get_input_data_format,
     is_async,
 )
 from ._utils.grpc_utils import RetryWarningMessage, retry_transient_errors
 from ._utils.mount_utils import validate_network_file_systems, validate_volumes
+from ._utils.trace_utils import current_span, traced
 from .call_graph import InputInfo, _reconstruct_call_graph
 from .client import _Client
 from .cloud_bucket_mount import _CloudBucketMount, cloud_bucket_mounts_to_proto
@@ -100,6 +105,12 @@ if TYPE_CHECKING:
     import modal.partial_function
 
 MAX_INTERNAL_FAILURE_COUNT = 8
+# Max number of FunctionCalls polled at the same time by `FunctionCall.gather` and `FunctionCall.as_completed`.
+# FunctionGetOutputs only accepts a single function call id, so each in-flight poll is its own long-poll RPC.
+FUNCTION_CALL_POLL_CONCURRENCY = 64
+# When there are more calls than poll slots, each call is polled for at most this many seconds before its
+# slot moves on to the next call, so every call is checked regularly and not only once its turn comes up.
+FUNCTION_CALL_POLL_TIMEOUT = 5.0
 TERMINAL_STATUSES = (
     api_pb2.GenericResult.GENERIC_STATUS_SUCCESS,
     api_pb2.GenericResult.GENERIC_STATUS_TERMINATED,
@@ -117,6 +128,117 @@ class _RetryContext:
     sync_client_retries_enabled: bool
 
 
+@dataclass
+class _OutputWaiter:
+    future: asyncio.Future
+    input_jwt: Optional[str]
+    clear_on_success: bool
+
+
+class _PolledFunctionCall:
+    def __init__(self):
+        self.waiters: dict[int, list[_OutputWaiter]] = {}
+        # Long polls in flight, as futures resolved when the poll returns, with the range of indices they cover.
+        self.polls_in_flight: dict[asyncio.Future, tuple[int, int]] = {}
+
+    def polls_covering(self, idx: int) -> list[asyncio.Future]:
+        return [poll for poll, (start, end) in self.polls_in_flight.items() if start <= idx <= end]
+
+
+class _OutputPoller:
+    """Long-polls `FunctionGetOutputs` on behalf of everyone waiting for outputs of the same function call.
+
+    Waiters only start a long poll if none in flight covers their input index, and they run it in their own
+    task (so a lone `.remote()` pays nothing extra). Every output a poll returns is handed to whoever waits for
+    that input index, and waiters that are still waiting after a poll returns start the next one.
+    """
+
+    def __init__(self, stub: ModalClientModal):
+        self.stub = stub
+        self._calls: dict[str, _PolledFunctionCall] = {}
+        # Stats, for tests and debugging.
+        self.polls = 0
+
+    async def get_output(
+        self, function_call_id: str, idx: int = 0, *, input_jwt: Optional[str] = None, clear_on_success: bool = False
+    ) -> api_pb2.FunctionGetOutputsItem:
+        """Waits indefinitely for the output of input `idx` of a function call."""
+        call = self._calls.setdefault(function_call_id, _PolledFunctionCall())
+        waiter = _OutputWaiter(asyncio.get_running_loop().create_future(), input_jwt, clear_on_success)
+        call.waiters.setdefault(idx, []).append(waiter)
+        try:
+            # Let waiters that join at the same time register first, so they share a poll.
+            await asyncio.sleep(0)
+            while not waiter.future.done():
+                polls = call.polls_covering(idx)
+                if not polls:
+                    await self._poll(function_call_id, call, idx)
+                else:
+                    await asyncio.wait([waiter.future, *polls], return_when=asyncio.FIRST_COMPLETED)
+            return waiter.future.result()
+        finally:
+            idx_waiters = call.waiters.get(idx, [])
+            if waiter in idx_waiters:
+                idx_waiters.remove(waiter)
+                if not idx_waiters:
+                    del call.waiters[idx]
+            if not call.waiters and self._calls.get(function_call_id) is call:
+                del self._calls[function_call_id]
+
+    async def _poll(self, function_call_id: str, call: _PolledFunctionCall, idx: int):
+        # Outputs aren't removed when they're fetched by index, so a poll only covers the run of consecutive
+        # indices around `idx` that are all still awaited. It only merges waiters that agree on whether to clear
+        # outputs on success, so that nobody's outputs are cleared unless they asked for it.
+        clear_on_success = all(w.clear_on_success for w in call.waiters[idx])
+
+        def mergeable(i: int) -> bool:
+            return i in call.waiters and all(w.clear_on_success == clear_on_success for w in call.waiters[i])
+
+        start, end = idx, idx
+        while mergeable(start - 1):
+            start -= 1
+        while mergeable(end + 1):
+            end += 1
+        poll = asyncio.get_running_loop().create_future()
+        call.polls_in_flight[poll] = (start, end)
+        try:
+            waiters = [w for i in range(start, end + 1) for w in call.waiters[i]]
+            request = api_pb2.FunctionGetOutputsRequest(
+                function_call_id=function_call_id,
+                timeout=OUTPUTS_TIMEOUT,
+                last_entry_id="0-0",
+                clear_on_success=clear_on_success,
+                requested_at=time.time(),
+                input_jwts=[w.input_jwt for w in waiters if w.input_jwt],
+                start_idx=start,
+                end_idx=end,
+            )
+            self.polls += 1
+            response: api_pb2.FunctionGetOutputsResponse = await retry_transient_errors(
+                self.stub.FunctionGetOutputs,
+                request,
+                attempt_timeout=OUTPUTS_TIMEOUT + ATTEMPT_TIMEOUT_GRACE_PERIOD,
+            )
+            current_span().add("output.polls")
+            for item in response.outputs:
+                # Deregister the waiters right away, so the next poll doesn't ask for this output again.
+                for waiter in call.waiters.pop(item.idx, []):
+                    if not waiter.future.done():
+                        waiter.future.set_result(item)
+        finally:
+            del call.polls_in_flight[poll]
+            poll.set_result(None)
+
+
+_output_pollers: "weakref.WeakKeyDictionary[ModalClientModal, _OutputPoller]" = weakref.WeakKeyDictionary()
+
+
+def _get_output_poller(stub: ModalClientModal) -> _OutputPoller:
+    if stub not in _output_pollers:
+        _output_pollers[stub] = _OutputPoller(stub)
+    return _output_pollers[stub]
+
+
 class _Invocation:
     """Internal client representation of a single-input call to a Modal Function or Generator"""
 
@@ -129,14 +251,17 @@ class _Invocation:
         client: _Client,
         retry_context: Optional[_RetryContext] = None,
         use_firewall: bool = False,
+        index: int = 0,
     ):
         self.stub = stub
         self.client = client  # Used by the deserializer.
         self.function_call_id = function_call_id  # TODO: remove and use only input_id
         self._retry_context = retry_context
         self._use_firewall = use_firewall
+        self.index = index  # Of the input within the function call, which only has one unless calls are batched.
 
     @staticmethod
+    @traced("modal.invocation.create")
     async def create(
         function: "_Function",
         args,
@@ -150,6 +275,7 @@ class _Invocation:
         stub = client.stub
 
         function_id = function.object_id
+        current_span().set_attribute("function.id", function_id)
         item = await _create_input(
             args,
             kwargs,
@@ -157,14 +283,48 @@ class _Invocation:
             max_object_size_bytes=function._max_object_size_bytes,
             method_name=function._use_method_name,
             function_call_invocation_type=function_call_invocation_type,
+            data_format=get_input_data_format(
+                function._use_firewall,
+                function._compress_data,
+                function._supports_pickle_oob,
+                function._supports_pickle_compressed,
+            ),
         )
+        [invocation] = await _Invocation._create_many(
+            function,
+            [item],
+            client=client,
+            parent_input_id=current_input_id() or "",
+            function_call_type=api_pb2.FUNCTION_CALL_TYPE_UNARY,
+            function_call_invocation_type=function_call_invocation_type,
+            from_spawn_map=from_spawn_map,
+        )
+        return invocation
+
+    @staticmethod
+    async def _create_many(
+        function: "_Function",
+        items: list[api_pb2.FunctionPutInputsItem],
+        *,
+        client: _Client,
+        parent_input_id: str,
+        function_call_type: "api_pb2.FunctionCallType.ValueType",
+        function_call_invocation_type: "api_pb2.FunctionCallInvocationType.ValueType",
+        from_spawn_map: bool = False,
+    ) -> list["_Invocation"]:
+        """Creates one function call for the inputs `items`, and an invocation for each of them."""
+        assert client.stub
+        stub = client.stub
+        function_id = function.object_id
 
         request = api_pb2.FunctionMapRequest(
             function_id=function_id,
-            parent_input_id=current_input_id() or "",
-            function_call_type=api_pb2.FUNCTION_CALL_TYPE_UNARY,
-            pipelined_inputs=[item],
+            parent_input_id=parent_input_id,
+            function_call_type=function_call_type,
+            pipelined_inputs=items,
             function_call_invocation_type=function_call_invocation_type,
+            # Every input of a batch of calls has its own caller, who gets its own output, error or not.
+            return_exceptions=len(items) > 1,
         )
 
         if from_spawn_map:
@@ -186,9 +346,24 @@ class _Invocation:
             response = await retry_transient_errors(client.stub.FunctionMap, request)
 
         function_call_id = response.function_call_id
+        current_span().set_attribute("function_call.id", function_call_id)
         if response.pipelined_inputs:
-            assert len(response.pipelined_inputs) == 1
-            input = response.pipelined_inputs[0]
+            assert len(response.pipelined_inputs) == len(items)
+            inputs = response.pipelined_inputs
+        else:
+            request_put = api_pb2.FunctionPutInputsRequest(
+                function_id=function_id, inputs=items, function_call_id=function_call_id
+            )
+            inputs_response: api_pb2.FunctionPutInputsResponse = await retry_transient_errors(
+                client.stub.FunctionPutInputs,
+                request_put,
+            )
+            inputs = inputs_response.inputs
+            if len(inputs) < len(items):
+                raise Exception("Could not create function call - the input queue seems to be full")
+
+        invocations = []
+        for item, input in zip(items, inputs):
             retry_context = _RetryContext(
                 function_call_invocation_type=function_call_invocation_type,
                 retry_policy=response.retry_policy,
@@ -198,29 +373,12 @@ class _Invocation:
                 item=item,
                 sync_client_retries_enabled=response.sync_client_retries_enabled,
             )
-            return _Invocation(stub, function_call_id, client, retry_context, use_firewall=function._use_firewall)
-
-        request_put = api_pb2.FunctionPutInputsRequest(
-            function_id=function_id, inputs=[item], function_call_id=function_call_id
-        )
-        inputs_response: api_pb2.FunctionPutInputsResponse = await retry_transient_errors(
-            client.stub.FunctionPutInputs,
-            request_put,
-        )
-        processed_inputs = inputs_response.inputs
-        if not processed_inputs:
-            raise Exception("Could not create function call - the input queue seems to be full")
-        input = inputs_response.inputs[0]
-        retry_context = _RetryContext(
-            function_call_invocation_type=function_call_invocation_type,
-            retry_policy=response.retry_policy,
-            function_call_jwt=response.function_call_jwt,
-            input_jwt=input.input_jwt,
-            input_id=input.input_id,
-            item=item,
-            sync_client_retries_enabled=response.sync_client_retries_enabled,
-        )
-        return _Invocation(stub, function_call_id, client, retry_context, use_firewall=function._use_firewall)
+            invocations.append(
+                _Invocation(
+                    stub, function_call_id, client, retry_context, use_firewall=function._use_firewall, index=item.idx
+                )
+            )
+        return invocations
 
     async def pop_function_call_outputs(
         self,
@@ -253,6 +411,7 @@ class _Invocation:
                 request,
                 attempt_timeout=backend_timeout + ATTEMPT_TIMEOUT_GRACE_PERIOD,
             )
+            current_span().add("output.polls")
 
             if len(response.outputs) > 0:
                 return response
@@ -276,18 +435,14 @@ class _Invocation:
             request,
         )
 
+    @traced("modal.get_outputs")
     async def _get_single_output(self, expected_jwt: Optional[str] = None) -> api_pb2.FunctionGetOutputsItem:
         # waits indefinitely for a single result for the function, and clear the outputs buffer after
-        item: api_pb2.FunctionGetOutputsItem = (
-            await self.pop_function_call_outputs(
-                index=0,
-                timeout=None,
-                clear_on_success=True,
-                input_jwts=[expected_jwt] if expected_jwt else None,
-            )
-        ).outputs[0]
-        return item
+        return await _get_output_poller(self.stub).get_output(
+            self.function_call_id, self.index, input_jwt=expected_jwt, clear_on_success=True
+        )
 
+    @traced("modal.invocation.run_function")
     async def run_function(self) -> Any:
         # Use retry logic only if retry policy is specified and
         ctx = self._retry_context
@@ -318,6 +473,7 @@ class _Invocation:
                     return await _process_result(item.result, item.data_format, self.stub, self.client, use_firewall=self._use_firewall)
                 await asyncio.sleep(delay_ms / 1000)
 
+            current_span().add("input.retries")
             await self._retry_input()
 
     async def poll_function(self, timeout: Optional[float] = None, *, index: int = 0):
@@ -427,6 +583,7 @@ class _InputPlaneInvocation:
         self._use_firewall = use_firewall
 
     @staticmethod
+    @traced("modal.invocation.create")
     async def create(
         function: "_Function",
         args,
@@ -439,6 +596,7 @@ class _InputPlaneInvocation:
         stub = await client.get_stub(input_plane_url)
 
         function_id = function.object_id
+        current_span().set_attribute("function.id", function_id)
         control_plane_stub = client.stub
         # Note: Blob upload is done on the control plane stub, not the input plane stub!
         input_item = await _create_input(
@@ -447,6 +605,12 @@ class _InputPlaneInvocation:
             control_plane_stub,
             max_object_size_bytes=function._max_object_size_bytes,
             method_name=function._use_method_name,
+            data_format=get_input_data_format(
+                function._use_firewall,
+                function._compress_data,
+                function._supports_pickle_oob,
+                function._supports_pickle_compressed,
+            ),
         )
 
         request = api_pb2.AttemptStartRequest(
@@ -463,6 +627,7 @@ class _InputPlaneInvocation:
             stub, attempt_token, client, input_item, function_id, response.retry_policy, input_plane_region, use_firewall=function._use_firewall
         )
 
+    @traced("modal.invocation.run_function")
     async def run_function(self) -> Any:
         # User errors including timeouts are managed by the user-specified retry policy.
         user_retry_manager = RetryManager(self.retry_policy)
@@ -482,6 +647,7 @@ class _InputPlaneInvocation:
                 attempt_timeout=OUTPUTS_TIMEOUT + ATTEMPT_TIMEOUT_GRACE_PERIOD,
                 metadata=metadata,
             )
+            current_span().add("output.polls")
 
             if await_response.HasField("output"):
                 if await_response.output.result.status in TERMINAL_STATUSES:
@@ -495,6 +661,7 @@ class _InputPlaneInvocation:
                     if internal_failure_count < MAX_INTERNAL_FAILURE_COUNT:
                         # For system failures on the server, we retry immediately,
                         # and the failure does not count towards the retry policy.
+                        current_span().add("input.retries")
                         self.attempt_token = await self._retry_input(metadata)
                         continue
 
@@ -510,6 +677,7 @@ class _InputPlaneInvocation:
                     )
                 await asyncio.sleep(delay_ms / 1000)
 
+            current_span().add("input.retries")
             await self._retry_input(metadata)
 
     async def _retry_input(self, metadata: list[tuple[str, str]]) -> str:
@@ -562,6 +730,102 @@ class _InputPlaneInvocation:
         return [("x-modal-input-plane-region", input_plane_region), ("x-modal-auth-token", token)]
 
 
+class _RemoteCallBatch:
+    def __init__(self):
+        self.items: list[api_pb2.FunctionPutInputsItem] = []
+        self.futures: list[asyncio.Future] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+
+
+class _RemoteCallBatcher:
+    """Submits concurrent `.remote()` calls of a function in batches, with one `FunctionMap` request per batch.
+
+    Calls wait up to `window` seconds for others to join their batch, and a batch is sent right away once it has
+    `max_size` calls. Every call in a batch becomes an input of the same function call, and each caller waits for
+    the output of its own input.
+    """
+
+    def __init__(self, function: "_Function", client: _Client, window: float, max_size: int):
+        self.function = function
+        self.client = client
+        self.window = window
+        self.max_size = max_size
+        self._batches: dict[str, _RemoteCallBatch] = {}  # Calls made from different inputs can't share a batch.
+        self._send_tasks: set[asyncio.Task] = set()
+
+    @traced("modal.invocation.create")
+    async def create(self, args, kwargs) -> _Invocation:
+        assert self.client.stub
+        function = self.function
+        item = await _create_input(
+            args,
+            kwargs,
+            self.client.stub,
+            max_object_size_bytes=function._max_object_size_bytes,
+            method_name=function._use_method_name,
+            function_call_invocation_type=api_pb2.FUNCTION_CALL_INVOCATION_TYPE_SYNC,
+            data_format=get_input_data_format(
+                function._use_firewall,
+                function._compress_data,
+                function._supports_pickle_oob,
+                function._supports_pickle_compressed,
+            ),
+        )
+        parent_input_id = current_input_id() or ""
+        batch = self._batches.get(parent_input_id)
+        if batch is None:
+            batch = self._batches[parent_input_id] = _RemoteCallBatch()
+            batch.flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush, parent_input_id)
+        item.idx = len(batch.items)
+        future: asyncio.Future[_Invocation] = asyncio.get_running_loop().create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        if len(batch.items) >= self.max_size:
+            self._flush(parent_input_id)
+        return await future
+
+    def _flush(self, parent_input_id: str):
+        batch = self._batches.pop(parent_input_id)
+        if batch.flush_handle is not None:
+            batch.flush_handle.cancel()
+        task = asyncio.create_task(self._send(parent_input_id, batch))
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    async def _send(self, parent_input_id: str, batch: _RemoteCallBatch):
+        # Callers cancelled while waiting for their batch never get their call submitted, like a plain `.remote()`.
+        pending = [(item, future) for item, future in zip(batch.items, batch.futures) if not future.done()]
+        if not pending:
+            return
+        items = [item for item, _ in pending]
+        futures = [future for _, future in pending]
+        for idx, item in enumerate(items):
+            item.idx = idx
+        try:
+            invocations = await _Invocation._create_many(
+                self.function,
+                items,
+                client=self.client,
+                parent_input_id=parent_input_id,
+                function_call_type=(
+                    api_pb2.FUNCTION_CALL_TYPE_UNARY if len(items) == 1 else api_pb2.FUNCTION_CALL_TYPE_MAP
+                ),
+                function_call_invocation_type=api_pb2.FUNCTION_CALL_INVOCATION_TYPE_SYNC,
+            )
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as exc:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for future, invocation in zip(futures, invocations):
+            if not future.done():  # The caller may have been cancelled while the batch was being sent.
+                future.set_result(invocation)
+
+
 # Wrapper type for api_pb2.FunctionStats
 @dataclass(frozen=True)
 class FunctionStats:
@@ -650,6 +914,12 @@ class _Function(typing.Generic[P, ReturnType, OriginalReturnType], _Object, type
 
     _is_generator: Optional[bool] = None
     _use_firewall: bool = False  # Whether to use rffickle firewall for safe deserialization
+    _compress_data: bool = False  # Whether to send inputs (and get outputs) in the compressed data format
+    # Whether the function was defined by this client, so its containers run a client that can read out-of-band
+    # pickles. Functions looked up by name may run an older client, which can't.
+    _supports_pickle_oob: bool = False
+    # Likewise for compressed pickles: `_compress_data` only takes effect when the containers can decompress them.
+    _supports_pickle_compressed: bool = False
 
     # when this is the method of a class/object function, invocation of this function
     # should supply the method name in the FunctionInput:
@@ -695,6 +965,7 @@ class _Function(typing.Generic[P, ReturnType, OriginalReturnType], _Object, type
         block_network: bool = False,
         restrict_modal_access: bool = False,
         use_firewall: bool = False,
+        compress_data: bool = False,
         i6pn_enabled: bool = False,
         # Experimental: Clustered functions
         cluster_size: Optional[int] = None,
@@ -1115,6 +1386,9 @@ class _Function(typing.Generic[P, ReturnType, OriginalReturnType], _Object, type
         obj._spec = function_spec  # needed for modal shell
         obj._webhook_config = webhook_config  # only set locally
         obj._use_firewall = use_firewall  # whether to use rffickle for safe deserialization
+        obj._compress_data = compress_data  # whether to compress inputs and outputs
+        obj._supports_pickle_oob = True
+        obj._supports_pickle_compressed = True
 
         # Used to check whether we should rebuild a modal.Image which uses `run_function`.
         gpus: list[GPU_T] = gpu if isinstance(gpu, list) else [gpu]
@@ -1236,6 +1510,9 @@ class _Function(typing.Generic[P, ReturnType, OriginalReturnType], _Object, type
         fun._obj = obj
         fun._spec = self._spec  # TODO (elias): fix - this is incorrect when using with_options
         fun._use_firewall = self._use_firewall  # Preserve firewall setting
+        fun._compress_data = self._compress_data
+        fun._supports_pickle_oob = self._supports_pickle_oob
+        fun._supports_pickle_compressed = self._supports_pickle_compressed
         return fun
 
     @live_method
@@ -1483,6 +1760,7 @@ class _Function(typing.Generic[P, ReturnType, OriginalReturnType], _Object, type
         self._serve_mounts = frozenset()
         self._metadata = None
         self._experimental_flash_urls = None
+        self._remote_batcher: Optional[_RemoteCallBatcher] = None
 
     def _hydrate_metadata(self, metadata: Optional[Message]):
         # Overridden concrete implementation of base class method
@@ -1585,6 +1863,8 @@ Use the `Function.get_web_url()` method instead.
         order_outputs: bool,
         return_exceptions: bool,
         wrap_returned_exceptions: bool,
+        serialize_workers: Optional[int] = None,
+        dedupe: bool = False,
     ) -> AsyncGenerator[Any, None]:
         """mdmd:hidden
 
@@ -1615,6 +1895,8 @@ Use the `Function.get_web_url()` method instead.
                     return_exceptions,
                     wrap_returned_exceptions,
                     count_update_callback,
+                    serialize_workers=serialize_workers,
+                    dedupe=dedupe,
                 )
             ) as stream:
                 async for item in stream:
@@ -1630,13 +1912,17 @@ Use the `Function.get_web_url()` method instead.
                     wrap_returned_exceptions,
                     count_update_callback,
                     api_pb2.FUNCTION_CALL_INVOCATION_TYPE_SYNC,
+                    serialize_workers=serialize_workers,
+                    dedupe=dedupe,
                 )
             ) as stream:
                 async for item in stream:
                     yield item
 
     @live_method
-    async def _spawn_map(self, input_queue: _SynchronizedQueue) -> "_FunctionCall[ReturnType]":
+    async def _spawn_map(
+        self, input_queue: _SynchronizedQueue, journal: Optional[Union[str, os.PathLike]] = None
+    ) -> "_FunctionCall[ReturnType]":
         self._check_no_web_url("spawn_map")
         if self._is_generator:
             raise InvalidError("A generator function cannot be called with `.spawn_map(...)`.")
@@ -1646,12 +1932,15 @@ Use the `Function.get_web_url()` method instead.
             self,
             input_queue,
             self.client,
+            journal,
         )
         metadata = api_pb2.FunctionCallFromIdResponse(function_call_id=function_call_id, num_inputs=num_inputs)
         fc: _FunctionCall[ReturnType] = _FunctionCall._new_hydrated(function_call_id, self.client, metadata)
         return fc
 
+    @traced("modal.call")
     async def _call_function(self, args, kwargs) -> ReturnType:
+        current_span().set_attribute("function.name", self._function_name)
         invocation: Union[_Invocation, _InputPlaneInvocation]
         if self._input_plane_url:
             invocation = await _InputPlaneInvocation.create(
@@ -1662,6 +1951,8 @@ Use the `Function.get_web_url()` method instead.
                 input_plane_url=self._input_plane_url,
                 input_plane_region=self._input_plane_region,
             )
+        elif batcher := self._get_remote_batcher():
+            invocation = await batcher.create(args, kwargs)
         else:
             invocation = await _Invocation.create(
                 self,
@@ -1673,6 +1964,17 @@ Use the `Function.get_web_url()` method instead.
 
         return await invocation.run_function()
 
+    def _get_remote_batcher(self) -> Optional[_RemoteCallBatcher]:
+        window = config.get("remote_batch_window")
+        if not window:
+            return None
+        if self._remote_batcher is None or self._remote_batcher.client is not self.client:
+            self._remote_batcher = _RemoteCallBatcher(self, self.client, window, config.get("remote_batch_size"))
+        else:
+            self._remote_batcher.window = window
+            self._remote_batcher.max_size = config.get("remote_batch_size")
+        return self._remote_batcher
+
     async def _call_function_nowait(
         self,
         args,
@@ -2057,11 +2359,68 @@ class _FunctionCall(typing.Generic[ReturnType], _Object, type_prefix="fc"):
 
         *Added in v0.73.69*: This method replaces the deprecated `modal.functions.gather` function.
         """
+        results: list[Any] = [None] * len(function_calls)
         try:
-            return await TaskContext.gather(*[fc.get() for fc in function_calls])
+            async with aclosing(_FunctionCall.as_completed(*function_calls)) as stream:
+                async for idx, result in stream:
+                    results[idx] = result
         except Exception as exc:
             # TODO: kill all running function calls
             raise exc
+        return results
+
+    @staticmethod
+    async def as_completed(*function_calls: "_FunctionCall[T]") -> AsyncGenerator[tuple[int, T], None]:
+        """Yield the results of Modal FunctionCall objects as they finish.
+
+        Accepts a variable number of `FunctionCall` objects, as returned by `Function.spawn()`, and yields
+        `(index, result)` tuples, where `index` is the position of the call in the arguments. Raises the
+        exception of the first failing function call that is observed.
+
+        At most a bounded number of calls are polled at a time, so this can be used with many thousands
+        of function calls without opening a long-poll for each of them. With more calls than that, the
+        calls take turns being polled, so results come out in completion order only approximately: a call
+        that finishes while it is waiting for its turn is yielded the next time it is polled.
+
+        Examples:
+
+        ```python notest
+        fcs = [my_func.spawn(x) for x in range(1000)]
+
+        for idx, result in modal.FunctionCall.as_completed(*fcs):
+            print(f"call {idx} finished with {result}")
+        ```
+        """
+        if not function_calls:
+            return
+
+        pending: collections.deque[tuple[int, _FunctionCall[T]]] = collections.deque(enumerate(function_calls))
+        concurrency = min(len(function_calls), FUNCTION_CALL_POLL_CONCURRENCY)
+        # If every call has its own slot there is nothing to take turns with, so just long-poll until it finishes.
+        poll_timeout = None if concurrency == len(function_calls) else FUNCTION_CALL_POLL_TIMEOUT
+        completed: asyncio.Queue[tuple[int, Any, Optional[BaseException]]] = asyncio.Queue()
+
+        async def poll():
+            while pending:
+                idx, function_call = pending.popleft()
+                try:
+                    result = await function_call.get(timeout=poll_timeout)
+                except TimeoutError:
+                    pending.append((idx, function_call))
+                    continue
+                except Exception as exc:
+                    await completed.put((idx, None, exc))
+                    return
+                await completed.put((idx, result, None))
+
+        async with TaskContext() as tc:
+            for _ in range(concurrency):
+                tc.create_task(poll())
+            for _ in range(len(function_calls)):
+                idx, result, exc = await completed.get()
+                if exc is not None:
+                    raise exc
+                yield idx, result
 
 
 async def _gather(*function_calls: _FunctionCall[T]) -> typing.Sequence[T]:
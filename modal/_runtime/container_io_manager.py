@@ -8,15 +8,18 @@ import os
 import sys
 import time
 import traceback
+from collections import deque
 from collections.abc import AsyncGenerator, AsyncIterator
 from contextlib import AsyncExitStack
 from pathlib import Path
 from typing import (
     TYPE_CHECKING,
     Any,
+    Awaitable,
     Callable,
     ClassVar,
     Optional,
+    Union,
     cast,
 )
 
@@ -26,10 +29,18 @@ from synchronicity.async_wrap import asynccontextmanager
 
 import modal_proto.api_pb2
 from modal._runtime import gpu_memory_snapshot
-from modal._serialization import deserialize, serialize, serialize_data_format
+from modal._serialization import (
+    CompressionStats,
+    deserialize,
+    deserialize_data_format,
+    serialize,
+    serialize_compressed,
+    serialize_data_format,
+    serialize_oob,
+)
 from modal._traceback import extract_traceback, print_exception
 from modal._utils.async_utils import TaskContext, asyncify, synchronize_api, synchronizer
-from modal._utils.blob_utils import MAX_OBJECT_SIZE_BYTES, blob_download, blob_upload
+from modal._utils.blob_utils import MAX_OBJECT_SIZE_BYTES, blob_download, blob_download_buffer, blob_upload
 from modal._utils.function_utils import _stream_function_call_data
 from modal._utils.grpc_utils import retry_transient_errors
 from modal._utils.package_utils import parse_major_minor_version
@@ -44,7 +55,13 @@ if TYPE_CHECKING:
 
 DYNAMIC_CONCURRENCY_INTERVAL_SECS = 3
 DYNAMIC_CONCURRENCY_TIMEOUT_SECS = 10
+LOCAL_CONCURRENCY_INTERVAL_SECS = 1
 MAX_OUTPUT_BATCH_SIZE: int = 49
+# Outputs per FunctionPutOutputs request, to stay within message size limits and buffer size limits.
+MAX_OUTPUTS_PER_REQUEST: int = 20
+MAX_OUTPUT_REQUEST_BYTES: int = 16 * 1024 * 1024
+# Generator outputs that are serialized ahead of the ones being sent, e.g. while earlier ones upload.
+MAX_PENDING_GENERATOR_CHUNKS: int = 16
 
 RTT_S: float = 0.5  # conservative estimate of RTT in seconds.
 
@@ -57,6 +74,18 @@ class Sentinel:
     """Used to get type-stubs to work with this object."""
 
 
+def _deserialize_function_input(
+    input: api_pb2.FunctionInput, client: _Client, args: Optional[memoryview] = None
+) -> tuple[tuple[Any, ...], dict[str, Any]]:
+    """Deserializes the arguments of an input, read from `args` if they were downloaded from a blob."""
+    data: Union[bytes, memoryview] = input.args if args is None else args
+    if not data:
+        return ((), {})
+    if input.data_format in (api_pb2.DATA_FORMAT_PICKLE_OOB, api_pb2.DATA_FORMAT_PICKLE_COMPRESSED):
+        return deserialize_data_format(data, input.data_format, client)
+    return deserialize(data, client)
+
+
 class IOContext:
     """Context object for managing input, function calls, and function executions
     in a batched or single input context.
@@ -71,6 +100,10 @@ class IOContext:
 
     _cancel_issued: bool = False
     _cancel_callback: Optional[Callable[[], None]] = None
+    # Inputs deserialized ahead of time, as (args, kwargs) or the exception deserializing them raised.
+    _deserialized_inputs: Optional[list[Union[tuple[tuple[Any, ...], dict[str, Any]], BaseException]]] = None
+    # Arguments of inputs downloaded from blobs. They're kept out of the inputs' protos, which would copy them.
+    _input_args: Optional[list[Optional[memoryview]]] = None
 
     def __init__(
         self,
@@ -103,32 +136,59 @@ class IOContext:
         assert len(inputs) >= 1 if is_batched else len(inputs) == 1
         input_ids, retry_counts, function_call_ids, attempt_tokens, function_inputs = zip(*inputs)
 
-        async def _populate_input_blobs(client: _Client, input: api_pb2.FunctionInput) -> api_pb2.FunctionInput:
+        async def _populate_input_blobs(
+            client: _Client, input: api_pb2.FunctionInput
+        ) -> tuple[api_pb2.FunctionInput, Optional[memoryview]]:
             # If we got a pointer to a blob, download it from S3.
             if input.WhichOneof("args_oneof") == "args_blob_id":
-                args = await blob_download(input.args_blob_id, client.stub)
-                # Mutating
-                input.ClearField("args_blob_id")
-                input.args = args
+                if input.data_format == api_pb2.DATA_FORMAT_PICKLE_OOB:
+                    # Out-of-band buffers are unpickled in place, so they go into a writable buffer of their own.
+                    return input, await blob_download_buffer(input.args_blob_id, client.stub)
+                return input, await blob_download(input.args_blob_id, client.stub)
 
-            return input
+            return input, None
 
-        function_inputs = await asyncio.gather(*[_populate_input_blobs(client, input) for input in function_inputs])
+        def _deserialize(input: api_pb2.FunctionInput, args: Optional[memoryview]):
+            try:
+                return _deserialize_function_input(input, client, args)
+            except Exception as exc:
+                # Raised when the input is used, so it's reported like any other error in user code.
+                return exc
+
+        async def _load_input(client: _Client, input: api_pb2.FunctionInput):
+            input, args = await _populate_input_blobs(client, input)
+            # Deserialize each input on a worker thread as soon as it's downloaded, while the others download.
+            return input, args, await asyncify(_deserialize)(input, args)
+
+        deserialized_inputs = None
+        if config.get("deserialize_inputs_in_thread"):
+            function_inputs, input_args, deserialized_inputs = zip(
+                *await asyncio.gather(*[_load_input(client, input) for input in function_inputs])
+            )
+        else:
+            function_inputs, input_args = zip(
+                *await asyncio.gather(*[_populate_input_blobs(client, input) for input in function_inputs])
+            )
         # check every input in batch executes the same function
         method_name = function_inputs[0].method_name
         assert all(method_name == input.method_name for input in function_inputs)
         finalized_function = finalized_functions[method_name]
-        return cls(
+        io_context = cls(
             # Do explicit cast since type checker doesn't understand zip(*inputs)
             cast(list[str], input_ids),
             cast(list[int], retry_counts),
             cast(list[str], function_call_ids),
             cast(list[str], attempt_tokens),
             finalized_function,
-            cast(list[api_pb2.FunctionInput], function_inputs),
+            cast(list[api_pb2.FunctionInput], list(function_inputs)),
             is_batched,
             client,
         )
+        if deserialized_inputs is not None:
+            io_context._deserialized_inputs = list(deserialized_inputs)
+        else:
+            io_context._input_args = list(input_args)
+        return io_context
 
     def set_cancel_callback(self, cb: Callable[[], None]):
         self._cancel_callback = cb
@@ -147,13 +207,31 @@ class IOContext:
             #  between creating a new task for an input and attaching the cancellation callback
             logger.warning("Unexpected: Could not cancel input")
 
+    def _deserialize_input(self, i: int) -> tuple[tuple[Any, ...], dict[str, Any]]:
+        if self._deserialized_inputs is None:
+            args = self._input_args[i] if self._input_args is not None else None
+            return _deserialize_function_input(self.function_inputs[i], self._client, args)
+        deserialized = self._deserialized_inputs[i]
+        if isinstance(deserialized, BaseException):
+            raise deserialized
+        return deserialized
+
+    def output_data_format(
+        self, data_format: "modal_proto.api_pb2.DataFormat.ValueType"
+    ) -> "modal_proto.api_pb2.DataFormat.ValueType":
+        """Pickled outputs use the caller's input format if it's out-of-band or compressed, since it can read them."""
+        if data_format != api_pb2.DATA_FORMAT_PICKLE:
+            return data_format
+        for input_format in (api_pb2.DATA_FORMAT_PICKLE_OOB, api_pb2.DATA_FORMAT_PICKLE_COMPRESSED):
+            if all(input.data_format == input_format for input in self.function_inputs):
+                return input_format
+        return data_format
+
     def _args_and_kwargs(self) -> tuple[tuple[Any, ...], dict[str, list[Any]]]:
         # deserializing here instead of the constructor
         # to make sure we handle user exceptions properly
         # and don't retry
-        deserialized_args = [
-            deserialize(input.args, self._client) if input.args else ((), {}) for input in self.function_inputs
-        ]
+        deserialized_args = [self._deserialize_input(i) for i in range(len(self.function_inputs))]
         if not self._is_batched:
             return deserialized_args[0]
 
@@ -258,6 +336,235 @@ class InputSlots:
             await self.acquire()
 
 
+def _available_cpus() -> float:
+    """Number of CPUs this container may use, taking a cgroup CPU quota into account."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _memory_limit() -> Optional[int]:
+    """The cgroup memory limit of this container in bytes, if there is one."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                limit = int(f.read())
+        except (OSError, ValueError):  # Missing, or "max".
+            continue
+        if limit < 2**60:  # cgroup v1 reports a huge number when there is no limit.
+            return limit
+    return None
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ConcurrencyController:
+    """Adjusts the number of input slots locally, between `min_concurrency` and `max_concurrency`.
+
+    The limit follows a latency gradient, like Netflix's gradient limiter: each interval, the mean latency of the
+    inputs that finished is compared with a slowly moving average of it. Latency going up means the container is
+    doing more work concurrently than it can handle, so the limit shrinks in proportion. Otherwise the limit grows
+    by its square root, but only while all slots are in use, since the input rate is the bottleneck otherwise. The
+    limit is halved right away when the event loop lags, or the CPU or memory of the container is nearly used up,
+    so the container backs off before inputs start to slow down.
+    """
+
+    def __init__(
+        self,
+        min_concurrency: int,
+        max_concurrency: int,
+        *,
+        latency_tolerance: float = 1.5,
+        max_loop_lag: float = 0.1,
+        max_cpu: float = 0.9,
+        max_memory: float = 0.9,
+        smoothing: float = 0.2,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_tolerance = latency_tolerance
+        self.max_loop_lag = max_loop_lag
+        self.max_cpu = max_cpu
+        self.max_memory = max_memory
+        self.smoothing = smoothing
+        self.limit = float(min_concurrency)
+        self._latencies: list[float] = []
+        self._long_latency: Optional[float] = None
+        # Stats, for debug logging.
+        self.updates = 0
+        self.increases = 0
+        self.decreases = 0
+        self.last_reason = ""
+        self.last_latency = 0.0
+        self.last_loop_lag = 0.0
+        self.last_cpu: Optional[float] = None
+        self.last_memory: Optional[float] = None
+
+    def get_concurrency(self) -> int:
+        return round(self.limit)
+
+    def record_latency(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def update(self, *, active: int, loop_lag: float, cpu: Optional[float], memory: Optional[float]) -> int:
+        """Takes the signals measured since the last update, and returns the new concurrency.
+
+        `cpu` and `memory` are the used fractions of what the container may use, or None if unknown.
+        """
+        latencies, self._latencies = self._latencies, []
+        self.updates += 1
+        self.last_loop_lag, self.last_cpu, self.last_memory = loop_lag, cpu, memory
+        old_concurrency = self.get_concurrency()
+
+        if loop_lag > self.max_loop_lag:
+            self._decrease("loop_lag")
+        elif cpu is not None and cpu > self.max_cpu:
+            self._decrease("cpu")
+        elif memory is not None and memory > self.max_memory:
+            self._decrease("memory")
+        elif latencies:
+            latency = self.last_latency = sum(latencies) / len(latencies)
+            if self._long_latency is None:
+                self._long_latency = latency
+            gradient = max(0.5, min(1.0, self.latency_tolerance * self._long_latency / latency))
+            if gradient < 1.0:
+                new_limit = self.limit * gradient
+                self.last_reason = "latency"
+            elif active >= self.get_concurrency():
+                new_limit = self.limit + math.sqrt(self.limit)
+                self.last_reason = "headroom"
+            else:
+                new_limit = self.limit
+                self.last_reason = "idle"
+            self.limit = self._clamp(self.limit * (1 - self.smoothing) + new_limit * self.smoothing)
+            # Latency only drifts up slowly, so a sustained increase isn't mistaken for the new normal right away.
+            self._long_latency = 0.95 * self._long_latency + 0.05 * latency
+        else:
+            self.last_reason = "no_inputs"
+
+        new_concurrency = self.get_concurrency()
+        if new_concurrency > old_concurrency:
+            self.increases += 1
+        elif new_concurrency < old_concurrency:
+            self.decreases += 1
+        return new_concurrency
+
+    def _decrease(self, reason: str):
+        self.limit = self._clamp(self.limit / 2)
+        self.last_reason = reason
+
+    def _clamp(self, limit: float) -> float:
+        return max(float(self.min_concurrency), min(float(self.max_concurrency), limit))
+
+    def stats(self) -> str:
+        cpu = "unknown" if self.last_cpu is None else f"{self.last_cpu:.2f}"
+        memory = "unknown" if self.last_memory is None else f"{self.last_memory:.2f}"
+        return (
+            f"concurrency={self.get_concurrency()} reason={self.last_reason} latency={self.last_latency:.3f} "
+            f"loop_lag={self.last_loop_lag:.3f} cpu={cpu} memory={memory} updates={self.updates} "
+            f"increases={self.increases} decreases={self.decreases}"
+        )
+
+
+class OutputFlusher:
+    """Sends outputs from a background task, so inputs don't wait for their outputs to be sent.
+
+    Outputs queued while a request is in flight are sent together in the next one, up to `MAX_OUTPUTS_PER_REQUEST`
+    outputs and `MAX_OUTPUT_REQUEST_BYTES` bytes per request. With a `linger` (in seconds), a request also waits
+    that long for more outputs to arrive, unless it's full.
+    """
+
+    def __init__(
+        self,
+        put_outputs: Callable[[list[api_pb2.FunctionPutOutputsItem]], Awaitable[None]],
+        linger: float = 0.0,
+    ):
+        self._put_outputs = put_outputs
+        self._linger = linger
+        self._queue: deque[api_pb2.FunctionPutOutputsItem] = deque()
+        self._queued_bytes = 0
+        self._changed = asyncio.Event()
+        self._closed = False
+        self._sending = False
+        self._error: Optional[BaseException] = None
+
+    def put(self, outputs: list[api_pb2.FunctionPutOutputsItem]) -> None:
+        if self._error is not None:
+            raise self._error
+        assert not self._closed
+        self._queue.extend(outputs)
+        self._queued_bytes += sum(output.ByteSize() for output in outputs)
+        self._changed.set()
+
+    def _full(self) -> bool:
+        return len(self._queue) >= MAX_OUTPUTS_PER_REQUEST or self._queued_bytes >= MAX_OUTPUT_REQUEST_BYTES
+
+    async def run(self) -> None:
+        try:
+            while self._queue or not self._closed:
+                if not self._queue:
+                    self._changed.clear()
+                    await self._changed.wait()
+                    continue
+                if self._linger and not self._closed and not self._full():
+                    deadline = time.monotonic() + self._linger
+                    while not self._closed and not self._full() and (timeout := deadline - time.monotonic()) > 0:
+                        self._changed.clear()
+                        try:
+                            await asyncio.wait_for(self._changed.wait(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+
+                batch: list[api_pb2.FunctionPutOutputsItem] = []
+                batch_bytes = 0
+                while self._queue and len(batch) < MAX_OUTPUTS_PER_REQUEST:
+                    size = self._queue[0].ByteSize()
+                    if batch and batch_bytes + size > MAX_OUTPUT_REQUEST_BYTES:
+                        break
+                    batch.append(self._queue.popleft())
+                    batch_bytes += size
+                self._queued_bytes -= batch_bytes
+                self._sending = True
+                try:
+                    await self._put_outputs(batch)
+                finally:
+                    self._sending = False
+                    self._changed.set()
+        except BaseException as exc:
+            self._error = exc
+            self._changed.set()
+            raise
+
+    async def flush(self) -> None:
+        """Waits until every queued output has been sent."""
+        while self._queue or self._sending:
+            if self._error is not None:
+                raise self._error
+            self._changed.clear()
+            await self._changed.wait()
+        if self._error is not None:
+            raise self._error
+
+    async def close(self) -> None:
+        """Sends the outputs that are still queued, and stops."""
+        self._closed = True
+        self._changed.set()
+        await self.flush()
+
+
 class _ContainerIOManager:
     """Synchronizes all RPC calls and network operations for a running container.
 
@@ -274,6 +581,7 @@ class _ContainerIOManager:
 
     calls_completed: int
     total_user_time: float
+    output_compression_stats: CompressionStats
     current_input_id: Optional[str]
     current_inputs: dict[str, IOContext]  # input_id -> IOContext
     current_input_started_at: Optional[float]
@@ -282,6 +590,7 @@ class _ContainerIOManager:
     _target_concurrency: int
     _max_concurrency: int
     _concurrency_loop: Optional[asyncio.Task]
+    _concurrency_controller: Optional[ConcurrencyController]
     _input_slots: InputSlots
 
     _environment_name: str
@@ -291,6 +600,9 @@ class _ContainerIOManager:
 
     _is_interactivity_enabled: bool
     _fetching_inputs: bool
+    _prefetched_inputs: deque[list[tuple[str, int, str, str, api_pb2.FunctionInput]]]
+    _prefetch_condition: Optional[asyncio.Condition]
+    _output_flusher: Optional[OutputFlusher]
 
     _client: _Client
 
@@ -307,6 +619,7 @@ class _ContainerIOManager:
 
         self.calls_completed = 0
         self.total_user_time = 0.0
+        self.output_compression_stats = CompressionStats()
         self.current_input_id = None
         self.current_inputs = {}
         self.current_input_started_at = None
@@ -321,6 +634,7 @@ class _ContainerIOManager:
         self._max_concurrency = max_concurrency
         self._target_concurrency = target_concurrency
         self._concurrency_loop = None
+        self._concurrency_controller = None
         self._stop_concurrency_loop = False
         self._input_slots = InputSlots(target_concurrency)
 
@@ -331,6 +645,9 @@ class _ContainerIOManager:
         self._cuda_checkpoint_session = None
 
         self._is_interactivity_enabled = False
+        self._prefetched_inputs = deque()
+        self._prefetch_condition = None
+        self._output_flusher = None
         self._fetching_inputs = True
 
         self._client = client
@@ -421,6 +738,7 @@ class _ContainerIOManager:
                 for input_id in input_ids_to_cancel:
                     if input_id in self.current_inputs:
                         self.current_inputs[input_id].cancel()
+                await self._cancel_prefetched_inputs(set(input_ids_to_cancel))
             return True
         return False
 
@@ -442,13 +760,30 @@ class _ContainerIOManager:
     @asynccontextmanager
     async def dynamic_concurrency_manager(self) -> AsyncGenerator[None, None]:
         async with TaskContext() as tc:
-            self._concurrency_loop = t = tc.create_task(self._dynamic_concurrency_loop())
+            if config.get("dynamic_concurrency") == "local":
+                concurrency_loop = self._local_concurrency_loop()
+            else:
+                concurrency_loop = self._dynamic_concurrency_loop()
+            self._concurrency_loop = t = tc.create_task(concurrency_loop)
             t.set_name("dynamic concurrency loop")
             try:
                 yield
             finally:
                 t.cancel()
 
+    @asynccontextmanager
+    async def output_flusher(self) -> AsyncGenerator[None, None]:
+        async with TaskContext() as tc:
+            self._output_flusher = flusher = OutputFlusher(self._put_outputs, linger=config.get("output_flush_linger"))
+            t = tc.create_task(flusher.run())
+            t.set_name("output flusher")
+            try:
+                yield
+            finally:
+                # Outputs have been queued for all inputs that are done, so their slots may already be reused.
+                self._output_flusher = None
+                await flusher.close()
+
     async def _dynamic_concurrency_loop(self):
         logger.debug(f"Starting dynamic concurrency loop for task {self.task_id}")
         while not self._stop_concurrency_loop:
@@ -472,16 +807,44 @@ class _ContainerIOManager:
 
             await asyncio.sleep(DYNAMIC_CONCURRENCY_INTERVAL_SECS)
 
+    async def _local_concurrency_loop(self):
+        logger.debug(f"Starting local concurrency controller for task {self.task_id}")
+        self._concurrency_controller = controller = ConcurrencyController(
+            self._target_concurrency, self._max_concurrency
+        )
+        available_cpus = _available_cpus()
+        memory_limit = _memory_limit()
+        cpu_time, wall_time = time.process_time(), time.monotonic()
+        while not self._stop_concurrency_loop:
+            await asyncio.sleep(LOCAL_CONCURRENCY_INTERVAL_SECS)
+            now_cpu_time, now = time.process_time(), time.monotonic()
+            # Sleeping for longer than asked means that something kept the event loop busy.
+            loop_lag = max(0.0, now - wall_time - LOCAL_CONCURRENCY_INTERVAL_SECS)
+            cpu = (now_cpu_time - cpu_time) / ((now - wall_time) * available_cpus)
+            cpu_time, wall_time = now_cpu_time, now
+            rss = _rss_bytes()
+            memory = rss / memory_limit if rss is not None and memory_limit else None
+
+            concurrency = controller.update(active=self._input_slots.active, loop_lag=loop_lag, cpu=cpu, memory=memory)
+            if concurrency != self._input_slots.value and not self._stop_concurrency_loop:
+                logger.debug(f"Dynamic concurrency set from {self._input_slots.value} to {concurrency}")
+                self._input_slots.set_value(concurrency)
+            logger.debug(f"Concurrency controller stats: {controller.stats()}")
+
     @synchronizer.no_io_translation
-    def serialize_data_format(self, obj: Any, data_format: int) -> bytes:
+    def serialize_data_format(self, obj: Any, data_format: int) -> Union[bytes, list[memoryview]]:
+        if data_format == api_pb2.DATA_FORMAT_PICKLE_OOB:
+            # Keep the frames separate, so large buffers can be uploaded without joining them first.
+            return serialize_oob(obj)
+        if data_format == api_pb2.DATA_FORMAT_PICKLE_COMPRESSED:
+            return serialize_compressed(obj, self.output_compression_stats)
         return serialize_data_format(obj, data_format)
 
-    async def format_blob_data(self, data: bytes) -> dict[str, Any]:
-        return (
-            {"data_blob_id": await blob_upload(data, self._client.stub)}
-            if len(data) > MAX_OBJECT_SIZE_BYTES
-            else {"data": data}
-        )
+    async def format_blob_data(self, data: Union[bytes, list[memoryview]]) -> dict[str, Any]:
+        num_bytes = len(data) if isinstance(data, bytes) else sum(frame.nbytes for frame in data)
+        if num_bytes > MAX_OBJECT_SIZE_BYTES:
+            return {"data_blob_id": await blob_upload(data, self._client.stub)}
+        return {"data": data if isinstance(data, bytes) else b"".join(data)}
 
     async def get_data_in(self, function_call_id: str, attempt_token: Optional[str]) -> AsyncIterator[Any]:
         """Read from the `data_in` stream of a function call."""
@@ -494,6 +857,27 @@ class _ContainerIOManager:
         ):
             yield data
 
+    async def _data_chunk(self, message_bytes: bytes, data_format: int, index: int) -> api_pb2.DataChunk:
+        chunk = api_pb2.DataChunk(data_format=data_format, index=index)  # type: ignore
+        if len(message_bytes) > MAX_OBJECT_SIZE_BYTES:
+            chunk.data_blob_id = await blob_upload(message_bytes, self._client.stub)
+        else:
+            chunk.data = message_bytes
+        return chunk
+
+    async def _put_data_chunks(
+        self, function_call_id: str, attempt_token: str, data_chunks: list[api_pb2.DataChunk]
+    ) -> None:
+        req = api_pb2.FunctionCallPutDataRequest(function_call_id=function_call_id, data_chunks=data_chunks)
+        if attempt_token:
+            req.attempt_token = attempt_token  # oneof clears function_call_id.
+
+        if self.input_plane_server_url:
+            stub = await self._client.get_stub(self.input_plane_server_url)
+            await retry_transient_errors(stub.FunctionCallPutDataOut, req)
+        else:
+            await retry_transient_errors(self._client.stub.FunctionCallPutDataOut, req)
+
     async def put_data_out(
         self,
         function_call_id: str,
@@ -510,56 +894,89 @@ class _ContainerIOManager:
         """
         data_chunks: list[api_pb2.DataChunk] = []
         for i, message_bytes in enumerate(serialized_messages):
-            chunk = api_pb2.DataChunk(data_format=data_format, index=start_index + i)  # type: ignore
-            if len(message_bytes) > MAX_OBJECT_SIZE_BYTES:
-                chunk.data_blob_id = await blob_upload(message_bytes, self._client.stub)
-            else:
-                chunk.data = message_bytes
-            data_chunks.append(chunk)
-
-        req = api_pb2.FunctionCallPutDataRequest(function_call_id=function_call_id, data_chunks=data_chunks)
-        if attempt_token:
-            req.attempt_token = attempt_token  # oneof clears function_call_id.
-
-        if self.input_plane_server_url:
-            stub = await self._client.get_stub(self.input_plane_server_url)
-            await retry_transient_errors(stub.FunctionCallPutDataOut, req)
-        else:
-            await retry_transient_errors(self._client.stub.FunctionCallPutDataOut, req)
+            data_chunks.append(await self._data_chunk(message_bytes, data_format, start_index + i))
+        await self._put_data_chunks(function_call_id, attempt_token, data_chunks)
 
     @asynccontextmanager
     async def generator_output_sender(
         self, function_call_id: str, attempt_token: str, data_format: int, message_rx: asyncio.Queue
     ) -> AsyncGenerator[None, None]:
-        """Runs background task that feeds generator outputs into a function call's `data_out` stream."""
-        GENERATOR_STOP_SENTINEL = Sentinel()
+        """Runs background task that feeds generator outputs into a function call's `data_out` stream.
 
-        async def generator_output_task():
+        Outputs are serialized as soon as they're produced. Outputs too large to send inline are uploaded
+        to blob storage by their own tasks, up to `generator_upload_concurrency` at a time, so the generator
+        isn't held back by one upload at a time. Outputs are still sent in order: whatever is ready when a
+        request goes out is sent together in it.
+        """
+        GENERATOR_STOP_SENTINEL = Sentinel()
+        upload_concurrency = max(1, config.get("generator_upload_concurrency"))
+        upload_slots = asyncio.Semaphore(upload_concurrency)
+        # Serialized outputs in `index` order, as futures of their data chunks. Outputs wait in `message_rx` until
+        # there's room here, so this only holds the outputs being uploaded, and a few that are ready to send.
+        chunks: asyncio.Queue[Any] = asyncio.Queue(max(MAX_PENDING_GENERATOR_CHUNKS, upload_concurrency))
+
+        async def serialize_messages(tc: TaskContext):
+            loop = asyncio.get_running_loop()
             index = 1
-            received_sentinel = False
-            while not received_sentinel:
+            while True:
                 message = await message_rx.get()
                 if message is GENERATOR_STOP_SENTINEL:
-                    break
+                    await chunks.put(GENERATOR_STOP_SENTINEL)
+                    return
+                message_bytes = serialize_data_format(message, data_format)
+                chunk: asyncio.Future[api_pb2.DataChunk]
+                if len(message_bytes) > MAX_OBJECT_SIZE_BYTES:
+                    await upload_slots.acquire()
+                    chunk = tc.create_task(self._data_chunk(message_bytes, data_format, index))
+                    chunk.add_done_callback(lambda _: upload_slots.release())
+                else:
+                    chunk = loop.create_future()
+                    chunk.set_result(
+                        api_pb2.DataChunk(
+                            data_format=cast("api_pb2.DataFormat.ValueType", data_format),
+                            index=index,
+                            data=message_bytes,
+                        )
+                    )
+                await chunks.put(chunk)
+                index += 1
+
+        async def send_chunks():
+            first_request = True
+            next_chunk = None
+            while True:
+                chunk = await chunks.get() if next_chunk is None else next_chunk
+                next_chunk = None
+                if chunk is GENERATOR_STOP_SENTINEL:
+                    return
                 # ASGI 'http.response.start' and 'http.response.body' msgs are observed to be separated by 1ms.
                 # If we don't sleep here for 1ms we end up with an extra call to .put_data_out().
-                if index == 1:
+                if first_request:
                     await asyncio.sleep(0.001)
-                serialized_messages = [serialize_data_format(message, data_format)]
-                total_size = len(serialized_messages[0]) + 512
-                while total_size < 16 * 1024 * 1024:  # 16 MiB, maximum size in a single message
+                    first_request = False
+                data_chunks = [await chunk]
+                total_size = data_chunks[0].ByteSize() + 512
+                while total_size < MAX_OUTPUT_REQUEST_BYTES:
                     try:
-                        message = message_rx.get_nowait()
+                        chunk = chunks.get_nowait()
                     except asyncio.QueueEmpty:
                         break
-                    if message is GENERATOR_STOP_SENTINEL:
-                        received_sentinel = True
+                    if chunk is GENERATOR_STOP_SENTINEL or not chunk.done():
+                        # Don't hold back the outputs that are ready while an upload is still in progress.
+                        next_chunk = chunk
                         break
-                    else:
-                        serialized_messages.append(serialize_data_format(message, data_format))
-                        total_size += len(serialized_messages[-1]) + 512  # 512 bytes for estimated framing overhead
-                await self.put_data_out(function_call_id, attempt_token, index, data_format, serialized_messages)
-                index += len(serialized_messages)
+                    data_chunks.append(chunk.result())
+                    total_size += data_chunks[-1].ByteSize() + 512  # 512 bytes for estimated framing overhead
+                await self._put_data_chunks(function_call_id, attempt_token, data_chunks)
+
+        async def generator_output_task():
+            async with TaskContext() as tc:
+                stages = [tc.create_task(serialize_messages(tc)), tc.create_task(send_chunks())]
+                done, pending = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+                for stage in pending:
+                    stage.cancel()
+                for stage in done:
+                    stage.result()
 
         task = asyncio.create_task(generator_output_task())
         try:
@@ -589,6 +1006,52 @@ class _ContainerIOManager:
 
         return math.ceil(RTT_S / max(self.get_average_call_time(), 1e-6))
 
+    def get_prefetch_depth(self) -> int:
+        """Number of input batches to fetch ahead of time, so that short calls don't wait for a round trip."""
+        if self.calls_completed == 0:
+            return 0  # Don't hold on to inputs before we know how long they take.
+        return min(config.get("input_prefetch"), self.get_max_inputs_to_fetch())
+
+    async def _fetch_inputs(
+        self, request: api_pb2.FunctionGetInputsRequest
+    ) -> tuple[list[tuple[str, int, str, str, api_pb2.FunctionInput]], bool]:
+        """Fetches a batch of inputs, which may be empty.
+
+        Also returns whether no more inputs should be fetched after these.
+        """
+        response: api_pb2.FunctionGetInputsResponse = await retry_transient_errors(
+            self._client.stub.FunctionGetInputs, request
+        )
+
+        if response.rate_limit_sleep_duration:
+            logger.info(
+                "Task exceeded rate limit, sleeping for %.2fs before trying again." % response.rate_limit_sleep_duration
+            )
+            await asyncio.sleep(response.rate_limit_sleep_duration)
+            return [], False
+        if not response.inputs:
+            return [], False
+
+        assert 0 < len(response.inputs) <= max(1, request.batch_max_size)
+        inputs = []
+        for item in response.inputs:
+            if item.kill_switch:
+                logger.debug(f"Task {self.task_id} input kill signal input.")
+                return [], True
+            inputs.append((item.input_id, item.retry_count, item.function_call_id, item.attempt_token, item.input))
+            if item.input.final_input:
+                if request.batch_max_size > 0:
+                    logger.debug(f"Task {self.task_id} Final input not expected in batch input stream")
+                return inputs, True
+
+        # We only support max_inputs = 1 at the moment
+        return inputs, self.function_def.max_inputs == 1
+
+    def _update_get_inputs_request(self, request: api_pb2.FunctionGetInputsRequest) -> None:
+        request.average_call_time = self.get_average_call_time()
+        request.max_values = self.get_max_inputs_to_fetch()  # Deprecated; remove.
+        request.input_concurrency = self.get_input_concurrency()
+
     @synchronizer.no_io_translation
     async def _generate_inputs(
         self,
@@ -596,59 +1059,118 @@ class _ContainerIOManager:
         batch_wait_ms: int,
     ) -> AsyncIterator[list[tuple[str, int, str, str, api_pb2.FunctionInput]]]:
         request = api_pb2.FunctionGetInputsRequest(function_id=self.function_id)
-        iteration = 0
+        request.batch_max_size, request.batch_linger_ms = batch_max_size, batch_wait_ms
+        if config.get("input_prefetch") > 0 and self.function_def.max_inputs != 1:
+            async for inputs in self._generate_prefetched_inputs(request):
+                yield inputs
+            return
+
         while self._fetching_inputs:
             await self._input_slots.acquire()
-
-            request.average_call_time = self.get_average_call_time()
-            request.max_values = self.get_max_inputs_to_fetch()  # Deprecated; remove.
-            request.input_concurrency = self.get_input_concurrency()
-            request.batch_max_size, request.batch_linger_ms = batch_max_size, batch_wait_ms
+            self._update_get_inputs_request(request)
 
             yielded = False
             try:
                 # If number of active inputs is at max queue size, this will block.
-                iteration += 1
-                response: api_pb2.FunctionGetInputsResponse = await retry_transient_errors(
-                    self._client.stub.FunctionGetInputs, request
-                )
-
-                if response.rate_limit_sleep_duration:
-                    logger.info(
-                        "Task exceeded rate limit, sleeping for %.2fs before trying again."
-                        % response.rate_limit_sleep_duration
-                    )
-                    await asyncio.sleep(response.rate_limit_sleep_duration)
-                elif response.inputs:
-                    # for input cancellations and concurrency logic we currently assume
-                    # that there is no input buffering in the container
-                    assert 0 < len(response.inputs) <= max(1, request.batch_max_size)
-                    inputs = []
-                    final_input_received = False
-                    for item in response.inputs:
-                        if item.kill_switch:
-                            logger.debug(f"Task {self.task_id} input kill signal input.")
-                            return
-                        inputs.append(
-                            (item.input_id, item.retry_count, item.function_call_id, item.attempt_token, item.input)
-                        )
-                        if item.input.final_input:
-                            if request.batch_max_size > 0:
-                                logger.debug(f"Task {self.task_id} Final input not expected in batch input stream")
-                            final_input_received = True
-                            break
-
+                inputs, last = await self._fetch_inputs(request)
+                if inputs:
                     # If yielded, allow input slots to be released via exit_context
                     yield inputs
                     yielded = True
-
-                    # We only support max_inputs = 1 at the moment
-                    if final_input_received or self.function_def.max_inputs == 1:
-                        return
+                if last:
+                    return
             finally:
                 if not yielded:
                     self._input_slots.release()
 
+    async def _generate_prefetched_inputs(
+        self, request: api_pb2.FunctionGetInputsRequest
+    ) -> AsyncIterator[list[tuple[str, int, str, str, api_pb2.FunctionInput]]]:
+        # Inputs are fetched by a background task, which keeps up to `get_prefetch_depth()` batches of inputs
+        # in `_prefetched_inputs` while all input slots are busy. Prefetched inputs that get cancelled are
+        # dropped by `_cancel_prefetched_inputs`.
+        condition = self._prefetch_condition = asyncio.Condition()
+        waiting_for_inputs = False
+        done_fetching = False
+
+        async def fetch_inputs():
+            nonlocal done_fetching
+            try:
+                while self._fetching_inputs:
+                    async with condition:
+                        await condition.wait_for(
+                            lambda: len(self._prefetched_inputs) < self.get_prefetch_depth() + waiting_for_inputs
+                        )
+                    if not self._fetching_inputs:
+                        return
+                    self._update_get_inputs_request(request)
+                    inputs, last = await self._fetch_inputs(request)
+                    if inputs:
+                        async with condition:
+                            self._prefetched_inputs.append(inputs)
+                            condition.notify_all()
+                    if last:
+                        return
+            finally:
+                done_fetching = True
+                async with condition:
+                    condition.notify_all()
+
+        fetch_task = asyncio.create_task(fetch_inputs())
+        try:
+            while True:
+                await self._input_slots.acquire()
+                yielded = False
+                try:
+                    async with condition:
+                        waiting_for_inputs = True
+                        condition.notify_all()
+                        await condition.wait_for(lambda: bool(self._prefetched_inputs) or done_fetching)
+                        waiting_for_inputs = False
+                    if not self._prefetched_inputs:
+                        fetch_task.result()  # Raises if fetching failed.
+                        return
+                    inputs = self._prefetched_inputs.popleft()
+                    async with condition:
+                        condition.notify_all()
+                    # If yielded, allow input slots to be released via exit_context
+                    yield inputs
+                    yielded = True
+                finally:
+                    if not yielded:
+                        self._input_slots.release()
+        finally:
+            fetch_task.cancel()
+            self._prefetch_condition = None
+
+    async def _cancel_prefetched_inputs(self, input_ids: set[str]) -> None:
+        """Drops cancelled inputs that haven't started yet, and reports them as terminated."""
+        cancelled = []
+        for inputs in list(self._prefetched_inputs):
+            cancelled += [input for input in inputs if input[0] in input_ids]
+            inputs[:] = [input for input in inputs if input[0] not in input_ids]
+            if not inputs:
+                self._prefetched_inputs.remove(inputs)
+        if not cancelled:
+            return
+        if self._prefetch_condition is not None:
+            async with self._prefetch_condition:
+                self._prefetch_condition.notify_all()
+        now = time.time()
+        outputs = [
+            api_pb2.FunctionPutOutputsItem(
+                input_id=input_id,
+                input_started_at=now,
+                output_created_at=now,
+                result=api_pb2.GenericResult(status=api_pb2.GenericResult.GENERIC_STATUS_TERMINATED),
+                data_format=api_pb2.DATA_FORMAT_PICKLE,
+                retry_count=retry_count,
+            )
+            for input_id, retry_count, *_ in cancelled
+        ]
+        await self._put_outputs(outputs)
+        logger.warning(f"Successfully canceled input {[output.input_id for output in outputs]}")
+
     @synchronizer.no_io_translation
     async def run_inputs_outputs(
         self,
@@ -663,7 +1185,9 @@ class _ContainerIOManager:
         dynamic_concurrency_manager = (
             self.dynamic_concurrency_manager() if self._max_concurrency > self._target_concurrency else AsyncExitStack()
         )
-        async with dynamic_concurrency_manager:
+        # Optionally send outputs in the background, so input slots are released as soon as an output is queued.
+        output_flusher = self.output_flusher() if config.get("output_flusher") else AsyncExitStack()
+        async with dynamic_concurrency_manager, output_flusher:
             async for inputs in self._generate_inputs(batch_max_size, batch_wait_ms):
                 io_context = await IOContext.create(self._client, finalized_functions, inputs, batch_max_size > 0)
                 for input_id in io_context.input_ids:
@@ -697,13 +1221,17 @@ class _ContainerIOManager:
             for input_id, retry_count, result in zip(io_context.input_ids, io_context.retry_counts, results)
         ]
 
+        if self._output_flusher is not None:
+            self._output_flusher.put(outputs)
+        else:
+            await self._put_outputs(outputs)
+
+    async def _put_outputs(self, outputs: list[api_pb2.FunctionPutOutputsItem]) -> None:
         # There are multiple outputs for a single IOContext in the case of @modal.batched.
-        # Limit the batch size to 20 to stay within message size limits and buffer size limits.
-        output_batch_size = 20
-        for i in range(0, len(outputs), output_batch_size):
+        for i in range(0, len(outputs), MAX_OUTPUTS_PER_REQUEST):
             await retry_transient_errors(
                 self._client.stub.FunctionPutOutputs,
-                api_pb2.FunctionPutOutputsRequest(outputs=outputs[i : i + output_batch_size]),
+                api_pb2.FunctionPutOutputsRequest(outputs=outputs[i : i + MAX_OUTPUTS_PER_REQUEST]),
                 additional_status_codes=[Status.RESOURCE_EXHAUSTED],
                 max_retries=None,  # Retry indefinitely, trying every 1s.
             )
@@ -847,6 +1375,8 @@ class _ContainerIOManager:
     def exit_context(self, started_at, input_ids: list[str]):
         self.total_user_time += time.time() - started_at
         self.calls_completed += 1
+        if self._concurrency_controller is not None:
+            self._concurrency_controller.record_latency(time.time() - started_at)
 
         for input_id in input_ids:
             self.current_inputs.pop(input_id)
@@ -862,9 +1392,12 @@ class _ContainerIOManager:
         data_format: "modal_proto.api_pb2.DataFormat.ValueType",
     ) -> None:
         data = io_context.validate_output_data(data)
+        data_format = io_context.output_data_format(data_format)
         formatted_data = await asyncio.gather(
             *[self.format_blob_data(self.serialize_data_format(d, data_format)) for d in data]
         )
+        if data_format == api_pb2.DATA_FORMAT_PICKLE_COMPRESSED:
+            logger.debug(f"Output compression stats: {self.output_compression_stats}")
         results = [
             api_pb2.GenericResult(
                 status=api_pb2.GenericResult.GENERIC_STATUS_SUCCESS,
@@ -1,14 +1,18 @@
 # Copyright Modal Labs 2022
+import dataclasses
 import inspect
 import io
 import pickle
+import struct
 import typing
+import zlib
 from inspect import Parameter
-from typing import Any
+from typing import Any, Optional, Union
 
 import google.protobuf.message
 
 from modal._utils.async_utils import synchronizer
+from modal._utils.blob_utils import MAX_OBJECT_SIZE_BYTES, MultiBufferReader
 from modal_proto import api_pb2
 
 from ._object import _Object
@@ -23,10 +27,28 @@ if typing.TYPE_CHECKING:
 
 PICKLE_PROTOCOL = 4  # Support older Python versions.
 
+# Protocol used by `serialize_oob`, the first one to support out-of-band buffers.
+PICKLE_OOB_PROTOCOL = 5
+
+# Buffers smaller than this are pickled in-band, since framing them separately isn't worth it.
+PICKLE_OOB_MIN_BUFFER_SIZE = 64 * 1024
+
+# Pickles smaller than this aren't compressed by `serialize_compressed`, since it isn't worth the CPU time.
+COMPRESSION_MIN_SIZE = 32 * 1024
+# Favor speed: on redundant data, most of the size reduction already comes at the lowest level.
+COMPRESSION_LEVEL = 1
+# Compressed pickles are rejected if they decompress to more than this, so that a small payload can't expand
+# into an arbitrary amount of memory before it is even unpickled (or checked by the firewall).
+COMPRESSION_MAX_DECOMPRESSED_SIZE = 1024 * MAX_OBJECT_SIZE_BYTES
+
+# First byte of a `DATA_FORMAT_PICKLE_COMPRESSED` payload, saying how the rest of it is compressed.
+_CODEC_NONE = b"\x00"
+_CODEC_ZLIB = b"\x01"
+
 
 class Pickler(cloudpickle.Pickler):
-    def __init__(self, buf):
-        super().__init__(buf, protocol=PICKLE_PROTOCOL)
+    def __init__(self, buf, protocol: int = PICKLE_PROTOCOL, buffer_callback=None):
+        super().__init__(buf, protocol=protocol, buffer_callback=buffer_callback)
 
     def persistent_id(self, obj):
         from modal.partial_function import PartialFunction
@@ -62,9 +84,9 @@ class Pickler(cloudpickle.Pickler):
 
 
 class Unpickler(pickle.Unpickler):
-    def __init__(self, client, buf):
+    def __init__(self, client, buf, buffers=None):
         self.client = client
-        super().__init__(buf)
+        super().__init__(buf, buffers=buffers)
 
     def persistent_load(self, pid):
         if len(pid) == 2:
@@ -96,29 +118,52 @@ def serialize(obj: Any) -> bytes:
     return buf.getvalue()
 
 
-def deserialize(s: bytes, client, use_firewall: bool = False) -> Any:
+_firewall = None
+
+
+def _get_firewall():
+    """Returns the process-wide rffickle firewall, constructing it on first use.
+
+    Registering the default handlers is expensive compared to unpickling a small result, and a firewall isn't
+    modified by loading pickles, so one instance is shared by all deserializations (and threads).
+    """
+    global _firewall
+    if _firewall is None:
+        from fickle import DefaultFirewall
+
+        _firewall = DefaultFirewall()
+    return _firewall
+
+
+def deserialize(
+    s: Union[bytes, bytearray, memoryview], client, use_firewall: bool = False, buffers: Optional[list] = None
+) -> Any:
     """Deserializes object and replaces all client placeholders by self.
-    
+
     Args:
-        s: Serialized bytes to deserialize
+        s: Serialized bytes to deserialize. Other buffers, like downloaded blobs, are read without copying them.
         client: Modal client instance
         use_firewall: If True, use rffickle firewall for safe deserialization.
                      This should be set per-function using the use_firewall parameter.
+        buffers: Out-of-band buffers referenced by a protocol 5 pickle, see `deserialize_oob`.
     """
     from ._runtime.execution_context import is_local  # Avoid circular import
 
     env = "local" if is_local() else "remote"
+    if use_firewall and env == "local" and buffers is not None:
+        # The firewall only reads in-band pickles, and we never want to bypass it.
+        raise DeserializationError("Out-of-band pickle data can't be deserialized with the firewall enabled.")
     try:
         if use_firewall and env == "local":
             # CLIENT SIDE with firewall enabled: use rffickle for safety
             # NEVER fall back to regular pickle - if firewall is requested but unavailable, fail
-            from fickle import DefaultFirewall
-            firewall = DefaultFirewall()
             # This will block dangerous operations
-            return firewall.loads(s)
+            return _get_firewall().loads(bytes(s))
         else:
-            # Regular deserialization (server-side or firewall disabled)
-            return Unpickler(client, io.BytesIO(s)).load()
+            # Regular deserialization (server-side or firewall disabled).
+            # io.BytesIO only avoids copying its initial value if it's a bytes object.
+            buf = io.BytesIO(s) if isinstance(s, bytes) else MultiBufferReader([s])
+            return Unpickler(client, buf, buffers=buffers).load()
     except AttributeError as exc:
         # We use a different cloudpickle version pre- and post-3.11. Unfortunately cloudpickle
         # doesn't expose some kind of serialization version number, so we have to guess based
@@ -151,6 +196,135 @@ def deserialize(s: bytes, client, use_firewall: bool = False) -> Any:
         ) from exc
 
 
+def serialize_oob(obj: Any) -> list[memoryview]:
+    """Serializes object with pickle protocol 5, keeping large buffers (e.g. numpy arrays) out-of-band.
+
+    Returns the frames of a `DATA_FORMAT_PICKLE_OOB` payload, which is their concatenation:
+    a header with the frame lengths, the pickle stream, and then each out-of-band buffer.
+    The buffers are views into the memory of the serialized objects, so they aren't copied
+    until they are sent.
+    """
+    buffers: list[memoryview] = []
+
+    def buffer_callback(pickle_buffer: pickle.PickleBuffer) -> bool:
+        try:
+            raw = pickle_buffer.raw()
+        except BufferError:
+            return True  # Non-contiguous buffers have to be copied in-band.
+        if raw.nbytes < PICKLE_OOB_MIN_BUFFER_SIZE:
+            return True
+        buffers.append(raw)
+        return False
+
+    buf = io.BytesIO()
+    Pickler(buf, protocol=PICKLE_OOB_PROTOCOL, buffer_callback=buffer_callback).dump(obj)
+    pickled = buf.getbuffer()
+    header = struct.pack(f"<I{len(buffers) + 1}Q", len(buffers), pickled.nbytes, *(b.nbytes for b in buffers))
+    return [memoryview(header), pickled, *buffers]
+
+
+def deserialize_oob(s: Union[bytes, bytearray, memoryview], client, use_firewall: bool = False) -> Any:
+    """Deserializes a `DATA_FORMAT_PICKLE_OOB` payload produced by `serialize_oob`.
+
+    Buffers are passed to the unpickler without copying if `s` is writable, and copied otherwise,
+    so that objects like numpy arrays are writable just like after a regular unpickle. Large payloads
+    should be read into a writable buffer (see `blob_download_buffer`) so they aren't copied.
+    """
+    view = memoryview(s).cast("B")
+    try:
+        (num_buffers,) = struct.unpack_from("<I", view)
+        lengths = struct.unpack_from(f"<{num_buffers + 1}Q", view, 4)
+    except struct.error as exc:
+        raise DeserializationError("Out-of-band pickle data has a malformed header.") from exc
+    offset = 4 + 8 * (num_buffers + 1)
+    if offset + sum(lengths) != view.nbytes:
+        raise DeserializationError("Out-of-band pickle data has an unexpected length.")
+
+    frames = []
+    for length in lengths:
+        frames.append(view[offset : offset + length])
+        offset += length
+    pickled, *views = frames
+    buffers: list[Union[bytearray, memoryview]] = [bytearray(b) for b in views] if view.readonly else list(views)
+    return deserialize(pickled, client, use_firewall=use_firewall, buffers=buffers)
+
+
+@dataclasses.dataclass
+class CompressionStats:
+    """Running totals for `serialize_compressed`, for debug logging."""
+
+    payloads: int = 0
+    compressed_payloads: int = 0
+    raw_bytes: int = 0
+    compressed_bytes: int = 0
+
+    def record(self, raw_size: int, size: int) -> None:
+        self.payloads += 1
+        self.compressed_payloads += size < raw_size
+        self.raw_bytes += raw_size
+        self.compressed_bytes += size
+
+    def merge(self, other: "CompressionStats") -> None:
+        self.payloads += other.payloads
+        self.compressed_payloads += other.compressed_payloads
+        self.raw_bytes += other.raw_bytes
+        self.compressed_bytes += other.compressed_bytes
+
+    def ratio(self) -> float:
+        return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 1.0
+
+    def __str__(self) -> str:
+        return (
+            f"payloads={self.payloads} compressed_payloads={self.compressed_payloads} "
+            f"raw_bytes={self.raw_bytes} compressed_bytes={self.compressed_bytes} ratio={self.ratio():.2f}"
+        )
+
+
+def serialize_compressed(obj: Any, stats: Optional[CompressionStats] = None) -> bytes:
+    """Serializes object into a `DATA_FORMAT_PICKLE_COMPRESSED` payload.
+
+    The pickle is compressed with zlib if it's large enough and actually gets smaller, and stored as is otherwise.
+    """
+    buf = io.BytesIO()
+    buf.write(_CODEC_NONE)
+    Pickler(buf).dump(obj)
+    payload = buf.getbuffer()
+    raw_size = payload.nbytes - 1
+    if raw_size >= COMPRESSION_MIN_SIZE:
+        compressed = zlib.compress(payload[1:], COMPRESSION_LEVEL)
+        if len(compressed) < raw_size:
+            if stats is not None:
+                stats.record(raw_size, len(compressed))
+            return _CODEC_ZLIB + compressed
+    if stats is not None:
+        stats.record(raw_size, raw_size)
+    payload.release()
+    return buf.getvalue()
+
+
+def deserialize_compressed(s: Union[bytes, bytearray, memoryview], client, use_firewall: bool = False) -> Any:
+    """Deserializes a `DATA_FORMAT_PICKLE_COMPRESSED` payload produced by `serialize_compressed`."""
+    view = memoryview(s).cast("B")
+    codec = bytes(view[:1])
+    if codec == _CODEC_NONE:
+        pickled: Union[bytes, memoryview] = view[1:]
+    elif codec == _CODEC_ZLIB:
+        decompressor = zlib.decompressobj()
+        try:
+            pickled = decompressor.decompress(view[1:], COMPRESSION_MAX_DECOMPRESSED_SIZE)
+        except zlib.error as exc:
+            raise DeserializationError("Compressed pickle data is corrupt.") from exc
+        if decompressor.unconsumed_tail:
+            raise DeserializationError(
+                f"Compressed pickle data decompresses to more than {COMPRESSION_MAX_DECOMPRESSED_SIZE} bytes."
+            )
+        if not decompressor.eof:
+            raise DeserializationError("Compressed pickle data is truncated.")
+    else:
+        raise DeserializationError(f"Unknown compression codec {codec!r} in compressed pickle data.")
+    return deserialize(pickled, client, use_firewall=use_firewall)
+
+
 def _serialize_asgi(obj: Any) -> api_pb2.Asgi:
     def flatten_headers(obj):
         return [s for k, v in obj for s in (k, v)]
@@ -366,6 +540,10 @@ def serialize_data_format(obj: Any, data_format: int) -> bytes:
     """Similar to serialize(), but supports other data formats."""
     if data_format == api_pb2.DATA_FORMAT_PICKLE:
         return serialize(obj)
+    elif data_format == api_pb2.DATA_FORMAT_PICKLE_OOB:
+        return b"".join(serialize_oob(obj))
+    elif data_format == api_pb2.DATA_FORMAT_PICKLE_COMPRESSED:
+        return serialize_compressed(obj)
     elif data_format == api_pb2.DATA_FORMAT_ASGI:
         return _serialize_asgi(obj).SerializeToString(deterministic=True)
     elif data_format == api_pb2.DATA_FORMAT_GENERATOR_DONE:
@@ -375,9 +553,15 @@ def serialize_data_format(obj: Any, data_format: int) -> bytes:
         raise InvalidError(f"Unknown data format {data_format!r}")
 
 
-def deserialize_data_format(s: bytes, data_format: int, client, use_firewall: bool = False) -> Any:
+def deserialize_data_format(
+    s: Union[bytes, bytearray, memoryview], data_format: int, client, use_firewall: bool = False
+) -> Any:
     if data_format == api_pb2.DATA_FORMAT_PICKLE:
         return deserialize(s, client, use_firewall=use_firewall)
+    elif data_format == api_pb2.DATA_FORMAT_PICKLE_OOB:
+        return deserialize_oob(s, client, use_firewall=use_firewall)
+    elif data_format == api_pb2.DATA_FORMAT_PICKLE_COMPRESSED:
+        return deserialize_compressed(s, client, use_firewall=use_firewall)
     elif data_format == api_pb2.DATA_FORMAT_ASGI:
         return _deserialize_asgi(api_pb2.Asgi.FromString(s))
     elif data_format == api_pb2.DATA_FORMAT_GENERATOR_DONE:
@@ -336,32 +336,49 @@ class TimestampPriorityQueue(Generic[T]):
 
 
 async def queue_batch_iterator(
-    q: Union[asyncio.Queue, TimestampPriorityQueue], max_batch_size=100, debounce_time=0.015
+    q: Union[asyncio.Queue, TimestampPriorityQueue],
+    max_batch_size: Union[int, Callable[[], int]] = 100,
+    debounce_time=0.015,
+    *,
+    max_batch_bytes: Optional[int] = None,
+    item_size: Optional[Callable[[Any], int]] = None,
 ):
     """
     Read from a queue but return lists of items when queue is large
 
     Treats a None value as end of queue items
+
+    `max_batch_size` can be a callable, in which case it's re-evaluated for every batch. If `max_batch_bytes`
+    is set, a batch is also cut before the total `item_size(item)` of its items would exceed it. A single
+    item larger than `max_batch_bytes` is still yielded, as a batch of its own.
     """
     item_list: list[Any] = []
+    batch_bytes = 0
 
     while True:
         if q.empty() and len(item_list) > 0:
             yield item_list
             item_list = []
+            batch_bytes = 0
             await asyncio.sleep(debounce_time)
 
         res = await q.get()
 
-        if len(item_list) >= max_batch_size:
+        batch_size_limit = max_batch_size() if callable(max_batch_size) else max_batch_size
+        res_bytes = item_size(res) if (max_batch_bytes is not None and item_size and res is not None) else 0
+        if len(item_list) >= batch_size_limit or (
+            max_batch_bytes is not None and item_list and batch_bytes + res_bytes > max_batch_bytes
+        ):
             yield item_list
             item_list = []
+            batch_bytes = 0
 
         if res is None:
             if len(item_list) > 0:
                 yield item_list
             break
         item_list.append(res)
+        batch_bytes += res_bytes
 
 
 class _WarnIfGeneratorIsNotConsumed:
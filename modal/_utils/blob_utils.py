@@ -1,13 +1,20 @@
 # Copyright Modal Labs 2022
 import asyncio
+import bisect
 import dataclasses
 import hashlib
+import io
+import itertools
+import mmap
 import os
 import platform
 import random
+import tempfile
 import time
+import weakref
+from collections import OrderedDict
 from collections.abc import AsyncIterator
-from contextlib import AbstractContextManager, contextmanager
+from contextlib import AbstractContextManager, asynccontextmanager, contextmanager
 from io import BytesIO, FileIO
 from pathlib import Path, PurePosixPath
 from typing import (
@@ -17,6 +24,7 @@ from typing import (
     Callable,
     ContextManager,
     Optional,
+    Sequence,
     Union,
     cast,
 )
@@ -25,12 +33,14 @@ from urllib.parse import urlparse
 from modal_proto import api_pb2
 from modal_proto.modal_api_grpc import ModalClientModal
 
+from ..config import config
 from ..exception import ExecutionError
 from .async_utils import TaskContext, retry
 from .grpc_utils import retry_transient_errors
 from .hash_utils import UploadHashes, get_upload_hashes
 from .http_utils import ClientSessionRegistry
 from .logger import logger
+from .trace_utils import span
 
 if TYPE_CHECKING:
     from .bytes_io_segment_payload import BytesIOSegmentPayload
@@ -61,6 +71,81 @@ BLOCK_SIZE: int = 8 * 1024 * 1024
 
 HEALTHY_R2_UPLOAD_PERCENTAGE = 0.95
 
+# Max number of uploaded blob ids remembered per client, see `_BlobCache`.
+BLOB_CACHE_MAX_UPLOADS = 1024
+
+# Blobs are downloaded in parts of this size, using concurrent range requests.
+BLOB_DOWNLOAD_PART_SIZE = 16 * 1024 * 1024
+
+# Blobs at least this large are downloaded into a memory-mapped temporary file rather than anonymous memory,
+# so that the OS can page them out under memory pressure.
+BLOB_DOWNLOAD_MMAP_THRESHOLD = 1024**3
+
+
+class MultiBufferReader(io.RawIOBase):
+    """Read-only, seekable file object over a sequence of buffers, as if they were concatenated.
+
+    Used to hash and upload scattered payloads, like out-of-band pickle frames, without joining them first.
+    """
+
+    def __init__(self, buffers: Sequence[Union[bytes, bytearray, memoryview]]):
+        self._buffers = [memoryview(b).cast("B") for b in buffers]
+        self._offsets = list(itertools.accumulate((b.nbytes for b in self._buffers), initial=0))
+        self._size = self._offsets[-1]
+        self._pos = 0
+
+    def clone(self) -> "MultiBufferReader":
+        """Returns a new reader over the same buffers, with its own position."""
+        return MultiBufferReader(self._buffers)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence!r}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = self._size if size is None or size < 0 else min(self._size, self._pos + size)
+        parts = []
+        i = bisect.bisect_right(self._offsets, self._pos) - 1
+        while self._pos < end:
+            start = self._pos - self._offsets[i]
+            part = self._buffers[i][start : start + end - self._pos]
+            parts.append(part)
+            self._pos += part.nbytes
+            i += 1
+        return b"".join(parts)
+
+    def readinto(self, b) -> int:
+        out = memoryview(b).cast("B")
+        num_bytes = 0
+        i = bisect.bisect_right(self._offsets, self._pos) - 1
+        while num_bytes < out.nbytes and self._pos < self._size:
+            start = self._pos - self._offsets[i]
+            part = self._buffers[i][start : start + out.nbytes - num_bytes]
+            out[num_bytes : num_bytes + part.nbytes] = part
+            num_bytes += part.nbytes
+            self._pos += part.nbytes
+            i += 1
+        return num_bytes
+
 
 @retry(n_attempts=5, base_delay=0.5, timeout=None)
 async def _upload_to_s3_url(
@@ -133,6 +218,8 @@ async def perform_multipart_upload(
     if isinstance(data_file, BytesIO):
         view = data_file.getbuffer()  # does not copy data
         data_file_readers = [BytesIO(view) for _ in range(len(part_urls))]
+    elif isinstance(data_file, MultiBufferReader):
+        data_file_readers = [data_file.clone() for _ in range(len(part_urls))]
     else:
         filename = data_file.name
         data_file_readers = [open(filename, "rb") for _ in range(len(part_urls))]
@@ -179,6 +266,84 @@ async def perform_multipart_upload(
             )
 
 
+class _LRUCache:
+    """LRU cache whose entries expire after a time-to-live, bounded by the total size of its values."""
+
+    def __init__(self, max_size: int, ttl: float = float("inf"), sizeof: Callable[[Any], int] = lambda _: 1):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._size = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        size = self._sizeof(value)
+        if self.ttl <= 0 or size > self.max_size:
+            return
+        if key in self._entries:
+            self._pop(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._size += size
+        while self._size > self.max_size:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._size -= self._sizeof(value)
+
+
+class _BlobCache:
+    """Remembers blobs uploaded and downloaded through one stub, to avoid transferring the same data again.
+
+    Uploads are keyed by the content's sha256, so identical payloads reuse the blob created for the first one.
+    Downloads are keyed by blob id, which is safe because blobs are immutable.
+    """
+
+    def __init__(self):
+        self.uploads = _LRUCache(BLOB_CACHE_MAX_UPLOADS, ttl=config.get("blob_cache_ttl"))
+        self.downloads = _LRUCache(config.get("blob_download_cache_size"), sizeof=lambda data: data.nbytes)
+        self._upload_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def upload_lock(self, sha256_base64: str):
+        """Serializes concurrent uploads of the same content, so that only the first one actually uploads."""
+        if self.uploads.ttl <= 0:
+            yield
+            return
+        lock, users = self._upload_locks.get(sha256_base64, (asyncio.Lock(), 0))
+        self._upload_locks[sha256_base64] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._upload_locks[sha256_base64]
+            if users == 1:
+                del self._upload_locks[sha256_base64]
+            else:
+                self._upload_locks[sha256_base64] = (lock, users - 1)
+
+
+_blob_caches: "weakref.WeakKeyDictionary[ModalClientModal, _BlobCache]" = weakref.WeakKeyDictionary()
+
+
+def _get_blob_cache(stub: ModalClientModal) -> _BlobCache:
+    # Blob ids are only valid for the workspace they were created in, so each stub gets its own cache.
+    if stub not in _blob_caches:
+        _blob_caches[stub] = _BlobCache()
+    return _blob_caches[stub]
+
+
 def get_content_length(data: BinaryIO) -> int:
     # *Remaining* length of file from current seek position
     pos = data.tell()
@@ -278,15 +443,37 @@ async def _blob_upload(
     return blob_id, r2_failed, r2_throughput_bytes_s
 
 
-async def blob_upload_with_r2_failure_info(payload: bytes, stub: ModalClientModal) -> tuple[str, bool, int]:
-    size_mib = len(payload) / 1024 / 1024
-    logger.debug(f"Uploading large blob of size {size_mib:.2f} MiB")
-    t0 = time.time()
+async def blob_upload_with_r2_failure_info(
+    payload: Union[bytes, Sequence[memoryview]], stub: ModalClientModal
+) -> tuple[str, bool, int]:
+    """Uploads a blob. The payload can also be a list of buffers, which are uploaded as if concatenated."""
+    data: Union[bytes, BinaryIO]
     if isinstance(payload, str):
         logger.warning("Blob uploading string, not bytes - auto-encoding as utf8")
         payload = payload.encode("utf8")
-    upload_hashes = get_upload_hashes(payload)
-    blob_id, r2_failed, r2_throughput_bytes_s = await _blob_upload(upload_hashes, payload, stub)
+    if isinstance(payload, bytes):
+        data = payload
+        size_bytes = len(payload)
+    else:
+        reader = MultiBufferReader(payload)
+        data = cast(BinaryIO, reader)
+        size_bytes = get_content_length(data)
+    size_mib = size_bytes / 1024 / 1024
+    logger.debug(f"Uploading large blob of size {size_mib:.2f} MiB")
+    t0 = time.time()
+    with span("modal.blob_upload", {"blob.bytes": size_bytes}) as upload_span:
+        upload_hashes = get_upload_hashes(data)
+        cache = _get_blob_cache(stub)
+        async with cache.upload_lock(upload_hashes.sha256_base64):
+            cached_blob_id = cache.uploads.get(upload_hashes.sha256_base64)
+            if cached_blob_id is not None:
+                logger.debug(f"Reusing blob {cached_blob_id} with identical content instead of uploading")
+                upload_span.set_attribute("blob.cached", True)
+                return cached_blob_id, False, 0
+            blob_id, r2_failed, r2_throughput_bytes_s = await _blob_upload(upload_hashes, data, stub)
+            cache.uploads.put(upload_hashes.sha256_base64, blob_id)
+        upload_span.set_attribute("blob.id", blob_id)
+        upload_span.set_attribute("blob.r2_failed", r2_failed)
     dur_s = max(time.time() - t0, 0.001)  # avoid division by zero
     throughput_mib_s = (size_mib) / dur_s
     logger.debug(
@@ -295,7 +482,7 @@ async def blob_upload_with_r2_failure_info(payload: bytes, stub: ModalClientModa
     return blob_id, r2_failed, r2_throughput_bytes_s
 
 
-async def blob_upload(payload: bytes, stub: ModalClientModal) -> str:
+async def blob_upload(payload: Union[bytes, Sequence[memoryview]], stub: ModalClientModal) -> str:
     blob_id, _, _ = await blob_upload_with_r2_failure_info(payload, stub)
     return blob_id
 
@@ -312,28 +499,108 @@ async def blob_upload_file(
     return blob_id
 
 
+def _allocate_download_buffer(size: int) -> memoryview:
+    if size >= BLOB_DOWNLOAD_MMAP_THRESHOLD:
+        # The mapping stays valid after the (already unlinked) temporary file is closed.
+        with tempfile.TemporaryFile() as f:
+            f.truncate(size)
+            return memoryview(mmap.mmap(f.fileno(), size))
+    return memoryview(bytearray(size))
+
+
+async def _read_response_into(s3_resp, buf: memoryview) -> None:
+    """Streams a response body into `buf`, which must be exactly as large as the body."""
+    offset = 0
+    async for chunk in s3_resp.content.iter_any():
+        end = offset + len(chunk)
+        if end > buf.nbytes:
+            raise ExecutionError(f"Get from url returned more than the expected {buf.nbytes} bytes")
+        buf[offset:end] = chunk
+        offset = end
+    if offset != buf.nbytes:
+        raise ExecutionError(f"Get from url returned {offset} bytes, expected {buf.nbytes}")
+
+
+async def _raise_for_download_status(s3_resp, expected_status: int) -> None:
+    # S3 signal to slow down request rate.
+    if s3_resp.status == 503:
+        logger.warning("Received SlowDown signal from S3, sleeping for 1 second before retrying.")
+        await asyncio.sleep(1)
+
+    if s3_resp.status != expected_status:
+        text = await s3_resp.text()
+        raise ExecutionError(f"Get from url failed with status {s3_resp.status}: {text}")
+
+
 @retry(n_attempts=5, base_delay=0.1, timeout=None)
-async def _download_from_url(download_url: str) -> bytes:
-    async with ClientSessionRegistry.get_session().get(download_url) as s3_resp:
-        # S3 signal to slow down request rate.
-        if s3_resp.status == 503:
-            logger.warning("Received SlowDown signal from S3, sleeping for 1 second before retrying.")
-            await asyncio.sleep(1)
+async def _download_first_part(download_url: str, part_size: int) -> tuple[memoryview, int]:
+    """Downloads the first part of a blob into a buffer for the whole blob.
 
-        if s3_resp.status != 200:
-            text = await s3_resp.text()
-            raise ExecutionError(f"Get from url failed with status {s3_resp.status}: {text}")
-        return await s3_resp.read()
+    Returns the buffer and the number of bytes already written to it. If the server doesn't
+    support range requests, the whole blob is downloaded at once.
+    """
+    headers = {"Range": f"bytes=0-{part_size - 1}"}
+    async with ClientSessionRegistry.get_session().get(download_url, headers=headers) as s3_resp:
+        if s3_resp.status == 416:
+            return memoryview(bytearray()), 0  # Range not satisfiable, i.e. the blob is empty.
+
+        if s3_resp.status == 206:
+            # Content-Range looks like "bytes 0-1023/4096".
+            total_size = int(s3_resp.headers["Content-Range"].rsplit("/", 1)[1])
+            buf = _allocate_download_buffer(total_size)
+            first_part_size = min(part_size, total_size)
+            await _read_response_into(s3_resp, buf[:first_part_size])
+            return buf, first_part_size
+
+        await _raise_for_download_status(s3_resp, 200)
+        content_length = s3_resp.content_length
+        if content_length is None or "Content-Encoding" in s3_resp.headers:
+            # We can't size the buffer upfront, so fall back to reading the whole response.
+            buf = memoryview(bytearray(await s3_resp.read()))
+            return buf, buf.nbytes
+
+        buf = _allocate_download_buffer(content_length)
+        await _read_response_into(s3_resp, buf)
+        return buf, content_length
 
 
-async def blob_download(blob_id: str, stub: ModalClientModal) -> bytes:
-    """Convenience function for reading all of the downloaded file into memory."""
+@retry(n_attempts=5, base_delay=0.1, timeout=None)
+async def _download_part(download_url: str, buf: memoryview, start: int) -> None:
+    headers = {"Range": f"bytes={start}-{start + buf.nbytes - 1}"}
+    async with ClientSessionRegistry.get_session().get(download_url, headers=headers) as s3_resp:
+        await _raise_for_download_status(s3_resp, 206)
+        await _read_response_into(s3_resp, buf)
+
+
+async def _download_from_url_into_buffer(download_url: str) -> memoryview:
+    """Downloads a blob using concurrent HTTP range requests, each retried on its own."""
+    part_size = BLOB_DOWNLOAD_PART_SIZE
+    buf, downloaded = await _download_first_part(download_url, part_size)
+    semaphore = asyncio.Semaphore(BLOB_MAX_PARALLELISM)
+
+    async def download_part(start: int) -> None:
+        async with semaphore:
+            await _download_part(download_url, buf[start : start + part_size], start)
+
+    await TaskContext.gather(*(download_part(start) for start in range(downloaded, buf.nbytes, part_size)))
+    return buf
+
+
+async def blob_download_buffer(blob_id: str, stub: ModalClientModal) -> memoryview:
+    """Downloads a blob into a single writable buffer, sized upfront from the blob's size.
+
+    Large blobs are downloaded as parallel parts. Each part is written straight into the buffer.
+    The body is never materialized as a separate `bytes` object, so data can be deserialized
+    directly from the buffer.
+    """
     logger.debug(f"Downloading large blob {blob_id}")
     t0 = time.time()
-    req = api_pb2.BlobGetRequest(blob_id=blob_id)
-    resp = await retry_transient_errors(stub.BlobGet, req)
-    data = await _download_from_url(resp.download_url)
-    size_mib = len(data) / 1024 / 1024
+    with span("modal.blob_download", {"blob.id": blob_id}) as download_span:
+        req = api_pb2.BlobGetRequest(blob_id=blob_id)
+        resp = await retry_transient_errors(stub.BlobGet, req)
+        data = await _download_from_url_into_buffer(resp.download_url)
+        download_span.set_attribute("blob.bytes", data.nbytes)
+    size_mib = data.nbytes / 1024 / 1024
     dur_s = max(time.time() - t0, 0.001)  # avoid division by zero
     throughput_mib_s = size_mib / dur_s
     logger.debug(
@@ -342,6 +609,19 @@ async def blob_download(blob_id: str, stub: ModalClientModal) -> bytes:
     return data
 
 
+async def blob_download(blob_id: str, stub: ModalClientModal) -> memoryview:
+    """Convenience function for reading all of the downloaded file into memory.
+
+    Returns a read-only view of the downloaded buffer, since it may be shared through the download cache.
+    """
+    cache = _get_blob_cache(stub)
+    data = cache.downloads.get(blob_id)
+    if data is None:
+        data = (await blob_download_buffer(blob_id, stub)).toreadonly()
+        cache.downloads.put(blob_id, data)
+    return data
+
+
 async def blob_iter(blob_id: str, stub: ModalClientModal) -> AsyncIterator[bytes]:
     req = api_pb2.BlobGetRequest(blob_id=blob_id)
     resp = await retry_transient_errors(stub.BlobGet, req)
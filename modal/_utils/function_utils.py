@@ -5,7 +5,7 @@ import os
 from collections.abc import AsyncGenerator
 from enum import Enum
 from pathlib import Path, PurePosixPath
-from typing import Any, Callable, Literal, Optional
+from typing import Any, Callable, Literal, Optional, Union
 
 from grpclib import GRPCError
 from grpclib.exceptions import StreamTerminatedError
@@ -15,13 +15,16 @@ from modal_proto import api_pb2
 from modal_proto.modal_api_grpc import ModalClientModal
 
 from .._serialization import (
+    CompressionStats,
     deserialize,
     deserialize_data_format,
     serialize,
+    serialize_compressed,
+    serialize_oob,
     signature_to_parameter_specs,
 )
 from .._traceback import append_modal_tb
-from ..config import logger
+from ..config import config, logger
 from ..exception import (
     DeserializationError,
     ExecutionError,
@@ -33,10 +36,11 @@ from ..exception import (
 from ..mount import ROOT_DIR, _is_modal_path, _Mount
 from .blob_utils import (
     MAX_ASYNC_OBJECT_SIZE_BYTES,
-    blob_download,
+    blob_download_buffer,
     blob_upload_with_r2_failure_info,
 )
 from .grpc_utils import RETRYABLE_GRPC_STATUS_CODES
+from .trace_utils import current_span, span, traced
 
 
 class FunctionInfoType(Enum):
@@ -423,7 +427,7 @@ async def _stream_function_call_data(
                 if chunk.index <= last_index:
                     continue
                 if chunk.data_blob_id:
-                    message_bytes = await blob_download(chunk.data_blob_id, client.stub)
+                    message_bytes = await blob_download_buffer(chunk.data_blob_id, client.stub)
                 else:
                     message_bytes = chunk.data
                 message = deserialize_data_format(message_bytes, chunk.data_format, client)
@@ -449,6 +453,10 @@ async def _stream_function_call_data(
 OUTPUTS_TIMEOUT = 55.0  # seconds
 ATTEMPT_TIMEOUT_GRACE_PERIOD = 5  # seconds
 
+# Results at least this large are deserialized on a worker thread, so unpickling them doesn't block the event loop
+# (and other outputs being fetched). Smaller results aren't worth the thread hop.
+DESERIALIZE_IN_THREAD_MIN_SIZE = 256 * 1024
+
 
 def exc_with_hints(exc: BaseException):
     """mdmd:hidden"""
@@ -475,11 +483,17 @@ manually, for example:
     return exc
 
 
+@traced("modal.process_result")
 async def _process_result(result: api_pb2.GenericResult, data_format: int, stub, client=None, use_firewall: bool = False):
+    data: Union[bytes, memoryview]
     if result.WhichOneof("data_oneof") == "data_blob_id":
-        data = await blob_download(result.data_blob_id, stub)
+        data = await blob_download_buffer(result.data_blob_id, stub)
     else:
         data = result.data
+    process_span = current_span()
+    process_span.set_attribute("result.status", result.status)
+    process_span.set_attribute("result.data_format", data_format)
+    process_span.set_attribute("result.bytes", len(data))
 
     if result.status == api_pb2.GenericResult.GENERIC_STATUS_TIMEOUT:
         raise FunctionTimeoutError(result.exception)
@@ -520,6 +534,10 @@ async def _process_result(result: api_pb2.GenericResult, data_format: int, stub,
         raise RemoteError(result.exception)
 
     try:
+        if len(data) >= DESERIALIZE_IN_THREAD_MIN_SIZE:
+            return await asyncio.to_thread(
+                deserialize_data_format, data, data_format, client, use_firewall=use_firewall
+            )
         return deserialize_data_format(data, data_format, client, use_firewall=use_firewall)
     except ModuleNotFoundError as deser_exc:
         raise ExecutionError(
@@ -543,6 +561,39 @@ def should_upload(
     )
 
 
+def get_input_data_format(
+    use_firewall: bool,
+    compress_data: bool = False,
+    supports_pickle_oob: bool = False,
+    supports_pickle_compressed: bool = False,
+) -> "api_pb2.DataFormat.ValueType":
+    """Data format used to serialize function inputs. Containers send pickled results back in the same format.
+
+    Out-of-band and compressed pickles are only sent if the containers are known to read them, since containers
+    running an older client deserialize every input as a regular pickle.
+    """
+    if compress_data and supports_pickle_compressed:
+        return api_pb2.DATA_FORMAT_PICKLE_COMPRESSED
+    if config.get("pickle_oob") and supports_pickle_oob and not use_firewall:
+        # The firewall only deserializes regular pickles, so it never gets out-of-band results.
+        return api_pb2.DATA_FORMAT_PICKLE_OOB
+    return api_pb2.DATA_FORMAT_PICKLE
+
+
+def serialize_input(
+    args,
+    kwargs,
+    data_format: "api_pb2.DataFormat.ValueType",
+    compression_stats: Optional[CompressionStats] = None,
+) -> Union[bytes, list[memoryview]]:
+    """Serializes function arguments. Out-of-band pickles are returned as a list of frames, see `serialize_oob`."""
+    if data_format == api_pb2.DATA_FORMAT_PICKLE_OOB:
+        return serialize_oob((args, kwargs))
+    if data_format == api_pb2.DATA_FORMAT_PICKLE_COMPRESSED:
+        return serialize_compressed((args, kwargs), compression_stats)
+    return serialize((args, kwargs))
+
+
 # This must be called against the client stub, not the input-plane stub.
 async def _create_input(
     args,
@@ -553,23 +604,57 @@ async def _create_input(
     idx: Optional[int] = None,
     method_name: Optional[str] = None,
     function_call_invocation_type: Optional["api_pb2.FunctionCallInvocationType.ValueType"] = None,
+    data_format: "api_pb2.DataFormat.ValueType" = api_pb2.DATA_FORMAT_PICKLE,
 ) -> api_pb2.FunctionPutInputsItem:
     """Serialize function arguments and create a FunctionInput protobuf,
     uploading to blob storage if needed.
     """
+    with span("modal.serialize", {"input.data_format": data_format}):
+        args_serialized = serialize_input(args, kwargs, data_format)
+    return await _create_input_from_serialized(
+        args_serialized,
+        stub,
+        max_object_size_bytes=max_object_size_bytes,
+        idx=idx,
+        method_name=method_name,
+        function_call_invocation_type=function_call_invocation_type,
+        data_format=data_format,
+    )
+
+
+@traced("modal.create_input")
+async def _create_input_from_serialized(
+    args_serialized: Union[bytes, list[memoryview]],
+    stub: ModalClientModal,
+    *,
+    max_object_size_bytes: int,
+    idx: Optional[int] = None,
+    method_name: Optional[str] = None,
+    function_call_invocation_type: Optional["api_pb2.FunctionCallInvocationType.ValueType"] = None,
+    data_format: "api_pb2.DataFormat.ValueType" = api_pb2.DATA_FORMAT_PICKLE,
+) -> api_pb2.FunctionPutInputsItem:
+    """Like `_create_input`, but for arguments that have already been serialized with `serialize_input`."""
     if idx is None:
         idx = 0
     if method_name is None:
         method_name = ""  # proto compatible
 
-    args_serialized = serialize((args, kwargs))
-
-    if should_upload(len(args_serialized), max_object_size_bytes, function_call_invocation_type):
+    if isinstance(args_serialized, bytes):
+        num_bytes = len(args_serialized)
+    else:
+        num_bytes = sum(frame.nbytes for frame in args_serialized)
+    input_span = current_span()
+    input_span.set_attribute("input.idx", idx)
+    input_span.set_attribute("input.bytes", num_bytes)
+
+    if should_upload(num_bytes, max_object_size_bytes, function_call_invocation_type):
+        input_span.set_attribute("input.uploaded", True)
+        # Out-of-band frames are uploaded as they are, so large buffers are never copied into one payload.
         args_blob_id, r2_failed, r2_throughput_bytes_s = await blob_upload_with_r2_failure_info(args_serialized, stub)
         return api_pb2.FunctionPutInputsItem(
             input=api_pb2.FunctionInput(
                 args_blob_id=args_blob_id,
-                data_format=api_pb2.DATA_FORMAT_PICKLE,
+                data_format=data_format,
                 method_name=method_name,
             ),
             idx=idx,
@@ -577,10 +662,12 @@ async def _create_input(
             r2_throughput_bytes_s=r2_throughput_bytes_s,
         )
     else:
+        if not isinstance(args_serialized, bytes):
+            args_serialized = b"".join(args_serialized)
         return api_pb2.FunctionPutInputsItem(
             input=api_pb2.FunctionInput(
                 args=args_serialized,
-                data_format=api_pb2.DATA_FORMAT_PICKLE,
+                data_format=data_format,
                 method_name=method_name,
             ),
             idx=idx,
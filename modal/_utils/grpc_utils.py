@@ -30,6 +30,7 @@ from modal_version import __version__
 
 from .async_utils import retry
 from .logger import logger
+from .trace_utils import current_span
 
 RequestType = TypeVar("RequestType", bound=Message)
 ResponseType = TypeVar("ResponseType", bound=Message)
@@ -259,6 +260,7 @@ async def retry_transient_errors(
             logger.debug(f"Retryable failure {repr(exc)} {n_retries=} {delay=} for {fn.name} ({idempotency_key[:8]})")
 
             n_retries += 1
+            current_span().add("rpc.retries")
 
             if (
                 retry_warning_message
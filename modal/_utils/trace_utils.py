@@ -0,0 +1,279 @@
+# Copyright Modal Labs 2025
+"""Opt-in client-side tracing of function calls and maps.
+
+Spans follow the OpenTelemetry data model (hex trace and span ids, start and end times in nanoseconds since the
+epoch, attributes and a status), but OpenTelemetry isn't required. Spans are only recorded while a span processor
+is registered, either with `add_span_processor` or through the `trace_file` and `trace_otel` config options, so
+tracing costs next to nothing when it's off.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections.abc import AsyncGenerator, Iterator
+from typing import Any, Callable, Optional, Protocol, TypeVar
+
+from ..config import config, logger
+
+T = TypeVar("T")
+
+
+class Span:
+    """A timed operation, with attributes such as sizes and retry counts."""
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], attributes: dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.attributes = attributes
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano: Optional[int] = None
+        self.status_code = "UNSET"
+        self.status_message = ""
+        self._processors: list["SpanProcessor"] = []
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, n: int = 1):
+        """Increments a counter attribute, e.g. the number of retries."""
+        self.attributes[key] = self.attributes.get(key, 0) + n
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "attributes": self.attributes,
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+
+
+class _NoopSpan(Span):
+    # Stands in for a span while tracing is off, so call sites don't have to check.
+    def __init__(self):
+        super().__init__("noop", "", None, {})
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def add(self, key: str, n: int = 1):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanProcessor(Protocol):
+    def on_start(self, span: Span) -> None: ...
+
+    def on_end(self, span: Span) -> None: ...
+
+
+class FileSpanExporter:
+    """Appends every finished span to a file, as one JSON object per line.
+
+    Every span is flushed as soon as it's written. Spans that end after `close` are dropped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __enter__(self) -> "FileSpanExporter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def on_end(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class OpenTelemetrySpanProcessor:
+    """Mirrors spans to the global OpenTelemetry tracer provider. Requires `opentelemetry-api`."""
+
+    def __init__(self):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer("modal")
+        self._spans: dict[str, Any] = {}  # span_id -> OpenTelemetry span
+
+    def on_start(self, span: Span) -> None:
+        parent = self._spans.get(span.parent_span_id) if span.parent_span_id else None
+        # Without a parent, the span nests under whatever OpenTelemetry span is active, if any.
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        self._spans[span.span_id] = self._tracer.start_span(
+            span.name, context=context, start_time=span.start_time_unix_nano
+        )
+
+    def on_end(self, span: Span) -> None:
+        otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(f"modal.{key}", value if isinstance(value, (bool, int, float, str)) else str(value))
+        if span.status_code == "ERROR":
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.status_message))
+        otel_span.end(end_time=span.end_time_unix_nano)
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("modal_current_span", default=None)
+_processors: list[SpanProcessor] = []
+_file_exporters: dict[str, FileSpanExporter] = {}
+_otel_processor: Optional[OpenTelemetrySpanProcessor] = None
+_otel_unavailable = False
+
+
+def _close_file_exporters():
+    """Closes the exporters opened for the `trace_file` config option. Runs at interpreter exit."""
+    while _file_exporters:
+        _, exporter = _file_exporters.popitem()
+        exporter.close()
+
+
+atexit.register(_close_file_exporters)
+
+
+def add_span_processor(processor: SpanProcessor):
+    _processors.append(processor)
+
+
+def remove_span_processor(processor: SpanProcessor):
+    _processors.remove(processor)
+
+
+def _active_processors() -> list[SpanProcessor]:
+    global _otel_processor, _otel_unavailable
+    processors = list(_processors)
+    trace_file = config.get("trace_file")
+    if trace_file:
+        if trace_file not in _file_exporters:
+            _file_exporters[trace_file] = FileSpanExporter(trace_file)
+        processors.append(_file_exporters[trace_file])
+    if config.get("trace_otel") and not _otel_unavailable:
+        if _otel_processor is None:
+            try:
+                _otel_processor = OpenTelemetrySpanProcessor()
+            except ImportError:
+                _otel_unavailable = True
+                logger.warning("`trace_otel` is set, but `opentelemetry-api` isn't installed, so no spans are sent")
+        if _otel_processor is not None:
+            processors.append(_otel_processor)
+    return processors
+
+
+def current_span() -> Span:
+    """The innermost span being recorded, or a span that ignores everything if tracing is off."""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def start_span(name: str, attributes: Optional[dict[str, Any]] = None) -> Span:
+    """Starts a span nested under the current one, without making it current. It has to be passed to `end_span`.
+
+    Nested spans go to the same processors as the outermost one, so these are only looked up once per trace.
+    """
+    parent = _current_span.get()
+    # Under a no-op span, tracing was off when the outermost span started.
+    processors = parent._processors if parent is not None else _active_processors()
+    if not processors:
+        return _NOOP_SPAN
+
+    trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+    new_span = Span(name, trace_id, parent.span_id if parent is not None else None, dict(attributes or {}))
+    new_span._processors = processors
+    for processor in processors:
+        processor.on_start(new_span)
+    return new_span
+
+
+def end_span(span: Span, exc: Optional[BaseException] = None):
+    if span is _NOOP_SPAN:
+        return
+    if exc is not None:
+        span.status_code = "ERROR"
+        span.status_message = f"{type(exc).__name__}: {exc}"
+    span.end_time_unix_nano = time.time_ns()
+    for processor in span._processors:
+        processor.on_end(span)
+
+
+@contextlib.contextmanager
+def attach(span: Span) -> Iterator[Span]:
+    """Makes `span` the current span, so spans started in the enclosed code (and the tasks it creates) nest under it."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+def attach_gen(span: Span, gen: AsyncGenerator[T, None]) -> AsyncGenerator[T, None]:
+    """Runs an async generator with `span` as the current span.
+
+    Async generators can be resumed from different tasks, so this is only safe for a generator that's consumed
+    by a single task from start to end, like the ones merged by `async_merge`.
+    """
+    return _attached_gen(span, gen)
+
+
+async def _attached_gen(span: Span, gen: AsyncGenerator[T, None]) -> AsyncGenerator[T, None]:
+    with attach(span):
+        try:
+            async for item in gen:
+                yield item
+        finally:
+            await gen.aclose()
+
+
+@contextlib.contextmanager
+def span(name: str, attributes: Optional[dict[str, Any]] = None) -> Iterator[Span]:
+    """Records the enclosed code as a span, nested under the current span (also across asyncio tasks).
+
+    Don't use this around a `yield`: the span has to be started and ended in the same task.
+    """
+    new_span = start_span(name, attributes)
+    with attach(new_span):
+        try:
+            yield new_span
+        except BaseException as exc:
+            end_span(new_span, exc)
+            raise
+    end_span(new_span)
+
+
+def traced(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator that records every call of a coroutine function as a span. See `current_span` to add attributes."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
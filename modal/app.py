@@ -652,6 +652,7 @@ class _App:
         block_network: bool = False,  # Whether to block network access
         restrict_modal_access: bool = False,  # Whether to allow this function access to other Modal resources
         use_firewall: bool = False,  # Whether to use rffickle firewall for safe deserialization of results
+        compress_data: bool = False,  # Whether to compress large inputs and outputs to keep more of them inline
         # Maximum number of inputs a container should handle before shutting down.
         # With `max_inputs = 1`, containers will be single-use.
         max_inputs: Optional[int] = None,
@@ -823,6 +824,7 @@ class _App:
                 block_network=block_network,
                 restrict_modal_access=restrict_modal_access,
                 use_firewall=use_firewall,
+                compress_data=compress_data,
                 max_inputs=max_inputs,
                 scheduler_placement=scheduler_placement,
                 i6pn_enabled=i6pn_enabled,
@@ -878,6 +880,7 @@ class _App:
         block_network: bool = False,  # Whether to block network access
         restrict_modal_access: bool = False,  # Whether to allow this class access to other Modal resources
         use_firewall: bool = False,  # Whether to use rffickle firewall for safe deserialization of results
+        compress_data: bool = False,  # Whether to compress large inputs and outputs to keep more of them inline
         # Limits the number of inputs a container handles before shutting down.
         # Use `max_inputs = 1` for single-use containers.
         max_inputs: Optional[int] = None,
@@ -1010,6 +1013,7 @@ class _App:
                 block_network=block_network,
                 restrict_modal_access=restrict_modal_access,
                 use_firewall=use_firewall,
+                compress_data=compress_data,
                 max_inputs=max_inputs,
                 scheduler_placement=scheduler_placement,
                 i6pn_enabled=i6pn_enabled,
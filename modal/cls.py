@@ -179,6 +179,9 @@ def _bind_instance_method(cls: "_Cls", service_function: _Function, method_name:
     fun._app = service_function._app
     fun._spec = service_function._spec
     fun._use_firewall = service_function._use_firewall  # Copy the firewall flag from the service function
+    fun._compress_data = service_function._compress_data
+    fun._supports_pickle_oob = service_function._supports_pickle_oob
+    fun._supports_pickle_compressed = service_function._supports_pickle_compressed
     return fun
 
 
@@ -443,6 +446,9 @@ class _Obj:
         # Copy the firewall flag from the class service function if it exists
         if self._cls._class_service_function and hasattr(self._cls._class_service_function, '_use_firewall'):
             fun._use_firewall = self._cls._class_service_function._use_firewall
+            fun._compress_data = self._cls._class_service_function._compress_data
+            fun._supports_pickle_oob = self._cls._class_service_function._supports_pickle_oob
+            fun._supports_pickle_compressed = self._cls._class_service_function._supports_pickle_compressed
         return fun
 
 
@@ -71,6 +71,86 @@ Other possible configuration options are:
   The log formatting pattern that will be used by the modal client itself.
   See https://docs.python.org/3/library/logging.html#logrecord-attributes for available
   log attributes.
+* `blob_cache_ttl` (in the .toml file) / `MODAL_BLOB_CACHE_TTL` (as an env var).
+  Defaults to 0 (disabled).
+  Number of seconds during which a large function input or output is not uploaded
+  again if identical data was already uploaded. Set to 0 to always upload.
+* `blob_download_cache_size` (in the .toml file) / `MODAL_BLOB_DOWNLOAD_CACHE_SIZE` (as an env var).
+  Defaults to 0.
+  Number of bytes of downloaded function inputs and outputs to keep in memory, so that
+  repeated downloads of the same data are skipped.
+* `map_reorder_window` (in the .toml file) / `MODAL_MAP_REORDER_WINDOW` (as an env var).
+  Defaults to 100000.
+  Maximum number of outputs an ordered `.map()` holds while it waits for an earlier, slower
+  output. Once this many are held, no more inputs are sent until the earlier output arrives.
+* `map_reorder_spill` (in the .toml file) / `MODAL_MAP_REORDER_SPILL` (as an env var).
+  Defaults to False.
+  Whether an ordered `.map()` writes the outputs it holds to a temporary file instead of
+  keeping them in memory.
+* `map_feed_max_delay` (in the .toml file) / `MODAL_MAP_FEED_MAX_DELAY` (as an env var).
+  Defaults to 0.005.
+  Maximum number of seconds `.map()` waits to collect a batch of inputs before handing it
+  over to Modal, unless `feed_mode="latency"` is used.
+* `map_input_buffer_bytes` (in the .toml file) / `MODAL_MAP_INPUT_BUFFER_BYTES` (as an env var).
+  Defaults to 67108864 (64 MiB).
+  Maximum total size of serialized inputs a `.map()` holds while they wait to be sent. Once
+  this much is held, no more inputs are read from the input iterator until some are sent.
+  Set to 0 to only limit the number of inputs held.
+* `map_input_spill` (in the .toml file) / `MODAL_MAP_INPUT_SPILL` (as an env var).
+  Defaults to False.
+  Whether `.map()` keeps reading from the input iterator while it's behind, writing the
+  inputs it can't hold to a temporary file, instead of pausing the input iterator.
+* `input_prefetch` (in the .toml file) / `MODAL_INPUT_PREFETCH` (as an env var).
+  Defaults to 0 (disabled).
+  Maximum number of input batches a container fetches while all its input slots are busy, so
+  the next input can start as soon as a slot frees up. Fewer are fetched if calls take long
+  compared to a round trip to Modal. Set this in the container's environment, e.g. with
+  `Image.env()`. Has no effect on functions with `max_inputs=1`.
+* `deserialize_inputs_in_thread` (in the .toml file) / `MODAL_DESERIALIZE_INPUTS_IN_THREAD` (as an env var).
+  Defaults to False.
+  Whether containers deserialize the arguments of each input on a worker thread as soon as
+  they're downloaded, instead of right before the function is called. This keeps large
+  arguments from blocking the event loop of async functions. Argument types that unpickle
+  differently depending on the thread they're unpickled on shouldn't use this.
+* `generator_upload_concurrency` (in the .toml file) / `MODAL_GENERATOR_UPLOAD_CONCURRENCY` (as an env var).
+  Defaults to 4.
+  Maximum number of outputs of a generator function a container uploads to blob storage at the
+  same time. Only outputs too large to send inline are uploaded. Outputs are still delivered in
+  order. Set to 1 to upload one output at a time.
+* `dynamic_concurrency` (in the .toml file) / `MODAL_DYNAMIC_CONCURRENCY` (as an env var).
+  Defaults to "server".
+  How containers of functions with a `target_inputs` lower than their `max_inputs` pick their
+  concurrency. With "server", Modal picks it. With "local", each container adjusts it itself
+  from the latency of its inputs, event loop lag, and its CPU and memory use, so it backs off
+  before it's overloaded. Its decisions are logged at the debug level. Set this in the
+  container's environment, e.g. with `Image.env()`.
+* `output_flusher` (in the .toml file) / `MODAL_OUTPUT_FLUSHER` (as an env var).
+  Defaults to False.
+  Whether containers send outputs from a background task. An input's slot is then released as
+  soon as its output is queued, and outputs of concurrent inputs are sent together in fewer
+  requests. Queued outputs are sent before the container exits. Set this in the container's
+  environment, e.g. with `Image.env()`.
+* `output_flush_linger` (in the .toml file) / `MODAL_OUTPUT_FLUSH_LINGER` (as an env var).
+  Defaults to 0.
+  Maximum number of seconds the output flusher waits for more outputs before sending a
+  request that isn't full yet.
+* `remote_batch_window` (in the .toml file) / `MODAL_REMOTE_BATCH_WINDOW` (as an env var).
+  Defaults to 0 (disabled).
+  Maximum number of seconds a `.remote()` call waits for concurrent calls of the same function,
+  so they can be sent to Modal together in one request. Each call still gets its own result.
+  Only applies to functions that aren't generators.
+* `remote_batch_size` (in the .toml file) / `MODAL_REMOTE_BATCH_SIZE` (as an env var).
+  Defaults to 49.
+  Maximum number of `.remote()` calls sent together when `remote_batch_window` is set.
+* `trace_file` (in the .toml file) / `MODAL_TRACE_FILE` (as an env var).
+  Defaults to None.
+  Path of a file to append client-side tracing spans to, one JSON object per line. Spans
+  cover function calls and maps (input serialization, blob uploads and downloads, waiting
+  for outputs and deserializing them) and carry sizes and retry counts.
+* `trace_otel` (in the .toml file) / `MODAL_TRACE_OTEL` (as an env var).
+  Defaults to False.
+  Whether to also send client-side tracing spans to OpenTelemetry's global tracer provider.
+  Requires the `opentelemetry-api` package.
 
 Meta-configuration
 ------------------
@@ -236,6 +316,24 @@ _SETTINGS = {
     "traceback": _Setting(False, transform=_to_boolean),
     "image_builder_version": _Setting(),
     "strict_parameters": _Setting(False, transform=_to_boolean),  # For internal/experimental use
+    "pickle_oob": _Setting(False, transform=_to_boolean),  # Experimental: pickle protocol 5 out-of-band buffers
+    "blob_cache_ttl": _Setting(0.0, float),  # Seconds to reuse uploaded blobs for identical data, 0 to disable
+    "blob_download_cache_size": _Setting(0, int),  # Bytes of downloaded blobs to keep in memory, 0 to disable
+    "map_reorder_window": _Setting(100_000, int),  # Max outputs an ordered map holds before pausing its inputs
+    "map_reorder_spill": _Setting(False, transform=_to_boolean),  # Hold ordered map outputs on disk instead
+    "map_feed_max_delay": _Setting(0.005, float),  # Max seconds map inputs wait to be handed over in a batch
+    "map_input_buffer_bytes": _Setting(64 * 1024 * 1024, int),  # Max bytes of map inputs waiting to be sent
+    "map_input_spill": _Setting(False, transform=_to_boolean),  # Hold map inputs on disk while the map is behind
+    "input_prefetch": _Setting(0, int),  # Max batches of inputs a busy container fetches ahead of time
+    "deserialize_inputs_in_thread": _Setting(False, transform=_to_boolean),  # Deserialize container inputs early
+    "generator_upload_concurrency": _Setting(4, int),  # Max generator outputs a container uploads at a time
+    "dynamic_concurrency": _Setting("server", transform=_check_value(["server", "local"])),
+    "output_flusher": _Setting(False, transform=_to_boolean),  # Send container outputs from a background task
+    "output_flush_linger": _Setting(0.0, float),  # Max seconds container outputs wait to be sent together
+    "remote_batch_window": _Setting(0.0, float),  # Max seconds `.remote()` calls wait to be batched, 0 to disable
+    "remote_batch_size": _Setting(49, int),  # Max `.remote()` calls sent in one batch
+    "trace_file": _Setting(),  # Append client-side tracing spans to this file as JSON lines
+    "trace_otel": _Setting(False, transform=_to_boolean),  # Send client-side tracing spans to OpenTelemetry
     "snapshot_debug": _Setting(False, transform=_to_boolean),
     "cuda_checkpoint_path": _Setting("/__modal/.bin/cuda-checkpoint"),  # Used for snapshotting GPU memory.
     "build_validation": _Setting("error", transform=_check_value(["error", "warn", "ignore"])),
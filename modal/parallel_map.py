@@ -1,17 +1,31 @@
 # Copyright Modal Labs 2024
 import asyncio
+import collections
+import concurrent.futures
 import enum
+import functools
+import hashlib
 import inspect
+import io
+import json
+import os
+import pickle
+import random
+import tempfile
 import time
 import typing
 from asyncio import FIRST_COMPLETED
+from collections.abc import Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Any, Callable, Optional, Union
 
 from grpclib import Status
 
 import modal.exception
+from modal._object import _Object
 from modal._runtime.execution_context import current_input_id
+from modal._serialization import PICKLE_PROTOCOL, CompressionStats
 from modal._utils.async_utils import (
     AsyncOrSyncIterable,
     TimestampPriorityQueue,
@@ -32,12 +46,17 @@ from modal._utils.deprecation import deprecation_warning
 from modal._utils.function_utils import (
     ATTEMPT_TIMEOUT_GRACE_PERIOD,
     OUTPUTS_TIMEOUT,
-    _create_input,
+    _create_input_from_serialized,
     _process_result,
+    get_input_data_format,
+    serialize_input,
 )
 from modal._utils.grpc_utils import RETRYABLE_GRPC_STATUS_CODES, RetryWarningMessage, retry_transient_errors
 from modal._utils.jwt_utils import DecodedJwt
-from modal.config import logger
+from modal._utils.trace_utils import Span, attach, attach_gen, current_span, end_span, start_span, traced
+from modal._vendor import cloudpickle
+from modal.config import config, logger
+from modal.object import Object
 from modal.retries import RetryManager
 from modal_proto import api_pb2
 
@@ -50,19 +69,43 @@ PUMP_INPUTS_MAX_RETRIES = 8
 PUMP_INPUTS_MAX_RETRY_DELAY = 15
 
 
+def _timed_serialize(
+    args,
+    kwargs,
+    data_format: "api_pb2.DataFormat.ValueType",
+    compression_stats: Optional[CompressionStats] = None,
+) -> tuple[Union[bytes, list[memoryview]], float]:
+    t0 = time.monotonic()
+    data = serialize_input(args, kwargs, data_format, compression_stats)
+    return data, time.monotonic() - t0
+
+
 class _SynchronizedQueue:
     """mdmd:hidden"""
 
     # small wrapper around asyncio.Queue to make it cross-thread compatible through synchronicity
-    async def init(self):
+    async def init(self, maxsize: int = 0):
         # in Python 3.8 the asyncio.Queue is bound to the event loop on creation
         # so it needs to be created in a synchronicity-wrapped init method
-        self.q = asyncio.Queue()
+        self.q = asyncio.Queue(maxsize)
 
     @synchronizer.no_io_translation
     async def put(self, item):
         await self.q.put(item)
 
+    @synchronizer.no_io_translation
+    async def put_many(self, items: list):
+        for item in items:
+            if self.q.full():
+                await self.q.put(item)
+            else:
+                self.q.put_nowait(item)
+
+    @synchronizer.no_io_translation
+    async def room(self) -> int:
+        """Number of items that can be put without blocking, for a bounded queue."""
+        return max(0, self.q.maxsize - self.q.qsize())
+
     @synchronizer.no_io_translation
     async def get(self):
         return await self.q.get()
@@ -70,6 +113,207 @@ class _SynchronizedQueue:
 
 SynchronizedQueue = synchronize_api(_SynchronizedQueue)
 
+# In "throughput" feed mode, inputs are handed over to the map's event loop in batches of up to this many.
+MAP_FEED_BATCH_SIZE = 1000
+
+
+class _SpillPickler(cloudpickle.Pickler):
+    """Pickles a spilled map input, keeping the Modal objects it references in memory.
+
+    Spilled inputs are read back by the same process, so the objects are put back as they were instead of being
+    serialized by id and rehydrated, which would need a client and a hydrated object.
+    """
+
+    def __init__(self, buf, objects: list[Any]):
+        super().__init__(buf, protocol=PICKLE_PROTOCOL)
+        self.objects = objects
+
+    def persistent_id(self, obj):
+        from modal.partial_function import PartialFunction
+
+        if isinstance(obj, (_Object, Object, PartialFunction)):
+            self.objects.append(obj)
+            return len(self.objects) - 1
+        return None
+
+
+class _SpillUnpickler(pickle.Unpickler):
+    def __init__(self, buf, objects: list[Any]):
+        super().__init__(buf)
+        self.objects = objects
+
+    def persistent_load(self, pid):
+        return self.objects[pid]
+
+
+class _InputSpill:
+    """A FIFO of map inputs that are pickled to a temporary file while the map's input queue is full."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(prefix="modal-map-inputs-")
+        # The length of each spilled input, and the Modal objects it references.
+        self._entries: collections.deque[tuple[int, list[Any]]] = collections.deque()
+        self._read_offset = 0
+        # Stats, for debug logging.
+        self.spilled = 0
+        self.spilled_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def push(self, item: Any):
+        buf = io.BytesIO()
+        objects: list[Any] = []
+        _SpillPickler(buf, objects).dump(item)
+        data = buf.getvalue()
+        self._file.seek(0, io.SEEK_END)
+        self._file.write(data)
+        self._entries.append((len(data), objects))
+        self.spilled += 1
+        self.spilled_bytes += len(data)
+
+    def pop(self) -> Any:
+        length, objects = self._entries.popleft()
+        self._file.seek(self._read_offset)
+        item = _SpillUnpickler(io.BytesIO(self._file.read(length)), objects).load()
+        self._read_offset += length
+        if not self._entries:
+            # Everything was read back, so the file can start over instead of growing forever.
+            self._file.truncate(0)
+            self._read_offset = 0
+        return item
+
+    def close(self):
+        self._file.close()
+
+
+class _BatchedInputFeeder:
+    """Puts inputs on a `SynchronizedQueue` in batches, crossing the synchronicity thread boundary once per batch.
+
+    A batch is handed over once it has `max_batch_size` inputs, or at most `max_delay` seconds after its first
+    input was added, so slow input iterators don't hold back the inputs they already produced.
+
+    The queue is bounded, so handing over a batch blocks while the map is behind. With `spill`, inputs that
+    don't fit are pickled to a temporary file instead, and moved to the queue in order as room frees up, so
+    the input iterator can be consumed at its own pace without holding all of its inputs in memory.
+    """
+
+    def __init__(self, queue: Any, *, max_batch_size: int, max_delay: float, spill: bool = False):
+        self.queue = queue
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._batch: list[Any] = []
+        self._batch_started = asyncio.Event()
+        self._lock = asyncio.Lock()  # keeps batches in order when the timer and a full batch flush at once
+        self.spill = _InputSpill() if spill else None
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        """Starts the background tasks that flush batches after `max_delay` and move spilled inputs to the queue."""
+        self._tasks.append(asyncio.create_task(self.flush_periodically()))
+        if self.spill is not None:
+            self._tasks.append(asyncio.create_task(self.unspill_periodically()))
+
+    def _raise_if_failed(self):
+        # The background tasks only stop if they fail, e.g. when a timed flush couldn't hand its batch over.
+        for task in self._tasks:
+            if task.done():
+                task.result()
+
+    async def put(self, item: Any):
+        self._raise_if_failed()
+        self._batch.append(item)
+        if len(self._batch) == 1:
+            self._batch_started.set()
+        if len(self._batch) >= self.max_batch_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            batch, self._batch = self._batch, []
+            self._batch_started.clear()
+            if not batch:
+                return
+            if self.spill is None:
+                await self.queue.put_many.aio(batch)
+                return
+            if not self.spill:
+                # Nothing is waiting on disk, so as much of the batch as fits can go straight to the queue.
+                room = await self.queue.room.aio()
+                if room:
+                    await self.queue.put_many.aio(batch[:room])
+                batch = batch[room:]
+            for item in batch:
+                self.spill.push(item)
+
+    async def flush_periodically(self):
+        while True:
+            await self._batch_started.wait()
+            await asyncio.sleep(self.max_delay)
+            await self.flush()
+
+    async def unspill_periodically(self):
+        assert self.spill is not None
+        while True:
+            await asyncio.sleep(MAP_INPUT_SPILL_POLL_INTERVAL)
+            if self.spill:
+                async with self._lock:
+                    await self._unspill(min(await self.queue.room.aio(), self.max_batch_size))
+
+    async def flush_spilled(self):
+        """Moves all spilled inputs to the queue, waiting for room as needed."""
+        self._raise_if_failed()
+        if self.spill is not None:
+            async with self._lock:
+                while self.spill:
+                    await self._unspill(self.max_batch_size)
+
+    async def _unspill(self, max_items: int):
+        assert self.spill is not None
+        items = [self.spill.pop() for _ in range(min(max_items, len(self.spill)))]
+        if items:
+            await self.queue.put_many.aio(items)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.spill is not None:
+            if self.spill.spilled:
+                logger.debug(f"Spilled {self.spill.spilled} map inputs ({self.spill.spilled_bytes} bytes) to disk")
+            self.spill.close()
+
+
+async def _feed_raw_input_queue(
+    raw_input_queue: Any, async_input_gen: typing.AsyncGenerator[Any, None], kwargs: dict, feed_mode: str
+):
+    """Feeds `(args, kwargs)` pairs from the caller's event loop to a map's `SynchronizedQueue`.
+
+    The "latency" mode hands over every input as soon as it's produced. The "throughput" mode batches them,
+    which is much faster for many small inputs, at the cost of up to `map_feed_max_delay` seconds of latency,
+    and spills inputs to disk while the map is behind if `map_input_spill` is set.
+    """
+    async with aclosing(async_input_gen) as streamer:
+        if feed_mode == "latency":
+            async for args in streamer:
+                await raw_input_queue.put.aio((args, kwargs))
+        else:
+            feeder = _BatchedInputFeeder(
+                raw_input_queue,
+                max_batch_size=MAP_FEED_BATCH_SIZE,
+                max_delay=config.get("map_feed_max_delay"),
+                spill=config.get("map_input_spill"),
+            )
+            feeder.start()
+            try:
+                async for args in streamer:
+                    await feeder.put((args, kwargs))
+                await feeder.flush()
+                await feeder.flush_spilled()
+            finally:
+                await feeder.close()
+    await raw_input_queue.put.aio(None)  # end-of-input sentinel
+
 
 @dataclass
 class _OutputValue:
@@ -79,15 +323,508 @@ class _OutputValue:
 
 MAX_INPUTS_OUTSTANDING_DEFAULT = 1000
 
+# A map holds at most this many inputs that still have to be serialized, and at most this many serialized
+# inputs (and `map_input_buffer_bytes` of them) that still have to be sent. Beyond that, the input iterator
+# isn't advanced until the map catches up, unless `map_input_spill` is set.
+MAP_INPUT_QUEUE_SIZE = MAX_INPUTS_OUTSTANDING_DEFAULT
+
+# How often spilled inputs are moved back to a map's input queue, in seconds.
+MAP_INPUT_SPILL_POLL_INTERVAL = 0.01
+
 # Maximum number of inputs to send to the server per FunctionPutInputs request
 MAP_INVOCATION_CHUNK_SIZE = 49
 SPAWN_MAP_INVOCATION_CHUNK_SIZE = 512
 
+# A spawn_map journal is fsynced after this many acknowledged FunctionPutInputs chunks, so a crash can cause at
+# most this many chunks to be submitted again on resume.
+SPAWN_MAP_JOURNAL_FSYNC_CHUNKS = 16
+
+# Soft limit on the total serialized size of the inputs in one FunctionPutInputs request. A single input
+# larger than this is still sent, in a request of its own.
+MAP_INVOCATION_CHUNK_MAX_BYTES = 8 * 1024 * 1024  # 8 MiB
+
+# FunctionPutInputs requests that take longer than this (including retries) shrink the chunk size.
+MAP_INVOCATION_CHUNK_TARGET_LATENCY = 1.0  # seconds
+
+# Bounds on the number of outputs requested per FunctionGetOutputs call, see `_OutputWindowSizer`.
+MAP_OUTPUTS_WINDOW_MIN = 100
+MAP_OUTPUTS_WINDOW_MAX = 10_000
+
+# Maximum number of outputs being downloaded and deserialized at once. Outputs are fetched out of order,
+# so one slow blob download doesn't hold up the ones behind it.
+MAP_OUTPUT_FETCH_CONCURRENCY = BLOB_MAX_PARALLELISM
+
+# Input-plane maps re-send at most this many lost inputs per MapCheckInputs round (about once a second). Lost
+# inputs over the budget are left alone and picked up again by the next round, so a zone failure turns into a
+# steady stream of batched MapStartOrContinue retries instead of a single burst.
+MAP_LOST_INPUT_RETRY_BUDGET = 1000
+# All lost-input retries of a round are scheduled together (so they're sent in full batches) after a random
+# delay of up to this many seconds, so that many clients hit by the same failure don't retry in lockstep.
+MAP_LOST_INPUT_RETRY_JITTER = 1.0
+
 
 if typing.TYPE_CHECKING:
     import modal.functions
 
 
+class _InputChunkSizer:
+    """AIMD controller for the number of inputs sent per FunctionPutInputs request.
+
+    Starts at `max_chunk_size`. Every request that completes within the target latency grows the chunk
+    size additively, and every slow request (usually one that was retried due to RESOURCE_EXHAUSTED)
+    halves it. The total byte size of a chunk is bounded separately by `max_chunk_bytes`.
+    """
+
+    def __init__(
+        self,
+        max_chunk_size: int,
+        *,
+        max_chunk_bytes: Optional[int] = None,
+        target_latency: Optional[float] = None,
+    ):
+        self.max_chunk_size = max_chunk_size
+        self.max_chunk_bytes = max_chunk_bytes or MAP_INVOCATION_CHUNK_MAX_BYTES
+        self.target_latency = target_latency or MAP_INVOCATION_CHUNK_TARGET_LATENCY
+        self.chunk_size = max_chunk_size
+        self._increase_step = max(1, max_chunk_size // 16)
+        # Stats about the chunks actually sent, for debug logging.
+        self.chunks_sent = 0
+        self.min_chunk_sent = 0
+        self.max_chunk_sent = 0
+        self._inputs_sent = 0
+
+    def get_chunk_size(self) -> int:
+        return self.chunk_size
+
+    def record(self, num_inputs: int, latency: float):
+        self.chunks_sent += 1
+        self._inputs_sent += num_inputs
+        self.min_chunk_sent = num_inputs if self.chunks_sent == 1 else min(self.min_chunk_sent, num_inputs)
+        self.max_chunk_sent = max(self.max_chunk_sent, num_inputs)
+
+        if latency > self.target_latency:
+            self.chunk_size = max(1, self.chunk_size // 2)
+        elif num_inputs >= self.chunk_size:
+            # Only grow when the chunk was actually full, otherwise the input rate is the bottleneck.
+            self.chunk_size = min(self.max_chunk_size, self.chunk_size + self._increase_step)
+
+    def stats(self) -> str:
+        mean_chunk_sent = self._inputs_sent / self.chunks_sent if self.chunks_sent else 0.0
+        return (
+            f"chunk_size={self.chunk_size} chunks_sent={self.chunks_sent} min_chunk_sent={self.min_chunk_sent} "
+            f"max_chunk_sent={self.max_chunk_sent} mean_chunk_sent={mean_chunk_sent:.1f}"
+        )
+
+
+class _OutputWindowSizer:
+    """Adapts the number of outputs requested per FunctionGetOutputs call to how fast they're consumed.
+
+    Outputs of a response are handed to the bounded fetch stage one at a time, so handing them all off takes
+    longer than the poll itself when the caller (or fetching) is the bottleneck. Then the window is halved, so
+    fewer outputs are held in memory waiting for the caller. Full responses that are handed off quickly double it
+    again, up to `max_size`.
+    """
+
+    def __init__(self, *, min_size: Optional[int] = None, max_size: Optional[int] = None):
+        self.min_size = min_size or MAP_OUTPUTS_WINDOW_MIN
+        self.max_size = max_size or MAP_OUTPUTS_WINDOW_MAX
+        self.window_size = self.max_size
+        # Stats, for debug logging.
+        self.polls = 0
+        self.min_window_size = self.window_size
+
+    def get_window_size(self) -> int:
+        return self.window_size
+
+    def record(self, num_outputs: int, poll_latency: float, handoff_latency: float):
+        self.polls += 1
+        if handoff_latency > poll_latency:
+            self.window_size = max(self.min_size, self.window_size // 2)
+        elif num_outputs >= self.window_size:
+            # Only grow when the response was full, otherwise the output rate is the bottleneck.
+            self.window_size = min(self.max_size, self.window_size * 2)
+        self.min_window_size = min(self.min_window_size, self.window_size)
+
+    def stats(self) -> str:
+        return f"window_size={self.window_size} min_window_size={self.min_window_size} polls={self.polls}"
+
+
+class _OutputReorderBuffer:
+    """Holds the outputs of an ordered map until all outputs before them have been yielded.
+
+    Outputs may only get `window` indices ahead of the next one to yield: `wait_for_room` blocks the input side
+    until the caller catches up, so a single straggler can't make the buffer grow without bound. With `spill`,
+    held outputs are pickled to a temporary file instead of being kept in memory, like spilled inputs.
+    """
+
+    def __init__(self, *, next_idx: int, window: int, spill: bool = False):
+        self.next_idx = next_idx
+        self.window = window if window > 0 else None
+        self._outputs: dict[int, Any] = {}
+        # idx -> (offset, length) in the spill file, and the Modal objects the output references
+        self._spilled: dict[int, tuple[int, int, list[Any]]] = {}
+        self._spill_file = tempfile.TemporaryFile(prefix="modal-map-") if spill else None
+        self._advanced = asyncio.Event()
+        # Stats, for debug logging.
+        self.max_held = 0
+        self.spilled_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._outputs) + len(self._spilled)
+
+    async def wait_for_room(self, idx: int):
+        while self.window is not None and idx >= self.next_idx + self.window:
+            self._advanced.clear()
+            await self._advanced.wait()
+
+    def put(self, idx: int, output: Any):
+        if self._spill_file is None or idx == self.next_idx:
+            self._outputs[idx] = output
+        else:
+            buf = io.BytesIO()
+            objects: list[Any] = []
+            _SpillPickler(buf, objects).dump(output)
+            data = buf.getvalue()
+            self._spill_file.seek(0, io.SEEK_END)
+            self._spilled[idx] = (self._spill_file.tell(), len(data), objects)
+            self._spill_file.write(data)
+            self.spilled_bytes += len(data)
+        self.max_held = max(self.max_held, len(self))
+
+    def pop_ready(self) -> Iterator[Any]:
+        """Yields the outputs that can be returned now, in order."""
+        while True:
+            if self.next_idx in self._outputs:
+                output = self._outputs.pop(self.next_idx)
+            elif self.next_idx in self._spilled:
+                assert self._spill_file is not None
+                offset, length, objects = self._spilled.pop(self.next_idx)
+                self._spill_file.seek(offset)
+                output = _SpillUnpickler(io.BytesIO(self._spill_file.read(length)), objects).load()
+            else:
+                # we haven't received the output for the current index yet.
+                break
+            self._advance()
+            yield output
+
+    def _advance(self):
+        self.next_idx += 1
+        self._advanced.set()
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+
+    def stats(self) -> str:
+        return f"held={len(self)} max_held={self.max_held} spilled_bytes={self.spilled_bytes}"
+
+
+def _reorder_buffer_from_config(order_outputs: bool, next_idx: int) -> Optional[_OutputReorderBuffer]:
+    if not order_outputs:
+        return None
+    return _OutputReorderBuffer(
+        next_idx=next_idx, window=config.get("map_reorder_window"), spill=config.get("map_reorder_spill")
+    )
+
+
+class _InputBacklog:
+    """Bounds the serialized inputs of a map that are waiting to be sent, by count and by total size.
+
+    `add` blocks the input side while either limit is reached, until `remove` is called for inputs that
+    were sent. A single input larger than `max_bytes` still gets through once the backlog is empty.
+    """
+
+    def __init__(self, *, max_inputs: int, max_bytes: int):
+        self.max_inputs = max_inputs
+        self.max_bytes = max_bytes if max_bytes > 0 else None
+        self.inputs = 0
+        self.bytes = 0
+        self._removed = asyncio.Event()
+        # Stats, for debug logging.
+        self.max_held_bytes = 0
+
+    def _is_full(self, num_bytes: int) -> bool:
+        if self.inputs == 0:
+            return False
+        if self.inputs >= self.max_inputs:
+            return True
+        return self.max_bytes is not None and self.bytes + num_bytes > self.max_bytes
+
+    async def add(self, num_bytes: int):
+        while self._is_full(num_bytes):
+            self._removed.clear()
+            await self._removed.wait()
+        self.inputs += 1
+        self.bytes += num_bytes
+        self.max_held_bytes = max(self.max_held_bytes, self.bytes)
+
+    def remove(self, num_inputs: int, num_bytes: int):
+        self.inputs -= num_inputs
+        self.bytes -= num_bytes
+        self._removed.set()
+
+    def stats(self) -> str:
+        return f"held={self.inputs} held_bytes={self.bytes} max_held_bytes={self.max_held_bytes}"
+
+
+def _input_backlog_from_config() -> _InputBacklog:
+    return _InputBacklog(max_inputs=MAP_INPUT_QUEUE_SIZE, max_bytes=config.get("map_input_buffer_bytes"))
+
+
+@dataclass
+class _SerializedInput:
+    # An input that was already serialized to check it for duplicates, see _MapDeduplicator.
+    data: Union[bytes, list[memoryview]]
+
+
+class _MapDeduplicator:
+    """Collapses identical inputs of a `map(dedupe=True)` call and fans each result back out to all of them.
+
+    Inputs are compared by a hash of their serialized form, and only the first occurrence of each distinct
+    input is sent. Since a duplicate can come up at any point of the input stream, every distinct result is
+    kept until the map is done.
+    """
+
+    def __init__(self, *, order_outputs: bool, first_idx: int):
+        self.order_outputs = order_outputs
+        self._next_unique_idx = first_idx
+        self._unique_idxs: dict[bytes, int] = {}  # input hash -> map idx of its first occurrence
+        self._results: dict[int, Any] = {}
+        # Ordered maps: map idx of the result of every input so far, and the next input to yield a result for.
+        self._sources: list[int] = []
+        self._next_position = 0
+        # Unordered maps: inputs still waiting for their result, and duplicates whose result is already known.
+        self._waiting: dict[int, int] = {}
+        self._late: list[int] = []
+        # Stats, for debug logging.
+        self.duplicates = 0
+
+    def add(self, args_serialized: Union[bytes, list[memoryview]]) -> bool:
+        """Records an input, in input order. Returns whether it's the first of its kind and has to be sent."""
+        h = hashlib.sha256()
+        if isinstance(args_serialized, bytes):
+            h.update(args_serialized)
+        else:
+            for frame in args_serialized:
+                h.update(frame)
+        key = h.digest()
+        is_unique = key not in self._unique_idxs
+        if is_unique:
+            self._unique_idxs[key] = self._next_unique_idx
+            self._next_unique_idx += 1
+        else:
+            self.duplicates += 1
+        idx = self._unique_idxs[key]
+
+        if self.order_outputs:
+            self._sources.append(idx)
+        elif idx in self._results:
+            self._late.append(idx)
+        else:
+            self._waiting[idx] = self._waiting.get(idx, 0) + 1
+        return is_unique
+
+    def fan_out(self, idx: int, output: Any) -> Iterator[Any]:
+        """Takes the result of a distinct input, and yields all results that can be returned now."""
+        self._results[idx] = output
+        if not self.order_outputs:
+            yield from [output] * self._waiting.pop(idx)
+        yield from self.flush()
+
+    def flush(self) -> Iterator[Any]:
+        if self.order_outputs:
+            while self._next_position < len(self._sources) and self._sources[self._next_position] in self._results:
+                self._next_position += 1
+                yield self._results[self._sources[self._next_position - 1]]
+        else:
+            late, self._late = self._late, []
+            for idx in late:
+                yield self._results[idx]
+
+    def stats(self) -> str:
+        return f"distinct={len(self._unique_idxs)} duplicates={self.duplicates}"
+
+
+class _SpawnMapJournal:
+    """Append-only on-disk record of the inputs of a `spawn_map` call that the server has acknowledged.
+
+    The journal is keyed by the Function's object id, since the function call it resumes belongs to that
+    Function: an ephemeral app gets new ids on every `app.run()`, so only deployed Functions can be resumed
+    across runs.
+
+    The journal is a JSON-lines file: a header with the function call id, then one `{"start": .., "end": ..}`
+    line per acknowledged FunctionPutInputs chunk, then a `{"finished": .., "num_inputs": ..}` line once all
+    inputs have been sent. Running `spawn_map` again with the same journal reuses the function call and skips
+    (without serializing) every input below `num_acked`. Records are fsynced in batches, so resuming after a
+    crash can submit the last few chunks twice, but never drops an input.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], function_id: str):
+        self.path = path
+        self.function_id = function_id
+        self.function_call_id: Optional[str] = None
+        self.num_acked = 0  # all inputs with a smaller idx were acknowledged by the server
+        self.num_inputs: Optional[int] = None  # set once all inputs have been sent
+        self._unsynced_chunks = 0
+        valid_size = self._load() if os.path.exists(path) else 0
+        self._file = open(path, "ab")
+        # Drop a record torn by a crash in the middle of a write, so new records start on a fresh line.
+        self._file.truncate(valid_size)
+
+    def _load(self) -> int:
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except json.JSONDecodeError:
+                    record = None
+                if not isinstance(record, dict):
+                    break
+                valid_size += len(line)
+                if "function_call_id" in record:
+                    if record["function_id"] != self.function_id:
+                        raise modal.exception.InvalidError(
+                            f"spawn_map journal {self.path} belongs to a different Function ({record['function_id']})."
+                            " A journal can only be resumed for the same deployed Function, or within the same"
+                            " `app.run()`."
+                        )
+                    self.function_call_id = record["function_call_id"]
+                elif "start" in record:
+                    if record["start"] <= self.num_acked:
+                        self.num_acked = max(self.num_acked, record["end"])
+                elif "finished" in record:
+                    self.num_inputs = record["num_inputs"]
+        return valid_size
+
+    def _append(self, record: dict, sync: bool):
+        self._file.write(json.dumps(record).encode() + b"\n")
+        if sync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced_chunks = 0
+
+    def start(self, function_call_id: str):
+        self.function_call_id = function_call_id
+        self._append({"function_id": self.function_id, "function_call_id": function_call_id}, sync=True)
+
+    def record_acked(self, start: int, end: int):
+        self._unsynced_chunks += 1
+        self._append({"start": start, "end": end}, sync=self._unsynced_chunks >= SPAWN_MAP_JOURNAL_FSYNC_CHUNKS)
+        self.num_acked = max(self.num_acked, end)
+
+    def finish(self, num_inputs: int):
+        self.num_inputs = num_inputs
+        self._append({"finished": True, "num_inputs": num_inputs}, sync=True)
+
+    def close(self):
+        if self._unsynced_chunks:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class _InputSerializer:
+    """Reads the inputs of a map from its raw-input queue, and serializes them inline or on a thread pool.
+
+    Shared by the control-plane and input-plane maps, which only differ in how the serialized inputs are sent.
+    """
+
+    def __init__(
+        self,
+        raw_input_queue: _SynchronizedQueue,
+        function: "modal.functions._Function",
+        *,
+        serialize_workers: Optional[int] = None,
+        skip_inputs: int = 0,
+        deduplicator: Optional[_MapDeduplicator] = None,
+    ):
+        self.raw_input_queue = raw_input_queue
+        # Inputs already sent by an earlier, interrupted spawn_map are dropped before serialization.
+        self.skip_inputs = skip_inputs
+        self.data_format = get_input_data_format(
+            function._use_firewall,
+            function._compress_data,
+            function._supports_pickle_oob,
+            function._supports_pickle_compressed,
+        )
+        self.serialize_workers = serialize_workers
+        # With `map(dedupe=True)`, inputs identical to an earlier one are dropped after serialization.
+        self.deduplicator = deduplicator
+        self.serialize_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        # Total time spent pickling inputs, summed over all serialization workers.
+        self.serialize_time = 0.0
+        self.compression_stats = CompressionStats()
+
+    async def input_iter(self):
+        if self.deduplicator is None:
+            async with aclosing(self._raw_input_iter()) as stream:
+                async for raw_input in stream:
+                    yield raw_input
+            return
+
+        # Inputs have to be serialized, in order, before we can tell whether they're duplicates.
+        deduplicator = self.deduplicator
+
+        async def serialize(argskwargs) -> Union[bytes, list[memoryview]]:
+            return await self.serialize_input(*argskwargs)
+
+        concurrency = 2 * self.serialize_workers if self.serialize_executor is not None else 1
+        async with aclosing(async_map_ordered(self._raw_input_iter(), serialize, concurrency=concurrency)) as stream:
+            async for args_serialized in stream:
+                if deduplicator.add(args_serialized):
+                    yield _SerializedInput(args_serialized)
+
+    async def _raw_input_iter(self):
+        skipped = 0
+        while 1:
+            raw_input = await self.raw_input_queue.get()
+            if raw_input is None:  # end of input sentinel
+                break
+            if skipped < self.skip_inputs:
+                skipped += 1
+                continue
+            yield raw_input  # args, kwargs
+
+    async def serialize_input(self, args, kwargs) -> Union[bytes, list[memoryview]]:
+        if self.serialize_executor is None:
+            args_serialized, dur_s = _timed_serialize(args, kwargs, self.data_format, self.compression_stats)
+        else:
+            # Each worker gets its own stats, which are merged back on the event loop.
+            call_stats = CompressionStats()
+            loop = asyncio.get_running_loop()
+            args_serialized, dur_s = await loop.run_in_executor(
+                self.serialize_executor, _timed_serialize, args, kwargs, self.data_format, call_stats
+            )
+            self.compression_stats.merge(call_stats)
+        self.serialize_time += dur_s
+        return args_serialized
+
+    async def serialize_raw_input(self, raw_input) -> Union[bytes, list[memoryview]]:
+        """Serializes an item of `input_iter`, unless that already happened to check it for duplicates."""
+        if isinstance(raw_input, _SerializedInput):
+            return raw_input.data
+        (args, kwargs) = raw_input
+        return await self.serialize_input(args, kwargs)
+
+    @contextmanager
+    def serialization_workers(self) -> Iterator[int]:
+        """Starts the serialization worker threads, if any, and yields how many inputs to create concurrently."""
+        if not self.serialize_workers:
+            yield BLOB_MAX_PARALLELISM
+            return
+
+        self.serialize_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.serialize_workers, thread_name_prefix="modal-map-serialize"
+        )
+        try:
+            # Look ahead far enough to keep all serialization workers busy.
+            yield max(BLOB_MAX_PARALLELISM, 2 * self.serialize_workers)
+        finally:
+            self.serialize_executor.shutdown(wait=False, cancel_futures=True)
+            self.serialize_executor = None
+
+
 class InputPreprocessor:
     """
     Constructs FunctionPutInputsItem objects from the raw-input queue, and puts them in the processed-input queue.
@@ -102,46 +839,59 @@ class InputPreprocessor:
         function: "modal.functions._Function",
         created_callback: Callable[[int], None],
         done_callback: Callable[[], None],
+        serialize_workers: Optional[int] = None,
+        reorder_buffer: Optional[_OutputReorderBuffer] = None,
+        skip_inputs: int = 0,
+        deduplicator: Optional[_MapDeduplicator] = None,
+        backlog: Optional[_InputBacklog] = None,
     ):
         self.client = client
         self.function = function
-        self.inputs_created = 0
-        self.raw_input_queue = raw_input_queue
+        self.serializer = _InputSerializer(
+            raw_input_queue,
+            function,
+            serialize_workers=serialize_workers,
+            skip_inputs=skip_inputs,
+            deduplicator=deduplicator,
+        )
+        self.inputs_created = skip_inputs
         self.processed_input_queue = processed_input_queue
         self.created_callback = created_callback
         self.done_callback = done_callback
-
-    async def input_iter(self):
-        while 1:
-            raw_input = await self.raw_input_queue.get()
-            if raw_input is None:  # end of input sentinel
-                break
-            yield raw_input  # args, kwargs
+        # Ordered maps stop creating inputs that would get too far ahead of the outputs yielded so far.
+        self.reorder_buffer = reorder_buffer
+        # Stops creating inputs while too many of them are waiting to be sent.
+        self.backlog = backlog
 
     def create_input_factory(self):
-        async def create_input(argskwargs):
+        async def create_input(raw_input):
             idx = self.inputs_created
             self.inputs_created += 1
             self.created_callback(self.inputs_created)
-            (args, kwargs) = argskwargs
-            return await _create_input(
-                args,
-                kwargs,
+            args_serialized = await self.serializer.serialize_raw_input(raw_input)
+            return await _create_input_from_serialized(
+                args_serialized,
                 self.client.stub,
                 max_object_size_bytes=self.function._max_object_size_bytes,
                 idx=idx,
                 method_name=self.function._use_method_name,
+                data_format=self.serializer.data_format,
             )
 
         return create_input
 
     async def drain_input_generator(self):
-        # Parallelize uploading blobs
-        async with aclosing(
-            async_map_ordered(self.input_iter(), self.create_input_factory(), concurrency=BLOB_MAX_PARALLELISM)
-        ) as streamer:
-            async for item in streamer:
-                await self.processed_input_queue.put(item)
+        # Parallelize serializing inputs and uploading blobs, while keeping inputs in order
+        with self.serializer.serialization_workers() as concurrency:
+            async with aclosing(
+                async_map_ordered(self.serializer.input_iter(), self.create_input_factory(), concurrency=concurrency)
+            ) as streamer:
+                async for item in streamer:
+                    if self.reorder_buffer is not None:
+                        await self.reorder_buffer.wait_for_room(item.idx)
+                    if self.backlog is not None:
+                        await self.backlog.add(item.ByteSize())
+                    await self.processed_input_queue.put(item)
 
         # close queue iterator
         await self.processed_input_queue.put(None)
@@ -163,18 +913,28 @@ class InputPumper:
         function_call_id: str,
         max_batch_size: int,
         map_items_manager: Optional["_MapItemsManager"] = None,
+        journal: Optional[_SpawnMapJournal] = None,
+        backlog: Optional[_InputBacklog] = None,
     ):
         self.client = client
         self.function = function
         self.map_items_manager = map_items_manager
+        self.journal = journal
+        self.backlog = backlog
         self.input_queue = input_queue
-        self.inputs_sent = 0
+        self.inputs_sent = journal.num_acked if journal is not None else 0
         self.function_call_id = function_call_id
         self.max_batch_size = max_batch_size
+        self.chunk_sizer = _InputChunkSizer(max_batch_size)
 
     async def pump_inputs(self):
         assert self.client.stub
-        async for items in queue_batch_iterator(self.input_queue, max_batch_size=self.max_batch_size):
+        async for items in queue_batch_iterator(
+            self.input_queue,
+            max_batch_size=self.chunk_sizer.get_chunk_size,
+            max_batch_bytes=self.chunk_sizer.max_chunk_bytes,
+            item_size=lambda item: item.ByteSize(),
+        ):
             # Add items to the manager. Their state will be SENDING.
             if self.map_items_manager is not None:
                 await self.map_items_manager.add_items(items)
@@ -188,11 +948,17 @@ class InputPumper:
                 f" push is {self.input_queue.qsize()}. "
             )
 
+            t0 = time.monotonic()
             resp = await self._send_inputs(self.client.stub.FunctionPutInputs, request)
+            self.chunk_sizer.record(len(items), time.monotonic() - t0)
             self.inputs_sent += len(items)
             # Change item state to WAITING_FOR_OUTPUT, and set the input_id and input_jwt which are in the response.
             if self.map_items_manager is not None:
                 self.map_items_manager.handle_put_inputs_response(resp.inputs)
+            if self.journal is not None:
+                self.journal.record_acked(items[0].idx, items[-1].idx + 1)
+            if self.backlog is not None:
+                self.backlog.remove(len(items), sum(item.ByteSize() for item in items))
             logger.debug(
                 f"Successfully pushed {len(items)} inputs to server. "
                 f"Num queued inputs awaiting push is {self.input_queue.qsize()}."
@@ -232,6 +998,7 @@ class SyncInputPumper(InputPumper):
         function_call_jwt: str,
         function_call_id: str,
         map_items_manager: "_MapItemsManager",
+        backlog: Optional[_InputBacklog] = None,
     ):
         super().__init__(
             client,
@@ -240,6 +1007,7 @@ class SyncInputPumper(InputPumper):
             function_call_id=function_call_id,
             max_batch_size=MAP_INVOCATION_CHUNK_SIZE,
             map_items_manager=map_items_manager,
+            backlog=backlog,
         )
         self.retry_queue = retry_queue
         self.inputs_retried = 0
@@ -273,6 +1041,8 @@ class AsyncInputPumper(InputPumper):
         input_queue: asyncio.Queue,
         function: "modal.functions._Function",
         function_call_id: str,
+        journal: Optional[_SpawnMapJournal] = None,
+        backlog: Optional[_InputBacklog] = None,
     ):
         super().__init__(
             client,
@@ -280,6 +1050,8 @@ class AsyncInputPumper(InputPumper):
             function=function,
             function_call_id=function_call_id,
             max_batch_size=SPAWN_MAP_INVOCATION_CHUNK_SIZE,
+            journal=journal,
+            backlog=backlog,
         )
 
     async def pump_inputs(self):
@@ -291,24 +1063,57 @@ class AsyncInputPumper(InputPumper):
             num_inputs=self.inputs_sent,
         )
         await retry_transient_errors(self.client.stub.FunctionFinishInputs, request, max_retries=None)
+        if self.journal is not None:
+            self.journal.finish(self.inputs_sent)
         yield
 
 
 async def _spawn_map_invocation(
-    function: "modal.functions._Function", raw_input_queue: _SynchronizedQueue, client: "modal.client._Client"
+    function: "modal.functions._Function",
+    raw_input_queue: _SynchronizedQueue,
+    client: "modal.client._Client",
+    journal_path: Optional[Union[str, os.PathLike]] = None,
+) -> tuple[str, int]:
+    if journal_path is None:
+        return await _spawn_map_invocation_inner(function, raw_input_queue, client, None)
+
+    journal = _SpawnMapJournal(journal_path, function.object_id)
+    try:
+        if journal.num_inputs is not None:
+            # A previous run already sent every input, so there's no need to read any of them.
+            assert journal.function_call_id is not None
+            return journal.function_call_id, journal.num_inputs
+        return await _spawn_map_invocation_inner(function, raw_input_queue, client, journal)
+    finally:
+        journal.close()
+
+
+@traced("modal.spawn_map")
+async def _spawn_map_invocation_inner(
+    function: "modal.functions._Function",
+    raw_input_queue: _SynchronizedQueue,
+    client: "modal.client._Client",
+    journal: Optional[_SpawnMapJournal],
 ) -> tuple[str, int]:
     assert client.stub
-    request = api_pb2.FunctionMapRequest(
-        function_id=function.object_id,
-        parent_input_id=current_input_id() or "",
-        function_call_type=api_pb2.FUNCTION_CALL_TYPE_MAP,
-        function_call_invocation_type=api_pb2.FUNCTION_CALL_INVOCATION_TYPE_ASYNC,
-    )
-    response: api_pb2.FunctionMapResponse = await retry_transient_errors(client.stub.FunctionMap, request)
-    function_call_id = response.function_call_id
+    if journal is not None and journal.function_call_id is not None:
+        function_call_id = journal.function_call_id
+        logger.debug(f"Resuming spawn_map {function_call_id} after {journal.num_acked} acknowledged inputs")
+    else:
+        request = api_pb2.FunctionMapRequest(
+            function_id=function.object_id,
+            parent_input_id=current_input_id() or "",
+            function_call_type=api_pb2.FUNCTION_CALL_TYPE_MAP,
+            function_call_invocation_type=api_pb2.FUNCTION_CALL_INVOCATION_TYPE_ASYNC,
+        )
+        response: api_pb2.FunctionMapResponse = await retry_transient_errors(client.stub.FunctionMap, request)
+        function_call_id = response.function_call_id
+        if journal is not None:
+            journal.start(function_call_id)
 
+    skip_inputs = journal.num_acked if journal is not None else 0
     have_all_inputs = False
-    inputs_created = 0
+    inputs_created = skip_inputs
 
     def set_inputs_created(set_inputs_created):
         nonlocal inputs_created
@@ -320,6 +1125,7 @@ async def _spawn_map_invocation(
         have_all_inputs = True
 
     input_queue: asyncio.Queue[api_pb2.FunctionPutInputsItem | None] = asyncio.Queue()
+    backlog = _input_backlog_from_config()
     input_preprocessor = InputPreprocessor(
         client=client,
         raw_input_queue=raw_input_queue,
@@ -327,6 +1133,8 @@ async def _spawn_map_invocation(
         function=function,
         created_callback=set_inputs_created,
         done_callback=set_have_all_inputs,
+        skip_inputs=skip_inputs,
+        backlog=backlog,
     )
 
     input_pumper = AsyncInputPumper(
@@ -334,11 +1142,14 @@ async def _spawn_map_invocation(
         input_queue=input_queue,
         function=function,
         function_call_id=function_call_id,
+        journal=journal,
+        backlog=backlog,
     )
 
     def log_stats():
         logger.debug(
             f"have_all_inputs={have_all_inputs} inputs_created={inputs_created} inputs_sent={input_pumper.inputs_sent} "
+            f"input_chunks=({input_pumper.chunk_sizer.stats()}) input_backlog=({backlog.stats()})"
         )
 
     async def log_task():
@@ -362,9 +1173,36 @@ async def _spawn_map_invocation(
     )
     log_debug_stats_task.cancel()
     await log_debug_stats_task
+    current_span().set_attribute("function_call.id", function_call_id)
+    current_span().set_attribute("inputs.created", inputs_created)
     return function_call_id, inputs_created
 
 
+def _traced_map(map_invocation: Callable[..., typing.AsyncGenerator[Any, None]]):
+    """Records a map invocation as a `modal.map` span, which is passed to it as `map_span`.
+
+    The span is ended however the map ends, also if it's cancelled or closed before all outputs are yielded.
+    Maps are generators, so the span can't stay current across their yields. They attach it to their tasks.
+    """
+
+    @functools.wraps(map_invocation)
+    async def wrapper(function: "modal.functions._Function", *args, **kwargs) -> typing.AsyncGenerator[Any, None]:
+        map_span = start_span("modal.map", {"function.id": function.object_id})
+        map_exc: Optional[BaseException] = None
+        try:
+            async with aclosing(map_invocation(function, *args, map_span=map_span, **kwargs)) as outputs:
+                async for output in outputs:
+                    yield output
+        except BaseException as exc:
+            map_exc = exc
+            raise
+        finally:
+            end_span(map_span, map_exc)
+
+    return wrapper
+
+
+@_traced_map
 async def _map_invocation(
     function: "modal.functions._Function",
     raw_input_queue: _SynchronizedQueue,
@@ -374,6 +1212,10 @@ async def _map_invocation(
     wrap_returned_exceptions: bool,
     count_update_callback: Optional[Callable[[int, int], None]],
     function_call_invocation_type: "api_pb2.FunctionCallInvocationType.ValueType",
+    serialize_workers: Optional[int] = None,
+    dedupe: bool = False,
+    *,
+    map_span: Span,
 ):
     assert client.stub
     request = api_pb2.FunctionMapRequest(
@@ -383,9 +1225,11 @@ async def _map_invocation(
         return_exceptions=return_exceptions,
         function_call_invocation_type=function_call_invocation_type,
     )
-    response: api_pb2.FunctionMapResponse = await retry_transient_errors(client.stub.FunctionMap, request)
+    with attach(map_span):
+        response: api_pb2.FunctionMapResponse = await retry_transient_errors(client.stub.FunctionMap, request)
 
     function_call_id = response.function_call_id
+    map_span.set_attribute("function_call.id", function_call_id)
     function_call_jwt = response.function_call_jwt
     retry_policy = response.retry_policy
     sync_client_retries_enabled = response.sync_client_retries_enabled
@@ -412,6 +1256,10 @@ async def _map_invocation(
         retry_policy, function_call_invocation_type, retry_queue, sync_client_retries_enabled, max_inputs_outstanding
     )
 
+    deduplicator = _MapDeduplicator(order_outputs=order_outputs, first_idx=0) if dedupe else None
+    # The deduplicator keeps all results anyway, and returns them in order itself.
+    reorder_buffer = _reorder_buffer_from_config(order_outputs and not dedupe, next_idx=0)
+    backlog = _input_backlog_from_config()
     input_preprocessor = InputPreprocessor(
         client=client,
         raw_input_queue=raw_input_queue,
@@ -419,6 +1267,10 @@ async def _map_invocation(
         function=function,
         created_callback=lambda x: update_state(set_inputs_created=x),
         done_callback=lambda: update_state(set_have_all_inputs=True),
+        serialize_workers=serialize_workers,
+        reorder_buffer=reorder_buffer,
+        deduplicator=deduplicator,
+        backlog=backlog,
     )
 
     input_pumper = SyncInputPumper(
@@ -429,7 +1281,9 @@ async def _map_invocation(
         map_items_manager=map_items_manager,
         function_call_jwt=function_call_jwt,
         function_call_id=function_call_id,
+        backlog=backlog,
     )
+    output_window_sizer = _OutputWindowSizer()
 
     def update_state(set_have_all_inputs=None, set_inputs_created=None, set_outputs_completed=None):
         # This should be the only method that needs nonlocal of the following vars
@@ -472,12 +1326,14 @@ async def _map_invocation(
 
             request = api_pb2.FunctionGetOutputsRequest(
                 function_call_id=function_call_id,
+                max_values=output_window_sizer.get_window_size(),
                 timeout=OUTPUTS_TIMEOUT,
                 last_entry_id=last_entry_id,
                 clear_on_success=False,
                 requested_at=time.time(),
                 input_jwts=input_jwts,
             )
+            t0 = time.monotonic()
             get_response_task = asyncio.create_task(
                 retry_transient_errors(
                     client.stub.FunctionGetOutputs,
@@ -503,6 +1359,7 @@ async def _map_invocation(
 
             last_entry_id = response.last_entry_id
             now_seconds = int(time.time())
+            t1 = time.monotonic()
             for item in response.outputs:
                 outputs_received += 1
                 # If the output failed, and there are retries remaining, the input will be placed on the
@@ -526,6 +1383,8 @@ async def _map_invocation(
                     completed_outputs.add(item.input_id)
                     update_state(set_outputs_completed=outputs_completed + 1)
                     yield item
+            # Yielding blocks while the fetch stage is full, so this measures how fast outputs are consumed.
+            output_window_sizer.record(len(response.outputs), t1 - t0, time.monotonic() - t1)
 
     async def get_all_outputs_and_clean_up():
         assert client.stub
@@ -547,7 +1406,9 @@ async def _map_invocation(
 
     async def fetch_output(item: api_pb2.FunctionGetOutputsItem) -> tuple[int, Any]:
         try:
-            output = await _process_result(item.result, item.data_format, client.stub, client)
+            output = await _process_result(
+                item.result, item.data_format, client.stub, client, use_firewall=function._use_firewall
+            )
         except Exception as e:
             if return_exceptions:
                 if wrap_returned_exceptions:
@@ -562,32 +1423,26 @@ async def _map_invocation(
         return (item.idx, output)
 
     async def poll_outputs():
-        # map to store out-of-order outputs received
-        received_outputs = {}
-        output_idx = 0
-
         async with aclosing(
-            async_map_ordered(get_all_outputs_and_clean_up(), fetch_output, concurrency=BLOB_MAX_PARALLELISM)
+            async_map(get_all_outputs_and_clean_up(), fetch_output, concurrency=MAP_OUTPUT_FETCH_CONCURRENCY)
         ) as streamer:
             async for idx, output in streamer:
-                if not order_outputs:
+                if deduplicator is not None:
+                    for ready_output in deduplicator.fan_out(idx, output):
+                        yield _OutputValue(ready_output)
+                elif reorder_buffer is None:
                     yield _OutputValue(output)
                 else:
                     # hold on to outputs for function maps, so we can reorder them correctly.
-                    received_outputs[idx] = output
+                    reorder_buffer.put(idx, output)
+                    for ready_output in reorder_buffer.pop_ready():
+                        yield _OutputValue(ready_output)
 
-                    while True:
-                        if output_idx not in received_outputs:
-                            # we haven't received the output for the current index yet.
-                            # stop returning outputs to the caller and instead wait for
-                            # the next output to arrive from the server.
-                            break
-
-                        output = received_outputs.pop(output_idx)
-                        yield _OutputValue(output)
-                        output_idx += 1
-
-        assert len(received_outputs) == 0
+        if deduplicator is not None:
+            # Duplicates that came up after the result of their first occurrence was received.
+            for ready_output in deduplicator.flush():
+                yield _OutputValue(ready_output)
+        assert reorder_buffer is None or len(reorder_buffer) == 0
 
     async def log_debug_stats():
         def log_stats():
@@ -595,6 +1450,8 @@ async def _map_invocation(
                 f"Map stats: sync_client_retries_enabled={sync_client_retries_enabled} "
                 f"have_all_inputs={have_all_inputs} "
                 f"inputs_created={inputs_created} "
+                f"serialize_time={input_preprocessor.serializer.serialize_time:.3f}s "
+                f"compression=({input_preprocessor.serializer.compression_stats}) "
                 f"input_sent={input_pumper.inputs_sent} "
                 f"inputs_retried={input_pumper.inputs_retried} "
                 f"outputs_received={outputs_received} "
@@ -602,7 +1459,12 @@ async def _map_invocation(
                 f"no_context_duplicates={no_context_duplicates} old_retry_duplicates={stale_retry_duplicates} "
                 f"already_complete_duplicates={already_complete_duplicates} "
                 f"retried_outputs={retried_outputs} input_queue_size={input_queue.qsize()} "
-                f"retry_queue_size={retry_queue.qsize()} map_items_manager={len(map_items_manager)}"
+                f"retry_queue_size={retry_queue.qsize()} map_items_manager={len(map_items_manager)} "
+                f"input_chunks=({input_pumper.chunk_sizer.stats()}) "
+                f"output_window=({output_window_sizer.stats()}) "
+                f"reorder_buffer=({reorder_buffer.stats() if reorder_buffer else None}) "
+                f"dedupe=({deduplicator.stats() if deduplicator else None}) "
+                f"input_backlog=({backlog.stats()})"
             )
 
         while True:
@@ -615,21 +1477,30 @@ async def _map_invocation(
                 break
 
     log_debug_stats_task = asyncio.create_task(log_debug_stats())
-    async with aclosing(
-        async_merge(
-            input_preprocessor.drain_input_generator(),
-            input_pumper.pump_inputs(),
-            input_pumper.retry_inputs(),
-            poll_outputs(),
-        )
-    ) as streamer:
-        async for response in streamer:
-            if response is not None:  # type: ignore[unreachable]
-                yield response.value
+    try:
+        async with aclosing(
+            async_merge(
+                attach_gen(map_span, input_preprocessor.drain_input_generator()),
+                attach_gen(map_span, input_pumper.pump_inputs()),
+                attach_gen(map_span, input_pumper.retry_inputs()),
+                attach_gen(map_span, poll_outputs()),
+            )
+        ) as streamer:
+            async for response in streamer:
+                if response is not None:  # type: ignore[unreachable]
+                    yield response.value
+    finally:
+        if reorder_buffer is not None:
+            reorder_buffer.close()
+        map_span.set_attribute("inputs.created", inputs_created)
+        map_span.set_attribute("inputs.retried", input_pumper.inputs_retried)
+        map_span.set_attribute("outputs.received", outputs_received)
+        map_span.set_attribute("serialize_time_s", input_preprocessor.serializer.serialize_time)
     log_debug_stats_task.cancel()
     await log_debug_stats_task
 
 
+@_traced_map
 async def _map_invocation_inputplane(
     function: "modal.functions._Function",
     raw_input_queue: _SynchronizedQueue,
@@ -638,6 +1509,10 @@ async def _map_invocation_inputplane(
     return_exceptions: bool,
     wrap_returned_exceptions: bool,
     count_update_callback: Optional[Callable[[int, int], None]],
+    serialize_workers: Optional[int] = None,
+    dedupe: bool = False,
+    *,
+    map_span: Span,
 ) -> typing.AsyncGenerator[Any, None]:
     """Input-plane implementation of a function map invocation.
 
@@ -720,33 +1595,39 @@ async def _map_invocation_inputplane(
         if have_all_inputs and outputs_completed >= inputs_created:
             map_done_event.set()
 
-    async def create_input(argskwargs):
+    # 1-indexed map call idx
+    deduplicator = _MapDeduplicator(order_outputs=order_outputs, first_idx=1) if dedupe else None
+    reorder_buffer = _reorder_buffer_from_config(order_outputs and not dedupe, next_idx=1)
+    backlog = _input_backlog_from_config()
+
+    serializer = _InputSerializer(
+        raw_input_queue, function, serialize_workers=serialize_workers, deduplicator=deduplicator
+    )
+
+    async def create_input(raw_input):
         idx = inputs_created + 1  # 1-indexed map call idx
         update_counters(created_delta=1)
-        (args, kwargs) = argskwargs
-        put_item: api_pb2.FunctionPutInputsItem = await _create_input(
-            args,
-            kwargs,
+        args_serialized = await serializer.serialize_raw_input(raw_input)
+        put_item: api_pb2.FunctionPutInputsItem = await _create_input_from_serialized(
+            args_serialized,
             client.stub,
             max_object_size_bytes=function._max_object_size_bytes,
             idx=idx,
             method_name=function._use_method_name,
+            data_format=serializer.data_format,
         )
         return api_pb2.MapStartOrContinueItem(input=put_item)
 
-    async def input_iter():
-        while True:
-            raw_input = await raw_input_queue.get()
-            if raw_input is None:  # end of input sentinel
-                break
-            yield raw_input  # args, kwargs
-
     async def drain_input_generator():
-        async with aclosing(
-            async_map_ordered(input_iter(), create_input, concurrency=BLOB_MAX_PARALLELISM)
-        ) as streamer:
-            async for q_item in streamer:
-                await queue.put(time.time(), q_item)
+        with serializer.serialization_workers() as concurrency:
+            async with aclosing(
+                async_map_ordered(serializer.input_iter(), create_input, concurrency=concurrency)
+            ) as streamer:
+                async for q_item in streamer:
+                    if reorder_buffer is not None:
+                        await reorder_buffer.wait_for_room(q_item.input.idx)
+                    await backlog.add(q_item.input.ByteSize())
+                    await queue.put(time.time(), q_item)
 
         # All inputs have been read.
         update_counters(set_have_all_inputs=True)
@@ -788,6 +1669,9 @@ async def _map_invocation_inputplane(
             ]
 
             map_items_manager.handle_put_continue_response(response_items_idx_tuple)
+            # Retries don't count towards the backlog, only inputs sent for the first time do.
+            new_items = [item for item in request_items if not item.attempt_token]
+            backlog.remove(len(new_items), sum(item.input.ByteSize() for item in new_items))
 
             # Set the function call id and actual retry policy with the data from the first response.
             # This conditional is skipped for subsequent iterations of this for-loop.
@@ -917,7 +1801,9 @@ async def _map_invocation_inputplane(
 
     async def fetch_output(item: api_pb2.FunctionGetOutputsItem) -> tuple[int, Any]:
         try:
-            output = await _process_result(item.result, item.data_format, input_plane_stub, client)
+            output = await _process_result(
+                item.result, item.data_format, input_plane_stub, client, use_firewall=function._use_firewall
+            )
         except Exception as e:
             if return_exceptions:
                 if wrap_returned_exceptions:
@@ -932,32 +1818,26 @@ async def _map_invocation_inputplane(
         return (item.idx, output)
 
     async def poll_outputs():
-        # map to store out-of-order outputs received
-        received_outputs = {}
-        output_idx = 1  # 1-indexed map call idx
-
         async with aclosing(
-            async_map_ordered(get_all_outputs_and_clean_up(), fetch_output, concurrency=BLOB_MAX_PARALLELISM)
+            async_map(get_all_outputs_and_clean_up(), fetch_output, concurrency=MAP_OUTPUT_FETCH_CONCURRENCY)
         ) as streamer:
             async for idx, output in streamer:
-                if not order_outputs:
+                if deduplicator is not None:
+                    for ready_output in deduplicator.fan_out(idx, output):
+                        yield _OutputValue(ready_output)
+                elif reorder_buffer is None:
                     yield _OutputValue(output)
                 else:
                     # hold on to outputs for function maps, so we can reorder them correctly.
-                    received_outputs[idx] = output
-
-                    while True:
-                        if output_idx not in received_outputs:
-                            # we haven't received the output for the current index yet.
-                            # stop returning outputs to the caller and instead wait for
-                            # the next output to arrive from the server.
-                            break
-
-                        output = received_outputs.pop(output_idx)
-                        yield _OutputValue(output)
-                        output_idx += 1
+                    reorder_buffer.put(idx, output)
+                    for ready_output in reorder_buffer.pop_ready():
+                        yield _OutputValue(ready_output)
 
-        assert len(received_outputs) == 0
+        if deduplicator is not None:
+            # Duplicates that came up after the result of their first occurrence was received.
+            for ready_output in deduplicator.flush():
+                yield _OutputValue(ready_output)
+        assert reorder_buffer is None or len(reorder_buffer) == 0
 
     async def log_debug_stats():
         def log_stats():
@@ -966,7 +1846,14 @@ async def _map_invocation_inputplane(
                 f"no_context_duplicates={no_context_duplicates} stale_retry_duplicates={stale_retry_duplicates} "
                 f"already_complete_duplicates={already_complete_duplicates} retried_outputs={retried_outputs} "
                 f"function_call_id={function_call_id} max_inputs_outstanding={max_inputs_outstanding} "
-                f"map_items_manager_size={len(map_items_manager)} input_queue_size={input_queue_size}"
+                f"map_items_manager_size={len(map_items_manager)} input_queue_size={input_queue_size} "
+                f"lost_inputs_retried={map_items_manager.lost_inputs_retried} "
+                f"lost_inputs_deferred={map_items_manager.lost_inputs_deferred} "
+                f"serialize_time={serializer.serialize_time:.3f}s "
+                f"compression=({serializer.compression_stats}) "
+                f"reorder_buffer=({reorder_buffer.stats() if reorder_buffer else None}) "
+                f"dedupe=({deduplicator.stats() if deduplicator else None}) "
+                f"input_backlog=({backlog.stats()})"
             )
 
         while True:
@@ -980,12 +1867,25 @@ async def _map_invocation_inputplane(
 
     log_task = asyncio.create_task(log_debug_stats())
 
-    async with aclosing(
-        async_merge(drain_input_generator(), pump_inputs(), poll_outputs(), check_lost_inputs())
-    ) as merged:
-        async for maybe_output in merged:
-            if maybe_output is not None:  # ignore None sentinels
-                yield maybe_output.value
+    try:
+        async with aclosing(
+            async_merge(
+                *(
+                    attach_gen(map_span, gen)
+                    for gen in [drain_input_generator(), pump_inputs(), poll_outputs(), check_lost_inputs()]
+                )
+            )
+        ) as merged:
+            async for maybe_output in merged:
+                if maybe_output is not None:  # ignore None sentinels
+                    yield maybe_output.value
+    finally:
+        if reorder_buffer is not None:
+            reorder_buffer.close()
+        map_span.set_attribute("function_call.id", function_call_id)
+        map_span.set_attribute("inputs.created", inputs_created)
+        map_span.set_attribute("inputs.lost_retried", map_items_manager.lost_inputs_retried)
+        map_span.set_attribute("serialize_time_s", serializer.serialize_time)
 
     log_task.cancel()
 
@@ -997,6 +1897,9 @@ async def _map_helper(
     order_outputs: bool = True,  # return outputs in order
     return_exceptions: bool = False,  # propagate exceptions (False) or aggregate them in the results list (True)
     wrap_returned_exceptions: bool = True,
+    serialize_workers: Optional[int] = None,  # number of threads to serialize inputs on, or None to serialize inline
+    feed_mode: str = "throughput",  # hand inputs over in batches ("throughput") or one at a time ("latency")
+    dedupe: bool = False,  # only send the first of identical inputs, and return its result for all of them
 ) -> typing.AsyncGenerator[Any, None]:
     """Core implementation that supports `_map_async()`, `_starmap_async()` and `_for_each_async()`.
 
@@ -1006,17 +1909,21 @@ async def _map_helper(
     Note that since the iterator(s) can block, it's a bit opaque how often the event
     loop decides to get a new input vs how often it will emit a new output.
 
-    We could make this explicit as an improvement or even let users decide what they
-    prefer: throughput (prioritize queueing inputs) or latency (prioritize yielding results)
+    `feed_mode` lets users decide what they prefer: throughput (inputs cross over to the synchronicity
+    thread in batches) or latency (every input is handed over as soon as it's produced).
     """
+    if serialize_workers is not None and (
+        not isinstance(serialize_workers, int) or isinstance(serialize_workers, bool) or serialize_workers < 1
+    ):
+        raise modal.exception.InvalidError(f"`serialize_workers` must be a positive integer, got {serialize_workers!r}")
+    if feed_mode not in ("throughput", "latency"):
+        raise modal.exception.InvalidError(f"`feed_mode` must be 'throughput' or 'latency', got {feed_mode!r}")
+
     raw_input_queue: Any = SynchronizedQueue()  # type: ignore
-    await raw_input_queue.init.aio()
+    await raw_input_queue.init.aio(MAP_INPUT_QUEUE_SIZE)
 
     async def feed_queue():
-        async with aclosing(async_input_gen) as streamer:
-            async for args in streamer:
-                await raw_input_queue.put.aio((args, kwargs))
-        await raw_input_queue.put.aio(None)  # end-of-input sentinel
+        await _feed_raw_input_queue(raw_input_queue, async_input_gen, kwargs, feed_mode)
         if False:
             # make this a never yielding generator so we can async_merge it below
             # this is important so any exception raised in feed_queue will be propagated
@@ -1027,7 +1934,10 @@ async def _map_helper(
     # the synchronicity thread. Instead, we delegate to `._map()` with a safer Queue as input.
     async with aclosing(
         async_merge(
-            self._map.aio(raw_input_queue, order_outputs, return_exceptions, wrap_returned_exceptions), feed_queue()
+            self._map.aio(
+                raw_input_queue, order_outputs, return_exceptions, wrap_returned_exceptions, serialize_workers, dedupe
+            ),
+            feed_queue(),
         )
     ) as map_output_stream:
         async for output in map_output_stream:
@@ -1071,6 +1981,9 @@ async def _map_async(
     order_outputs: bool = True,  # return outputs in order
     return_exceptions: bool = False,  # propagate exceptions (False) or aggregate them in the results list (True)
     wrap_returned_exceptions: bool = True,  # wrap returned exceptions in modal.exception.UserCodeException
+    serialize_workers: Optional[int] = None,  # number of threads to serialize inputs on, or None to serialize inline
+    feed_mode: str = "throughput",  # hand inputs over in batches ("throughput") or one at a time ("latency")
+    dedupe: bool = False,  # only send the first of identical inputs, and return its result for all of them
 ) -> typing.AsyncGenerator[Any, None]:
     if not _invoked_from_sync_wrapper():
         _maybe_warn_about_exceptions("map.aio", return_exceptions, wrap_returned_exceptions)
@@ -1082,6 +1995,9 @@ async def _map_async(
         order_outputs=order_outputs,
         return_exceptions=return_exceptions,
         wrap_returned_exceptions=wrap_returned_exceptions,
+        serialize_workers=serialize_workers,
+        feed_mode=feed_mode,
+        dedupe=dedupe,
     ):
         yield output
 
@@ -1095,6 +2011,9 @@ async def _starmap_async(
     order_outputs: bool = True,
     return_exceptions: bool = False,
     wrap_returned_exceptions: bool = True,
+    serialize_workers: Optional[int] = None,
+    feed_mode: str = "throughput",
+    dedupe: bool = False,
 ) -> typing.AsyncIterable[Any]:
     if not _invoked_from_sync_wrapper():
         _maybe_warn_about_exceptions("starmap.aio", return_exceptions, wrap_returned_exceptions)
@@ -1105,6 +2024,9 @@ async def _starmap_async(
         order_outputs=order_outputs,
         return_exceptions=return_exceptions,
         wrap_returned_exceptions=wrap_returned_exceptions,
+        serialize_workers=serialize_workers,
+        feed_mode=feed_mode,
+        dedupe=dedupe,
     ):
         yield output
 
@@ -1132,6 +2054,9 @@ def _map_sync(
     order_outputs: bool = True,  # return outputs in order
     return_exceptions: bool = False,  # propagate exceptions (False) or aggregate them in the results list (True)
     wrap_returned_exceptions: bool = True,
+    serialize_workers: Optional[int] = None,  # number of threads to serialize inputs on, or None to serialize inline
+    feed_mode: str = "throughput",  # hand inputs over in batches ("throughput") or one at a time ("latency")
+    dedupe: bool = False,  # only send the first of identical inputs, and return its result for all of them
 ) -> AsyncOrSyncIterable:
     """Parallel map over a set of inputs.
 
@@ -1168,6 +2093,19 @@ def _map_sync(
         # [0, 1, UserCodeException(Exception('ohno'))]
         print(list(my_func.map(range(3), return_exceptions=True)))
     ```
+
+    Inputs are serialized on the calling event loop by default. For large inputs like numpy arrays or
+    pandas dataframes, set `serialize_workers=N` to serialize up to N inputs at a time on a thread pool
+    instead, so that pickling overlaps with sending inputs to Modal. Outputs are still returned in order.
+
+    By default, inputs are handed over to Modal's event loop in batches, which is much faster for many
+    small inputs. Batches wait for at most `map_feed_max_delay` seconds (see `modal.config`) for more
+    inputs. Set `feed_mode="latency"` to hand over every input as soon as it's produced instead.
+
+    Set `dedupe=True` if many inputs are exact duplicates of each other (e.g. the same URL or prompt):
+    only the first of identical inputs is sent and executed, and its result (or exception, with
+    `return_exceptions=True`) is returned for each of them. Inputs are compared by their serialized
+    form, and all distinct results are kept in memory until the map is done.
     """
     _maybe_warn_about_exceptions("map", return_exceptions, wrap_returned_exceptions)
 
@@ -1179,6 +2117,9 @@ def _map_sync(
             order_outputs=order_outputs,
             return_exceptions=return_exceptions,
             wrap_returned_exceptions=wrap_returned_exceptions,
+            serialize_workers=serialize_workers,
+            feed_mode=feed_mode,
+            dedupe=dedupe,
         ),
         nested_async_message=(
             "You can't iter(Function.map()) from an async function. Use async for ... in Function.map.aio() instead."
@@ -1186,28 +2127,41 @@ def _map_sync(
     )
 
 
-async def _experimental_spawn_map_async(self, *input_iterators, kwargs={}) -> "modal.functions._FunctionCall":
+async def _experimental_spawn_map_async(
+    self, *input_iterators, kwargs={}, journal: Optional[Union[str, os.PathLike]] = None
+) -> "modal.functions._FunctionCall":
     async_input_gen = async_zip(*[sync_or_async_iter(it) for it in input_iterators])
-    return await _spawn_map_helper(self, async_input_gen, kwargs)
+    return await _spawn_map_helper(self, async_input_gen, kwargs, journal)
 
 
 async def _spawn_map_helper(
-    self: "modal.functions.Function", async_input_gen, kwargs={}
+    self: "modal.functions.Function", async_input_gen, kwargs={}, journal: Optional[Union[str, os.PathLike]] = None
 ) -> "modal.functions._FunctionCall":
     raw_input_queue: Any = SynchronizedQueue()  # type: ignore
-    await raw_input_queue.init.aio()
+    await raw_input_queue.init.aio(MAP_INPUT_QUEUE_SIZE)
 
     async def feed_queue():
-        async with aclosing(async_input_gen) as streamer:
-            async for args in streamer:
-                await raw_input_queue.put.aio((args, kwargs))
-        await raw_input_queue.put.aio(None)  # end-of-input sentinel
-
-    fc, _ = await asyncio.gather(self._spawn_map.aio(raw_input_queue), feed_queue())
-    return fc
+        await _feed_raw_input_queue(raw_input_queue, async_input_gen, kwargs, "throughput")
 
-
-def _experimental_spawn_map_sync(self, *input_iterators, kwargs={}) -> "modal.functions._FunctionCall":
+    # The input queue is bounded, so the feeder has to be stopped if spawning returns or fails before all inputs
+    # are read, e.g. when the journal shows that every input was already sent. A failing feeder never sends the
+    # end-of-input sentinel, so its error has to stop spawning in turn.
+    feeder = asyncio.ensure_future(feed_queue())
+    spawner = asyncio.ensure_future(self._spawn_map.aio(raw_input_queue, journal))
+    try:
+        await asyncio.wait([feeder, spawner], return_when=asyncio.FIRST_COMPLETED)
+        if feeder.done():
+            feeder.result()
+        return await spawner
+    finally:
+        feeder.cancel()
+        spawner.cancel()
+        await asyncio.gather(feeder, spawner, return_exceptions=True)
+
+
+def _experimental_spawn_map_sync(
+    self, *input_iterators, kwargs={}, journal: Optional[Union[str, os.PathLike]] = None
+) -> "modal.functions._FunctionCall":
     """mdmd:hidden
     Spawn parallel execution over a set of inputs, returning as soon as the inputs are created.
 
@@ -1228,10 +2182,16 @@ def _experimental_spawn_map_sync(self, *input_iterators, kwargs={}) -> "modal.fu
         fc = my_func.spawn_map([1, 2], [3, 4])
     ```
 
+    Pass a file path as `journal` to make a long-running submission resumable: the inputs acknowledged by the
+    server are recorded there, and calling this again with the same inputs and journal continues the same
+    function call from where the previous attempt stopped instead of submitting everything again. Inputs near
+    the point of interruption may be submitted twice, and once every input was submitted, the inputs aren't read
+    at all. The journal is tied to the Function it was written for, so it can only be resumed for a deployed
+    Function, or within the same `app.run()`: an ephemeral app run again gets a new Function, and raises an error.
     """
 
     return run_coroutine_in_temporary_event_loop(
-        _experimental_spawn_map_async(self, *input_iterators, kwargs=kwargs),
+        _experimental_spawn_map_async(self, *input_iterators, kwargs=kwargs, journal=journal),
         "You can't run Function.spawn_map() from an async function. Use Function.spawn_map.aio() instead.",
     )
 
@@ -1309,6 +2269,9 @@ def _starmap_sync(
     order_outputs: bool = True,
     return_exceptions: bool = False,
     wrap_returned_exceptions: bool = True,
+    serialize_workers: Optional[int] = None,
+    feed_mode: str = "throughput",
+    dedupe: bool = False,
 ) -> AsyncOrSyncIterable:
     """Like `map`, but spreads arguments over multiple function arguments.
 
@@ -1335,6 +2298,9 @@ def _starmap_sync(
             order_outputs=order_outputs,
             return_exceptions=return_exceptions,
             wrap_returned_exceptions=wrap_returned_exceptions,
+            serialize_workers=serialize_workers,
+            feed_mode=feed_mode,
+            dedupe=dedupe,
         ),
         nested_async_message=(
             "You can't `iter(Function.starmap())` from an async function. "
@@ -1542,6 +2508,9 @@ class _MapItemsManager:
         self._item_context: dict[int, _MapItemContext] = {}
         self._sync_client_retries_enabled = sync_client_retries_enabled
         self._is_input_plane_instance = is_input_plane_instance
+        # Stats, for debug logging.
+        self.lost_inputs_retried = 0
+        self.lost_inputs_deferred = 0  # lost inputs over the retry budget of a check round
 
     def set_retry_policy(self, retry_policy: api_pb2.FunctionRetryPolicy):
         self._retry_policy = retry_policy
@@ -1640,14 +2609,22 @@ class _MapItemsManager:
                 ctx.handle_retry_response(input_jwt)
 
     async def handle_check_inputs_response(self, response: list[tuple[int, bool]]):
+        retry_at = time.time() + random.uniform(0, MAP_LOST_INPUT_RETRY_JITTER)
+        retries = 0
         for idx, lost in response:
             ctx = self._item_context.get(idx, None)
             if ctx is not None:
                 if lost:
+                    if retries >= MAP_LOST_INPUT_RETRY_BUDGET:
+                        # Still WAITING_FOR_OUTPUT, so the next check round reports it as lost again.
+                        self.lost_inputs_deferred += 1
+                        continue
+                    retries += 1
                     ctx.state = _MapItemState.WAITING_TO_RETRY
                     retry_item = await ctx.create_map_start_or_continue_item(idx)
-                    _ = ctx.retry_manager.get_delay_ms()  # increment retry count but instant retry for lost inputs
-                    await self._retry_queue.put(time.time(), retry_item)
+                    _ = ctx.retry_manager.get_delay_ms()  # increment retry count but no backoff for lost inputs
+                    await self._retry_queue.put(retry_at, retry_item)
+        self.lost_inputs_retried += retries
 
     async def handle_get_outputs_response(self, item: api_pb2.FunctionGetOutputsItem, now_seconds: int) -> _OutputType:
         ctx = self._item_context.get(item.idx, None)
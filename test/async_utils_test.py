@@ -223,6 +223,25 @@ async def test_queue_batch_iterator():
         assert len(drained_items) == 3
 
 
+@pytest.mark.asyncio
+async def test_queue_batch_iterator_limits():
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in [b"a" * 3, b"b" * 3, b"c" * 3, b"d" * 10, b"e", b"f", b"g"]:
+        await queue.put(item)
+    await queue.put(None)
+
+    batch_size = 4
+    batches = []
+    async for batch in queue_batch_iterator(
+        queue, max_batch_size=lambda: batch_size, max_batch_bytes=8, item_size=len, debounce_time=0
+    ):
+        batches.append(batch)
+        batch_size = 2
+
+    # first batch is cut by the byte limit, the oversized item goes on its own, later batches by the new size limit
+    assert batches == [[b"aaa", b"bbb"], [b"ccc"], [b"d" * 10], [b"e", b"f"], [b"g"]]
+
+
 @pytest.mark.asyncio
 async def test_warn_if_generator_is_not_consumed(caplog):
     @warn_if_generator_is_not_consumed()
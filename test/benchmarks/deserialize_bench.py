@@ -0,0 +1,67 @@
+# Copyright Modal Labs 2025
+"""Compares the throughput of `deserialize` with and without the rffickle firewall.
+
+Run with `python -m test.benchmarks.deserialize_bench`. Prints one JSON object per mode, e.g.
+`{"mode": "firewall", "payload": "small", "n": 20000, "seconds": 1.1596, "per_second": 17247.3, "slowdown": 8.33}`.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from modal._serialization import deserialize, serialize
+
+PAYLOADS = {
+    # Typical small map result.
+    "small": lambda i: {"index": i, "label": f"item-{i}", "score": i / 7, "tags": ["a", "b"]},
+    # A small batch of rows, like a page of records.
+    "medium": lambda i: [{"id": i * 100 + j, "values": [float(j)] * 16, "name": f"row-{j}"} for j in range(10)],
+}
+
+
+def _fresh_firewall_loads(data: bytes):
+    # What `deserialize` used to do for every result, before the firewall instance was cached.
+    from fickle import DefaultFirewall
+
+    return DefaultFirewall().loads(data)
+
+
+MODES = {
+    "pickle": lambda data: deserialize(data, None),
+    "firewall": lambda data: deserialize(data, None, use_firewall=True),
+    "firewall_uncached": _fresh_firewall_loads,
+}
+
+
+def run(payload: str, n: int) -> list[dict]:
+    serialized = [serialize(PAYLOADS[payload](i)) for i in range(n)]
+    results = []
+    for mode, loads in MODES.items():
+        t0 = time.perf_counter()
+        for data in serialized:
+            loads(data)
+        seconds = time.perf_counter() - t0
+        results.append({"mode": mode, "payload": payload, "n": n, "seconds": round(seconds, 4)})
+
+    baseline = results[0]["seconds"]
+    for result in results:
+        result["per_second"] = round(n / result["seconds"], 1)
+        result["slowdown"] = round(result["seconds"] / baseline, 2)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payload", choices=sorted(PAYLOADS), action="append")
+    parser.add_argument("-n", type=int, default=20_000, help="Number of results to deserialize per mode.")
+    args = parser.parse_args(argv)
+
+    for payload in args.payload or ["small"]:
+        for result in run(payload, args.n):
+            print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
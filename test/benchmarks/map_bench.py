@@ -0,0 +1,237 @@
+# Copyright Modal Labs 2025
+"""Measures local `map` / `starmap` / `spawn_map` / `for_each` throughput against the mock servicer.
+
+Run with `python -m test.benchmarks.map_bench`. Every run starts a fresh `MockClientServicer` (the same one
+the test suite uses) and prints one JSON object per (api, payload size) combination, e.g.
+`{"api": "map", "n": 2000, "payload_bytes": 1024, "jitter": 0.0, "error_rate": 0.0, "seconds": 1.83,
+"items_per_second": 1092.9, "errors": 0, "latency_ms": {"mean": 912.1, "p50": 905.3, "p99": 1790.2},
+"max_rss_mib": 142.3}`.
+
+Latency is measured from the moment an input is pulled from the input iterator until its output is yielded,
+so it is only reported for the APIs that return outputs (`map` and `starmap`). `spawn_map` only measures how
+long it takes to enqueue all inputs. Failures are injected deterministically by input index, so runs with the
+same arguments fail on the same inputs.
+
+To check a change for regressions, record a baseline on the base revision and compare against it with the same
+arguments, on the same machine:
+
+    git stash && python -m test.benchmarks.map_bench > /tmp/map_bench_baseline.jsonl && git stash pop
+    python -m test.benchmarks.map_bench --baseline /tmp/map_bench_baseline.jsonl --tolerance 0.1
+
+With `--baseline`, the throughput and p99 latency of every run are compared to the baseline run with the same
+arguments, and the command exits with status 1 if any of them is worse by more than `--tolerance` (a fraction).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from modal import App
+from modal._utils.grpc_utils import find_free_port
+from modal.client import Client
+from modal_proto import api_pb2
+from test.conftest import MockClientServicer, run_blob_server, run_server
+
+APIS = ["map", "starmap", "spawn_map", "for_each"]
+
+CREDENTIALS = ("ak-bench", "as-bench")
+
+# Metrics compared against a baseline, and whether a higher value is better.
+COMPARED_METRICS = {"items_per_second": True, "latency_p99_ms": False}
+
+
+class InjectedError(Exception):
+    pass
+
+
+def _fails(i: int, error_rate: float) -> bool:
+    # Knuth's multiplicative hash spreads the failing inputs evenly over the index range.
+    return (i * 2654435761) % 10_000 < error_rate * 10_000
+
+
+def echo(i, payload):
+    return payload
+
+
+@contextlib.contextmanager
+def _mock_backend():
+    """Run a `MockClientServicer` on a background thread and yield it together with a connected client."""
+    with run_blob_server() as (blob_host, blobs, blocks, files_sha2data):
+        port = find_free_port()
+        servicer = MockClientServicer(blob_host, blobs, blocks, files_sha2data, CREDENTIALS, port)
+        servicer.client_addr = f"http://127.0.0.1:{port}"
+        started = threading.Event()
+        stop_server = threading.Event()
+
+        async def serve():
+            async with run_server(servicer, host="127.0.0.1", port=port):
+                started.set()
+                await asyncio.get_running_loop().run_in_executor(None, stop_server.wait)
+
+        thread = threading.Thread(target=asyncio.run, args=(serve(),))
+        thread.start()
+        started.wait()
+        try:
+            with Client(servicer.client_addr, api_pb2.CLIENT_TYPE_CLIENT, CREDENTIALS) as client:
+                yield servicer, client
+        finally:
+            stop_server.set()
+            thread.join()
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run(api: str, n: int, payload_bytes: int, jitter: float, error_rate: float) -> dict:
+    payload = b"x" * payload_bytes
+    pulled_at: list[float] = []
+
+    def inputs():
+        for i in range(n):
+            pulled_at.append(time.perf_counter())
+            yield i
+
+    latencies: list[float] = []
+    errors = 0
+
+    def record_outputs(outputs):
+        nonlocal errors
+        # Outputs of `map` and `starmap` are ordered, so output `i` belongs to input `i`.
+        for i, output in enumerate(outputs):
+            latencies.append(time.perf_counter() - pulled_at[i])
+            if isinstance(output, BaseException):
+                errors += 1
+
+    with _mock_backend() as (servicer, client):
+        servicer.set_resp_jitter(jitter)
+
+        @servicer.function_body
+        def body(i, payload):
+            if _fails(i, error_rate):
+                raise InjectedError(f"injected failure for input {i}")
+            return payload
+
+        app = App()
+        f = app.function(serialized=True)(echo)
+        with app.run(client=client):
+            t0 = time.perf_counter()
+            if api == "map":
+                record_outputs(
+                    f.map(inputs(), kwargs={"payload": payload}, return_exceptions=True, wrap_returned_exceptions=False)
+                )
+            elif api == "starmap":
+                record_outputs(
+                    f.starmap(((i, payload) for i in inputs()), return_exceptions=True, wrap_returned_exceptions=False)
+                )
+            elif api == "spawn_map":
+                f.spawn_map(inputs(), kwargs={"payload": payload})
+            elif api == "for_each":
+                f.for_each(inputs(), kwargs={"payload": payload}, ignore_exceptions=True)
+                errors = sum(_fails(i, error_rate) for i in range(n))
+            seconds = time.perf_counter() - t0
+
+    result = {
+        "api": api,
+        "n": n,
+        "payload_bytes": payload_bytes,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "seconds": round(seconds, 4),
+        "items_per_second": round(n / seconds, 1),
+        "errors": errors,
+    }
+    if latencies:
+        latencies.sort()
+        result["latency_ms"] = {
+            "mean": round(statistics.fmean(latencies) * 1000, 2),
+            "p50": round(_percentile(latencies, 0.5) * 1000, 2),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 2),
+        }
+    return result
+
+
+def _run_key(result: dict) -> tuple:
+    return (result["api"], result["n"], result["payload_bytes"], result["jitter"], result["error_rate"])
+
+
+def _compared_metrics(result: dict) -> dict[str, float]:
+    metrics = {"items_per_second": result["items_per_second"]}
+    if "latency_ms" in result:
+        metrics["latency_p99_ms"] = result["latency_ms"]["p99"]
+    return metrics
+
+
+def load_baseline(path: str) -> dict[tuple, dict]:
+    """Reads the output of an earlier run, keyed by the arguments of each of its runs."""
+    with open(path) as f:
+        return {_run_key(result): result for result in map(json.loads, f) if result}
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Describes every compared metric of `result` that is worse than in `baseline` by more than `tolerance`."""
+    regressions = []
+    baseline_metrics = _compared_metrics(baseline)
+    for name, value in _compared_metrics(result).items():
+        if not baseline_metrics.get(name):
+            continue
+        change = (value - baseline_metrics[name]) / baseline_metrics[name]
+        if (-change if COMPARED_METRICS[name] else change) > tolerance:
+            regressions.append(
+                f"{result['api']} (payload_bytes={result['payload_bytes']}): {name} {value} "
+                f"vs baseline {baseline_metrics[name]} ({change:+.1%})"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api", choices=APIS, action="append", help="Defaults to all of them.")
+    parser.add_argument("-n", type=int, default=2_000, help="Number of inputs per run.")
+    parser.add_argument(
+        "--payload-bytes", type=int, action="append", help="Size of the argument and the result. Defaults to 1024."
+    )
+    parser.add_argument("--jitter", type=float, default=0.0, help="Max random delay (s) added to each map RPC.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of inputs that raise.")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="Also report peak traced Python allocations (slows runs down)."
+    )
+    parser.add_argument("--baseline", help="Output of an earlier run to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="Allowed regression against --baseline, as a fraction."
+    )
+    args = parser.parse_args(argv)
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    regressions: list[str] = []
+
+    for payload_bytes in args.payload_bytes or [1024]:
+        for api in args.api or APIS:
+            if args.trace_memory:
+                tracemalloc.start()
+            result = run(api, args.n, payload_bytes, args.jitter, args.error_rate)
+            if args.trace_memory:
+                result["peak_traced_mib"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+                tracemalloc.stop()
+            # Peak resident set size of the whole process (including the mock servicer), in KiB on Linux.
+            result["max_rss_mib"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+            print(json.dumps(result), flush=True)
+            if baseline is not None:
+                if _run_key(result) in baseline:
+                    regressions += compare(result, baseline[_run_key(result)], args.tolerance)
+                else:
+                    print(f"No baseline for {result['api']} (payload_bytes={payload_bytes})", file=sys.stderr)
+
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,17 @@
 # Copyright Modal Labs 2022
 
+import asyncio
+import mmap
 import pytest
 import random
+import time
 
+from modal._utils import blob_utils
 from modal._utils.async_utils import synchronize_api
 from modal._utils.blob_utils import (
+    MultiBufferReader,
     blob_download as _blob_download,
+    blob_download_buffer as _blob_download_buffer,
     blob_upload as _blob_upload,
     blob_upload_file as _blob_upload_file,
 )
@@ -15,6 +21,7 @@ from .supports.skip import skip_old_py
 
 blob_upload = synchronize_api(_blob_upload)
 blob_download = synchronize_api(_blob_download)
+blob_download_buffer = synchronize_api(_blob_download_buffer)
 blob_upload_file = synchronize_api(_blob_upload_file)
 
 
@@ -26,6 +33,7 @@ async def test_blob_put_get(servicer, blob_server, client):
     # Download
     data = await blob_download.aio(blob_id, client.stub)
     assert data == b"Hello, world"
+    assert data.readonly  # A view of the downloaded buffer, which may be shared through the cache.
 
 
 @pytest.mark.asyncio
@@ -40,6 +48,56 @@ async def test_blob_get_failure(servicer, blob_server, client):
         await blob_download.aio("bl-failure", client.stub)
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_mmap", [False, True])
+async def test_blob_download_buffer(servicer, blob_server, client, monkeypatch, use_mmap):
+    if use_mmap:
+        monkeypatch.setattr("modal._utils.blob_utils.BLOB_DOWNLOAD_MMAP_THRESHOLD", 1)
+    data = random.randbytes(1_000_000)
+    blob_id = await blob_upload.aio(data, client.stub)
+
+    buf = await blob_download_buffer.aio(blob_id, client.stub)
+    assert buf == data
+    assert not buf.readonly
+    assert isinstance(buf.obj, mmap.mmap) == use_mmap
+
+    with pytest.raises(ExecutionError):
+        await blob_download_buffer.aio("bl-failure", client.stub)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("data_len", [0, 1, 1024, 1025, 10 * 1024 + 1])
+async def test_blob_download_parts(servicer, blob_server, client, monkeypatch, data_len):
+    monkeypatch.setattr("modal._utils.blob_utils.BLOB_DOWNLOAD_PART_SIZE", 1024)
+    data = random.randbytes(data_len)
+    blob_id = await blob_upload.aio(data, client.stub)
+    assert await blob_download_buffer.aio(blob_id, client.stub) == data
+    assert await blob_download.aio(blob_id, client.stub) == data
+
+
+@pytest.mark.asyncio
+async def test_blob_download_part_retry(servicer, blob_server, client, monkeypatch):
+    monkeypatch.setattr("modal._utils.blob_utils.BLOB_DOWNLOAD_PART_SIZE", 1024)
+    data = random.randbytes(10 * 1024)
+    blob_id = await blob_upload.aio(data, client.stub)
+
+    # Fail the fourth part once; only that part should be downloaded again.
+    reads = []
+    read_response_into = blob_utils._read_response_into
+
+    async def flaky_read_response_into(s3_resp, buf):
+        content_range = s3_resp.headers["Content-Range"]
+        reads.append(content_range)
+        if content_range == "bytes 3072-4095/10240" and reads.count(content_range) == 1:
+            raise ExecutionError("connection reset")
+        await read_response_into(s3_resp, buf)
+
+    monkeypatch.setattr("modal._utils.blob_utils._read_response_into", flaky_read_response_into)
+    assert await blob_download_buffer.aio(blob_id, client.stub) == data
+    assert len(reads) == 11
+    assert reads.count("bytes 3072-4095/10240") == 2
+
+
 @pytest.mark.asyncio
 async def test_blob_large(servicer, blob_server, client):
     data = b"*" * 10_000_000
@@ -71,3 +129,71 @@ async def test_blob_multipart(servicer, blob_server, client, monkeypatch, tmp_pa
 def test_sync(blob_server, client):
     # just tests that tests running blocking calls that upload to blob storage don't deadlock
     blob_upload(b"adsfadsf", client.stub)
+
+
+@pytest.mark.asyncio
+async def test_blob_upload_buffers(servicer, blob_server, client, monkeypatch):
+    frames = [memoryview(b"header"), memoryview(b""), memoryview(random.randbytes(10_000)), memoryview(b"tail")]
+    blob_id = await blob_upload.aio(frames, client.stub)
+    assert await blob_download.aio(blob_id, client.stub) == b"".join(frames)
+
+    # Multipart uploads read each part through its own view of the buffers.
+    monkeypatch.setattr("modal._utils.blob_utils.DEFAULT_SEGMENT_CHUNK_SIZE", 128)
+    servicer.blob_multipart_threshold = 1024
+    blob_id = await blob_upload.aio(frames, client.stub)
+    assert await blob_download.aio(blob_id, client.stub) == b"".join(frames)
+
+
+@pytest.mark.asyncio
+async def test_blob_upload_cache(servicer, blob_server, client, monkeypatch):
+    monkeypatch.setenv("MODAL_BLOB_CACHE_TTL", "600")
+    _, blobs, _, _ = blob_server
+    data = random.randbytes(10_000)
+    blob_id = await blob_upload.aio(data, client.stub)
+    assert await blob_upload.aio(data, client.stub) == blob_id
+    # Concurrent uploads of the same content wait for the first one.
+    other_data = random.randbytes(10_000)
+    other_blob_ids = await asyncio.gather(*(blob_upload.aio(other_data, client.stub) for _ in range(5)))
+    assert len(set(other_blob_ids)) == 1
+    assert len(blobs) == 2
+
+    # Entries expire after the TTL.
+    monotonic = time.monotonic
+    monkeypatch.setattr("time.monotonic", lambda: monotonic() + 601)
+    assert await blob_upload.aio(data, client.stub) != blob_id
+    assert len(blobs) == 3
+
+
+@pytest.mark.asyncio
+async def test_blob_upload_cache_disabled(servicer, blob_server, client):
+    # Identical uploads aren't deduplicated by default.
+    _, blobs, _, _ = blob_server
+    data = random.randbytes(10_000)
+    assert await blob_upload.aio(data, client.stub) != await blob_upload.aio(data, client.stub)
+    assert len(blobs) == 2
+
+
+@pytest.mark.asyncio
+async def test_blob_download_cache(servicer, blob_server, client, monkeypatch):
+    monkeypatch.setenv("MODAL_BLOB_DOWNLOAD_CACHE_SIZE", "15000")
+    _, blobs, _, _ = blob_server
+    blob_ids = [await blob_upload.aio(random.randbytes(10_000), client.stub) for _ in range(2)]
+    data = [await blob_download.aio(blob_id, client.stub) for blob_id in blob_ids]
+
+    # Only the most recent download fits in the cache.
+    blobs.clear()
+    assert await blob_download.aio(blob_ids[1], client.stub) == data[1]
+    with pytest.raises(ExecutionError):
+        await blob_download.aio(blob_ids[0], client.stub)
+
+
+def test_multi_buffer_reader():
+    reader = MultiBufferReader([memoryview(b"abc"), memoryview(b""), memoryview(b"defgh")])
+    assert reader.read(2) == b"ab"
+    assert reader.read(3) == b"cde"
+    assert reader.read() == b"fgh"
+    assert reader.read() == b""
+    reader.seek(-4, 2)
+    assert reader.tell() == 4
+    assert reader.clone().read() == b"abcdefgh"
+    assert reader.read(100) == b"efgh"
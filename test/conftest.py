@@ -38,7 +38,7 @@ from grpclib.events import RecvRequest, listen
 from modal import __version__, config
 from modal._functions import _Function
 from modal._runtime.container_io_manager import _ContainerIOManager
-from modal._serialization import deserialize, deserialize_params, serialize_data_format
+from modal._serialization import deserialize_data_format, deserialize_params, serialize_data_format
 from modal._utils.async_utils import asyncify, synchronize_api
 from modal._utils.blob_utils import BLOCK_SIZE, MAX_OBJECT_SIZE_BYTES
 from modal._utils.grpc_testing import patch_mock_servicer
@@ -343,6 +343,11 @@ class MockClientServicer(api_grpc.ModalClientBase):
         # Some way to decorate `stream.send_message`.
         self.resp_jitter_secs = secs
 
+    async def _resp_jitter(self) -> None:
+        # Only applied to the handlers on the map hot path (and AppClientDisconnect), see set_resp_jitter.
+        if self.resp_jitter_secs:
+            await asyncio.sleep(random.uniform(0.0, self.resp_jitter_secs))
+
     async def recv_request(self, event: RecvRequest):
         # Make sure metadata is correct
         self.last_metadata = event.metadata
@@ -1228,6 +1233,7 @@ class MockClientServicer(api_grpc.ModalClientBase):
                 )
             )
 
+        await self._resp_jitter()
         await stream.send_message(
             api_pb2.FunctionMapResponse(
                 function_call_id=function_call_id,
@@ -1246,9 +1252,11 @@ class MockClientServicer(api_grpc.ModalClientBase):
         input_jwts = []
         for item in request.inputs:
             if item.input.WhichOneof("args_oneof") == "args":
-                args, kwargs = deserialize(item.input.args, None)
+                args, kwargs = deserialize_data_format(item.input.args, item.input.data_format, None)
             else:
-                args, kwargs = deserialize(self.blobs[item.input.args_blob_id], None)
+                args, kwargs = deserialize_data_format(
+                    self.blobs[item.input.args_blob_id], item.input.data_format, None
+                )
             self.n_inputs += 1
             idx, input_id, function_call_id, _, _ = decode_input_jwt(item.input_jwt)
             input_jwts.append(encode_input_jwt(idx, input_id, function_call_id, self.next_entry_id(), item.retry_count))
@@ -1279,6 +1287,7 @@ class MockClientServicer(api_grpc.ModalClientBase):
             self.add_function_call_input(request.function_call_id, item, input_id, 0)
         if self.slow_put_inputs:
             await asyncio.sleep(0.001)
+        await self._resp_jitter()
         await stream.send_message(api_pb2.FunctionPutInputsResponse(inputs=response_items))
 
     async def FunctionFinishInputs(self, stream):
@@ -1294,9 +1303,9 @@ class MockClientServicer(api_grpc.ModalClientBase):
 
     def add_function_call_input(self, function_call_id, item: api_pb2.FunctionPutInputsItem, input_id, retry_count):
         if item.input.WhichOneof("args_oneof") == "args":
-            args, kwargs = deserialize(item.input.args, None)
+            args, kwargs = deserialize_data_format(item.input.args, item.input.data_format, None)
         else:
-            args, kwargs = deserialize(self.blobs[item.input.args_blob_id], None)
+            args, kwargs = deserialize_data_format(self.blobs[item.input.args_blob_id], item.input.data_format, None)
         function_call_inputs = self.function_call_inputs.setdefault(function_call_id, [])
         function_call_inputs.append(((item.idx, input_id, retry_count), (args, kwargs)))
         self.function_call_inputs_update_event.set()
@@ -1374,6 +1383,7 @@ class MockClientServicer(api_grpc.ModalClientBase):
                     retry_count=retry_count,
                 )
 
+            await self._resp_jitter()
             await stream.send_message(api_pb2.FunctionGetOutputsResponse(outputs=[output]))
         else:
             # wait for there to be at least one input, since that will allow a subsequent call to
@@ -2509,8 +2519,8 @@ class MockClientServicer(api_grpc.ModalClientBase):
         await stream.send_message(api_pb2.MapCheckInputsResponse(lost=lost))
 
 
-@pytest.fixture
-def blob_server():
+@contextlib.contextmanager
+def run_blob_server():
     blobs = {}
     blob_parts: dict[str, dict[int, bytes]] = defaultdict(dict)
     blocks = {}
@@ -2549,7 +2559,16 @@ def blob_server():
         blob_id = request.query["blob_id"]
         if blob_id == "bl-failure":
             return aiohttp.web.Response(status=500)
-        return aiohttp.web.Response(body=blobs[blob_id])
+        blob = blobs[blob_id]
+        if "Range" not in request.headers:
+            return aiohttp.web.Response(body=blob)
+        start = request.http_range.start or 0
+        stop = min(len(blob), request.http_range.stop or len(blob))
+        if start >= len(blob):
+            return aiohttp.web.Response(status=416)
+        return aiohttp.web.Response(
+            status=206, body=blob[start:stop], headers={"Content-Range": f"bytes {start}-{stop - 1}/{len(blob)}"}
+        )
 
     async def put_block(request):
         token = request.match_info["token"]
@@ -2629,9 +2648,17 @@ def blob_server():
     thread = threading.Thread(target=run_server_other_thread)
     thread.start()
     started.wait()
-    yield host, blobs, blocks, files_sha2data
-    stop_server.set()
-    thread.join()
+    try:
+        yield host, blobs, blocks, files_sha2data
+    finally:
+        stop_server.set()
+        thread.join()
+
+
+@pytest.fixture
+def blob_server():
+    with run_blob_server() as blob_server:
+        yield blob_server
 
 
 @pytest_asyncio.fixture(scope="function")
@@ -27,9 +27,11 @@ from modal import Client, Queue, Volume, is_local
 from modal._container_entrypoint import UserException, main
 from modal._runtime import asgi
 from modal._runtime.container_io_manager import (
+    ConcurrencyController,
     ContainerIOManager,
     InputSlots,
     IOContext,
+    OutputFlusher,
 )
 from modal._runtime.user_code_imports import FinalizedFunction
 from modal._serialization import (
@@ -71,15 +73,16 @@ def _get_inputs(
     method_name: Optional[str] = None,
     upload_to_blob: bool = False,
     client: Optional[Client] = None,
+    data_format: "api_pb2.DataFormat.ValueType" = api_pb2.DATA_FORMAT_PICKLE,
 ) -> list[api_pb2.FunctionGetInputsResponse]:
     if upload_to_blob:
-        args_blob_id = blob_upload(serialize(args), client.stub)
+        args_blob_id = blob_upload(serialize_data_format(args, data_format), client.stub)
         input_pb = api_pb2.FunctionInput(
-            args_blob_id=args_blob_id, data_format=api_pb2.DATA_FORMAT_PICKLE, method_name=method_name or ""
+            args_blob_id=args_blob_id, data_format=data_format, method_name=method_name or ""
         )
     else:
         input_pb = api_pb2.FunctionInput(
-            args=serialize(args), data_format=api_pb2.DATA_FORMAT_PICKLE, method_name=method_name or ""
+            args=serialize_data_format(args, data_format), data_format=data_format, method_name=method_name or ""
         )
     inputs = [
         *(
@@ -493,6 +496,33 @@ def test_generator_failure(servicer, capsys):
     assert 'raise Exception("bad")' in capsys.readouterr().err
 
 
+@skip_github_non_linux
+@pytest.mark.parametrize("upload_concurrency", ["1", "4"])
+def test_generator_blob_outputs(servicer, client, monkeypatch, upload_concurrency):
+    monkeypatch.setenv("MODAL_GENERATOR_UPLOAD_CONCURRENCY", upload_concurrency)
+    # Small squares are sent inline, larger ones are uploaded to blob storage.
+    monkeypatch.setattr("modal._runtime.container_io_manager.MAX_OBJECT_SIZE_BYTES", 5)
+    ret = _run_container(
+        servicer,
+        "test.supports.functions",
+        "gen_n",
+        function_type=api_pb2.Function.FUNCTION_TYPE_GENERATOR,
+    )
+
+    assert [chunk.index for chunk in ret.data_chunks] == list(range(1, 43))
+    assert [bool(chunk.data_blob_id) for chunk in ret.data_chunks] == [i >= 16 for i in range(42)]
+    values = [
+        deserialize_data_format(
+            blob_download(chunk.data_blob_id, client.stub) if chunk.data_blob_id else chunk.data,
+            chunk.data_format,
+            None,
+        )
+        for chunk in ret.data_chunks
+    ]
+    assert values == [i**2 for i in range(42)]
+    assert ret.items[0].data_format == api_pb2.DATA_FORMAT_GENERATOR_DONE
+
+
 @skip_github_non_linux
 @pytest.mark.usefixtures("server_url_env")
 def test_generator_failure_async_cleanup(servicer, tmp_path, client):
@@ -1925,6 +1955,48 @@ def test_cancellation_aborts_current_input_on_match(
     assert duration < 10  # should typically be < 1s, but for some reason in gh actions, it takes a really long time!
 
 
+@skip_github_non_linux
+def test_input_prefetch(servicer, monkeypatch):
+    monkeypatch.setenv("MODAL_INPUT_PREFETCH", "4")
+    ret = _run_container(servicer, "test.supports.functions", "square", inputs=_get_inputs(n=10))
+    assert [deserialize(item.result.data, ret.client) for item in ret.items] == [42**2] * 10
+
+
+@skip_github_non_linux
+@pytest.mark.usefixtures("server_url_env")
+def test_cancellation_of_prefetched_input(tmp_path, servicer):
+    with servicer.input_lockstep() as input_lock:
+        container_process = _run_container_process(
+            servicer,
+            tmp_path,
+            "test.supports.functions",
+            "delay",
+            inputs=[("", (arg,), {}) for arg in [0.01, 2, 0.02]],
+            env={"MODAL_INPUT_PREFETCH": "4"},
+        )
+        time.sleep(1)
+        input_lock.wait()
+        input_lock.wait()
+        # The third input is fetched while the second one is running.
+        input_lock.wait()
+    time.sleep(0.1)
+    assert len(_flatten_outputs(servicer.container_outputs)) == 1
+
+    servicer.container_heartbeat_return_now(
+        api_pb2.ContainerHeartbeatResponse(cancel_input_event=api_pb2.CancelInputEvent(input_ids=["in-002"]))
+    )
+    stdout, stderr = container_process.communicate()
+    assert "Traceback" not in stderr.decode()
+    assert container_process.returncode == 0
+
+    items = {item.input_id: item for item in _flatten_outputs(servicer.container_outputs)}
+    assert items.keys() == {"in-000", "in-001", "in-002"}
+    assert deserialize(items["in-001"].result.data, client=None) == 2
+    # The cancelled input never started, and the container didn't wait for the second input to finish it.
+    assert items["in-002"].result.status == api_pb2.GenericResult.GENERIC_STATUS_TERMINATED
+    assert items["in-002"].output_created_at < items["in-001"].output_created_at
+
+
 @skip_github_non_linux
 @pytest.mark.usefixtures("server_url_env")
 def test_cancellation_stops_subset_of_async_concurrent_inputs(servicer, tmp_path):
@@ -2011,7 +2083,9 @@ def test_cancellation_stops_task_with_concurrent_inputs(servicer, tmp_path):
 
 
 @skip_github_non_linux
-def test_inputs_outputs_with_blob_id(servicer, client, monkeypatch):
+@pytest.mark.parametrize("deserialize_in_thread", ["0", "1"])
+def test_inputs_outputs_with_blob_id(servicer, client, monkeypatch, deserialize_in_thread):
+    monkeypatch.setenv("MODAL_DESERIALIZE_INPUTS_IN_THREAD", deserialize_in_thread)
     monkeypatch.setattr("modal._runtime.container_io_manager.MAX_OBJECT_SIZE_BYTES", 0)
     ret = _run_container(
         servicer,
@@ -2022,6 +2096,48 @@ def test_inputs_outputs_with_blob_id(servicer, client, monkeypatch):
     assert _unwrap_blob_scalar(ret, client) == 42
 
 
+@skip_github_non_linux
+@pytest.mark.parametrize("upload_to_blob", [False, True])
+def test_inputs_outputs_pickle_oob(servicer, client, monkeypatch, upload_to_blob):
+    if upload_to_blob:
+        monkeypatch.setattr("modal._runtime.container_io_manager.MAX_OBJECT_SIZE_BYTES", 0)
+    data = bytearray(b"*" * 1_000_000)
+    ret = _run_container(
+        servicer,
+        "test.supports.functions",
+        "ident",
+        inputs=_get_inputs(
+            ((pickle.PickleBuffer(data),), {}),
+            upload_to_blob=upload_to_blob,
+            client=client,
+            data_format=api_pb2.DATA_FORMAT_PICKLE_OOB,
+        ),
+    )
+    # Outputs use the same format as the inputs.
+    assert len(ret.items) == 1
+    assert ret.items[0].data_format == api_pb2.DATA_FORMAT_PICKLE_OOB
+    result = ret.items[0].result
+    payload = blob_download(result.data_blob_id, client.stub) if upload_to_blob else result.data
+    assert deserialize_data_format(payload, api_pb2.DATA_FORMAT_PICKLE_OOB, ret.client) == data
+
+
+@skip_github_non_linux
+def test_inputs_outputs_compressed(servicer):
+    data = "modal " * 100_000
+    ret = _run_container(
+        servicer,
+        "test.supports.functions",
+        "ident",
+        inputs=_get_inputs(((data,), {}), data_format=api_pb2.DATA_FORMAT_PICKLE_COMPRESSED),
+    )
+    # Outputs use the same format as the inputs.
+    assert len(ret.items) == 1
+    assert ret.items[0].data_format == api_pb2.DATA_FORMAT_PICKLE_COMPRESSED
+    payload = ret.items[0].result.data
+    assert len(payload) < len(data) // 10
+    assert deserialize_data_format(payload, api_pb2.DATA_FORMAT_PICKLE_COMPRESSED, ret.client) == data
+
+
 @skip_github_non_linux
 @pytest.mark.usefixtures("server_url_env")
 def test_lifecycle_full(servicer, tmp_path):
@@ -2453,6 +2569,124 @@ async def test_input_slots():
     assert slots.value == 10
 
 
+@pytest.mark.asyncio
+async def test_output_flusher():
+    sent: list[list[str]] = []
+    unblock = asyncio.Event()
+
+    async def put_outputs(outputs):
+        sent.append([output.input_id for output in outputs])
+        await unblock.wait()
+
+    flusher = OutputFlusher(put_outputs)
+    run_task = asyncio.create_task(flusher.run())
+    flusher.put([api_pb2.FunctionPutOutputsItem(input_id="in-0")])
+    await asyncio.sleep(0.01)
+    # Outputs queued while a request is in flight are sent together in the next one.
+    for i in range(1, 4):
+        flusher.put([api_pb2.FunctionPutOutputsItem(input_id=f"in-{i}")])
+    assert sent == [["in-0"]]
+    unblock.set()
+    await flusher.close()
+    await run_task
+    assert sent == [["in-0"], ["in-1", "in-2", "in-3"]]
+
+    # With a linger, outputs wait for others even if no request is in flight.
+    sent.clear()
+    flusher = OutputFlusher(put_outputs, linger=0.05)
+    run_task = asyncio.create_task(flusher.run())
+    flusher.put([api_pb2.FunctionPutOutputsItem(input_id="in-0")])
+    await asyncio.sleep(0.01)
+    flusher.put([api_pb2.FunctionPutOutputsItem(input_id="in-1")])
+    await asyncio.sleep(0.1)
+    assert sent == [["in-0", "in-1"]]
+    await flusher.close()
+    await run_task
+
+
+def test_concurrency_controller():
+    controller = ConcurrencyController(2, 10, smoothing=1.0)
+    assert controller.get_concurrency() == 2
+
+    # Grows while all slots are busy and latency holds steady.
+    controller.record_latency(1.0)
+    assert controller.update(active=2, loop_lag=0.0, cpu=0.5, memory=0.5) == 3
+    controller.record_latency(1.0)
+    assert controller.update(active=3, loop_lag=0.0, cpu=0.5, memory=None) == 5
+    # Doesn't grow while slots are free.
+    controller.record_latency(1.0)
+    assert controller.update(active=1, loop_lag=0.0, cpu=None, memory=None) == 5
+    assert controller.last_reason == "idle"
+
+    # Shrinks when latency goes up.
+    controller.record_latency(3.0)
+    assert controller.update(active=5, loop_lag=0.0, cpu=0.5, memory=0.5) < 5
+    assert controller.last_reason == "latency"
+
+    # Backs off right away under resource pressure, but not below the minimum.
+    controller.limit = 8.0
+    assert controller.update(active=8, loop_lag=0.5, cpu=0.5, memory=0.5) == 4
+    assert controller.last_reason == "loop_lag"
+    assert controller.update(active=4, loop_lag=0.0, cpu=0.95, memory=0.5) == 2
+    assert controller.update(active=2, loop_lag=0.0, cpu=0.5, memory=0.95) == 2
+    assert controller.last_reason == "memory"
+    assert controller.decreases == 3
+    assert "reason=memory" in controller.stats()
+
+
+@skip_github_non_linux
+def test_local_dynamic_concurrency(servicer, monkeypatch):
+    monkeypatch.setenv("MODAL_DYNAMIC_CONCURRENCY", "local")
+    monkeypatch.setattr("modal._runtime.container_io_manager.LOCAL_CONCURRENCY_INTERVAL_SECS", 0.2)
+    controllers: list[ConcurrencyController] = []
+
+    class RecordingController(ConcurrencyController):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            controllers.append(self)
+
+    monkeypatch.setattr("modal._runtime.container_io_manager.ConcurrencyController", RecordingController)
+    slot_values: list[int] = []
+    set_value = InputSlots.set_value
+
+    def record_set_value(self, value):
+        slot_values.append(value)
+        set_value(self, value)
+
+    monkeypatch.setattr(InputSlots, "set_value", record_set_value)
+    n_inputs = 12
+    ret = _run_container(
+        servicer,
+        "test.supports.functions",
+        "sleep_700_async",
+        inputs=_get_inputs(n=n_inputs),
+        target_concurrent_inputs=2,
+        max_concurrent_inputs=6,
+    )
+    assert sorted(item.input_id for item in ret.items) == sorted(f"in-xyz{i}" for i in range(n_inputs))
+    # The controller ran, and raised the number of input slots above the target, up to at most the max.
+    [controller] = controllers
+    assert controller.updates > 0 and controller.increases > 0
+    assert slot_values and 2 < max(slot_values) <= 6
+
+
+@skip_github_non_linux
+def test_concurrent_inputs_output_flusher(servicer, monkeypatch):
+    monkeypatch.setenv("MODAL_OUTPUT_FLUSHER", "1")
+    monkeypatch.setenv("MODAL_OUTPUT_FLUSH_LINGER", "0.1")
+    n_inputs = 18
+    ret = _run_container(
+        servicer,
+        "test.supports.functions",
+        "sleep_700_async",
+        inputs=_get_inputs(n=n_inputs),
+        max_concurrent_inputs=6,
+    )
+    assert sorted(item.input_id for item in ret.items) == sorted(f"in-xyz{i}" for i in range(n_inputs))
+    # Outputs of inputs that finish at the same time are sent together.
+    assert len(servicer.container_outputs) <= 6
+
+
 @skip_github_non_linux
 def test_max_concurrency(servicer):
     n_inputs = 5
@@ -2499,7 +2733,9 @@ def test_sandbox_infers_app(servicer, event_loop):
 
 
 @skip_github_non_linux
-def test_deserialization_error_returns_exception(servicer, client):
+@pytest.mark.parametrize("deserialize_in_thread", ["0", "1"])
+def test_deserialization_error_returns_exception(servicer, client, monkeypatch, deserialize_in_thread):
+    monkeypatch.setenv("MODAL_DESERIALIZE_INPUTS_IN_THREAD", deserialize_in_thread)
     inputs = [
         api_pb2.FunctionGetInputsResponse(
             inputs=[
@@ -1,18 +1,24 @@
 # Copyright Modal Labs 2022
 import asyncio
 import inspect
+import itertools
+import json
 import logging
 import os
+import pickle
 import pytest
 import time
 import typing
 from contextlib import contextmanager
+from types import SimpleNamespace
 
 from grpclib import Status
 from synchronicity.exceptions import UserCodeException
 
 import modal
 from modal import App, Image, NetworkFileSystem, Proxy, asgi_app, batched, fastapi_endpoint
+from modal._serialization import deserialize, deserialize_data_format
+from modal._utils import function_utils
 from modal._utils.async_utils import synchronize_api
 from modal._vendor import cloudpickle
 from modal.exception import DeprecationError, ExecutionError, InvalidError, NotFoundError
@@ -197,6 +203,10 @@ def _pow2(x: int):
     return x**2
 
 
+def _len(x: bytes):
+    return len(x)
+
+
 @contextmanager
 def synchronicity_loop_delay_tracker():
     done = False
@@ -571,6 +581,60 @@ def test_sync_parallelism(client, servicer):
         assert t1 - t0 < 0.6  # less than the combined runtime, make sure they run in parallel
 
 
+def test_function_call_as_completed(client, servicer, monkeypatch):
+    monkeypatch.setattr("modal._functions.FUNCTION_CALL_POLL_CONCURRENCY", 2)
+    monkeypatch.setattr("modal._functions.FUNCTION_CALL_POLL_TIMEOUT", 0)
+    app = App()
+
+    servicer.function_body(slo1)
+    slo1_modal = app.function()(slo1)
+    # Results by function call id; calls that are missing haven't finished yet.
+    results: dict[str, typing.Any] = {}
+
+    async def function_get_outputs(servicer, stream):
+        req = await stream.recv_message()
+        if req.function_call_id not in results:
+            await asyncio.sleep(0.01)
+            await stream.send_message(api_pb2.FunctionGetOutputsResponse(num_unfinished_inputs=1))
+            return
+        value = results[req.function_call_id]
+        if isinstance(value, Exception):
+            result = api_pb2.GenericResult(
+                status=api_pb2.GenericResult.GENERIC_STATUS_FAILURE,
+                data=cloudpickle.dumps(value),
+                exception=repr(value),
+            )
+        else:
+            result = api_pb2.GenericResult(
+                status=api_pb2.GenericResult.GENERIC_STATUS_SUCCESS, data=pickle.dumps(value)
+            )
+        item = api_pb2.FunctionGetOutputsItem(result=result, data_format=api_pb2.DATA_FORMAT_PICKLE)
+        await stream.send_message(api_pb2.FunctionGetOutputsResponse(outputs=[item]))
+
+    with app.run(client=client):
+        with servicer.intercept() as ctx:
+            ctx.set_responder("FunctionGetOutputs", function_get_outputs)
+
+            # The last call is outside the poll window, but is still yielded first when it finishes first.
+            fcs = [slo1_modal.spawn(i) for i in range(3)]
+            results[fcs[2].object_id] = 2
+            completed = FunctionCall.as_completed(*fcs)
+            assert next(completed) == (2, 2)
+            results[fcs[0].object_id] = 0
+            results[fcs[1].object_id] = 1
+            assert sorted(completed) == [(0, 0), (1, 1)]
+
+            # `gather` fails fast on an error outside the poll window, while the other calls are still running.
+            fcs = [slo1_modal.spawn(i) for i in range(3)]
+            results[fcs[2].object_id] = ValueError("boom")
+            with pytest.raises(ValueError, match="boom"):
+                FunctionCall.gather(*fcs)
+
+        fcs = [slo1_modal.spawn(0.01 * i) for i in range(10)]
+        assert FunctionCall.gather(*fcs) == [0.01 * i for i in range(10)]
+        assert list(FunctionCall.as_completed()) == []
+
+
 def test_proxy(client, servicer):
     app = App()
 
@@ -1143,6 +1207,91 @@ async def test_map_large_inputs(client, servicer, monkeypatch, blob_server):
     assert len(blobs) == 200  # inputs + outputs
 
 
+@pytest.mark.asyncio
+async def test_map_identical_large_inputs(client, servicer, blob_server, monkeypatch):
+    monkeypatch.setenv("MODAL_BLOB_CACHE_TTL", "600")
+    servicer.max_object_size_bytes = 1
+    app = App()
+    dummy_modal = app.function()(dummy)
+
+    _, blobs, _, _ = blob_server
+    async with app.run.aio(client=client):
+        assert [a async for a in dummy_modal.map.aio([3] * 20)] == [9] * 20
+
+    assert len(blobs) == 1  # identical inputs are only uploaded once
+
+
+@pytest.mark.asyncio
+async def test_map_pickle_oob(client, servicer, monkeypatch, blob_server):
+    monkeypatch.setenv("MODAL_PICKLE_OOB", "1")
+    servicer.max_object_size_bytes = 1
+    servicer.function_body(_len)
+    app = App()
+    len_modal = app.function()(_len)
+
+    _, blobs, _, _ = blob_server
+    inputs = [pickle.PickleBuffer(bytearray(100_000 + i)) for i in range(10)]
+    async with app.run.aio(client=client):
+        assert [a async for a in len_modal.map.aio(inputs)] == [100_000 + i for i in range(10)]
+
+    assert len(blobs) == 10
+    for blob in blobs.values():
+        (arg,), _ = deserialize_data_format(blob, api_pb2.DATA_FORMAT_PICKLE_OOB, None)
+        assert isinstance(arg, bytearray)
+
+
+def test_pickle_oob_only_for_local_functions(client, servicer, monkeypatch):
+    monkeypatch.setenv("MODAL_PICKLE_OOB", "1")
+    servicer.function_body(_len)
+    app = App()
+    len_modal = app.function(serialized=True, name="len_modal")(_len)
+    deploy_app(app, "dummy", client=client)
+
+    # Functions looked up by name may run a client that can't read out-of-band pickles.
+    len_lookup = Function.from_name("dummy", "len_modal").hydrate(client)
+    for f, data_format in [(len_modal, api_pb2.DATA_FORMAT_PICKLE_OOB), (len_lookup, api_pb2.DATA_FORMAT_PICKLE)]:
+        with servicer.intercept() as ctx:
+            assert f.remote(b"abc") == 3
+        req = ctx.pop_request("FunctionMap")
+        assert req.pipelined_inputs[0].input.data_format == data_format
+
+
+def test_compress_data_only_for_local_functions(client, servicer):
+    servicer.function_body(_len)
+    app = App()
+    len_modal = app.function(serialized=True, name="len_modal", compress_data=True)(_len)
+    deploy_app(app, "dummy", client=client)
+
+    # Functions looked up by name may run a client that can't read compressed pickles.
+    len_lookup = Function.from_name("dummy", "len_modal").hydrate(client)
+    len_lookup._compress_data = True
+    for f, data_format in [
+        (len_modal, api_pb2.DATA_FORMAT_PICKLE_COMPRESSED),
+        (len_lookup, api_pb2.DATA_FORMAT_PICKLE),
+    ]:
+        with servicer.intercept() as ctx:
+            assert f.remote(b"abc") == 3
+        req = ctx.pop_request("FunctionMap")
+        assert req.pipelined_inputs[0].input.data_format == data_format
+
+
+@pytest.mark.asyncio
+async def test_map_compress_data(client, servicer, blob_server):
+    servicer.max_object_size_bytes = 100_000
+    servicer.function_body(_len)
+    app = App()
+    len_modal = app.function(compress_data=True)(_len)
+
+    _, blobs, _, _ = blob_server
+    inputs = ["modal " * (50_000 + i) for i in range(10)]
+    async with app.run.aio(client=client):
+        assert [a async for a in len_modal.map.aio(inputs)] == [len(x) for x in inputs]
+        assert await len_modal.remote.aio(inputs[0]) == len(inputs[0])
+
+    # Inputs compress well enough to be sent inline, instead of through blob storage.
+    assert len(blobs) == 0
+
+
 @pytest.mark.asyncio
 async def test_non_aio_map_in_async_caller_error(client):
     dummy_function = app.function()(dummy)
@@ -1226,6 +1375,47 @@ def test_experimental_spawn_map_sync(set_env_client, servicer):
         assert fc1.get(index=2) == 9
 
 
+def test_experimental_spawn_map_journal(client, servicer, tmp_path, monkeypatch):
+    from modal.parallel_map import _SpawnMapJournal
+
+    monkeypatch.setattr("modal.parallel_map.SPAWN_MAP_INVOCATION_CHUNK_SIZE", 2)
+    journal = tmp_path / "journal.jsonl"
+    app = App()
+    dummy_function = app.function()(dummy)
+    with app.run(client=client):
+        with servicer.intercept() as ctx:
+            fc = dummy_function.experimental_spawn_map(range(10), journal=journal)
+        assert len(ctx.get_requests("FunctionMap")) == 1
+        assert fc.num_inputs() == 10
+
+        # Resuming a finished submission doesn't send anything, or even read the inputs.
+        with servicer.intercept() as ctx:
+            fc2 = dummy_function.experimental_spawn_map(itertools.count(), journal=journal)
+        assert fc2.object_id == fc.object_id
+        assert fc2.num_inputs() == 10
+        assert not ctx.get_requests("FunctionMap") and not ctx.get_requests("FunctionPutInputs")
+
+        # Simulate a crash after the first two chunks, in the middle of writing the third record.
+        lines = journal.read_bytes().splitlines(keepends=True)
+        acked = json.loads(lines[2])["end"]
+        journal.write_bytes(b"".join(lines[:3]) + b'{"start": ' + str(acked).encode() + b', "e')
+        with servicer.intercept() as ctx:
+            fc3 = dummy_function.experimental_spawn_map(range(10), journal=journal)
+        assert fc3.object_id == fc.object_id
+        assert not ctx.get_requests("FunctionMap")
+        resent = [item.idx for request in ctx.get_requests("FunctionPutInputs") for item in request.inputs]
+        assert resent == list(range(acked, 10))
+        assert ctx.pop_request("FunctionFinishInputs").num_inputs == 10
+
+    with pytest.raises(InvalidError, match="different Function"):
+        _SpawnMapJournal(journal, "fu-other")
+
+    # A new run of an ephemeral app has a new Function, so it can't resume the journal.
+    with app.run(client=client):
+        with pytest.raises(InvalidError, match="same deployed Function"):
+            dummy_function.experimental_spawn_map(range(10), journal=journal)
+
+
 def test_warn_on_local_volume_mount(client, servicer):
     vol = modal.Volume.from_name("my-vol")
     dummy_function = app.function(volumes={"/foo": vol})(dummy)
@@ -1406,6 +1596,492 @@ def test_map_retry_with_stream_terminated_error(client, servicer, monkeypatch, c
     assert not [r for r in caplog.records if r.levelno == logging.WARNING]
 
 
+def test_input_chunk_sizer():
+    from modal.parallel_map import _InputChunkSizer
+
+    sizer = _InputChunkSizer(32, target_latency=1.0)
+    assert sizer.get_chunk_size() == 32
+    sizer.record(32, latency=2.0)  # slow request halves the chunk size
+    assert sizer.get_chunk_size() == 16
+    sizer.record(3, latency=0.1)  # chunk wasn't full, so don't grow
+    assert sizer.get_chunk_size() == 16
+    sizer.record(16, latency=0.1)  # full and fast chunk grows additively
+    assert sizer.get_chunk_size() == 18
+    for _ in range(10):
+        sizer.record(sizer.get_chunk_size(), latency=0.1)
+    assert sizer.get_chunk_size() == 32  # capped at the max
+    assert "min_chunk_sent=3 max_chunk_sent=32" in sizer.stats()
+
+
+def test_output_window_sizer():
+    from modal.parallel_map import _OutputWindowSizer
+
+    sizer = _OutputWindowSizer(min_size=10, max_size=80)
+    assert sizer.get_window_size() == 80
+    sizer.record(80, poll_latency=0.1, handoff_latency=1.0)  # caller is slower than polling, so shrink
+    assert sizer.get_window_size() == 40
+    sizer.record(80, poll_latency=0.1, handoff_latency=1.0)
+    sizer.record(80, poll_latency=0.1, handoff_latency=1.0)
+    sizer.record(80, poll_latency=0.1, handoff_latency=1.0)
+    assert sizer.get_window_size() == 10  # capped at the min
+    sizer.record(3, poll_latency=1.0, handoff_latency=0.1)  # response wasn't full, so don't grow
+    assert sizer.get_window_size() == 10
+    sizer.record(10, poll_latency=1.0, handoff_latency=0.1)  # full and quickly consumed response doubles it
+    assert sizer.get_window_size() == 20
+    assert "min_window_size=10 polls=6" in sizer.stats()
+
+
+def test_map_unordered_outputs_not_blocked_by_slow_blob(client, servicer, monkeypatch):
+    servicer.use_blob_outputs = True
+    servicer.function_body(_pow2)
+    slow_blob_ids = []
+    blob_download_buffer = function_utils.blob_download_buffer
+
+    async def slow_first_blob_download_buffer(blob_id, stub):
+        if not slow_blob_ids:
+            slow_blob_ids.append(blob_id)
+            await asyncio.sleep(0.5)
+        return await blob_download_buffer(blob_id, stub)
+
+    monkeypatch.setattr("modal._utils.function_utils.blob_download_buffer", slow_first_blob_download_buffer)
+    app = App()
+    pow2 = app.function()(_pow2)
+    with app.run(client=client):
+        outputs = list(pow2.map(range(5), order_outputs=False))
+
+    assert sorted(outputs) == [0, 1, 4, 9, 16]
+    # The other outputs were fetched while the first blob was still downloading.
+    assert outputs[-1] == deserialize(servicer.blobs[slow_blob_ids[0]], None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("spill", [False, True])
+async def test_output_reorder_buffer(client, spill):
+    from modal.parallel_map import _OutputReorderBuffer
+
+    volume = modal.Volume.from_name("output-volume")
+    buffer = _OutputReorderBuffer(next_idx=0, window=3, spill=spill)
+    buffer.put(2, {"x": 2})
+    buffer.put(1, [1, volume])
+    assert list(buffer.pop_ready()) == []
+    assert len(buffer) == 2
+    assert (buffer.spilled_bytes > 0) == spill
+
+    # Input 3 is too far ahead of the next output to yield, so it has to wait.
+    wait_task = asyncio.create_task(buffer.wait_for_room(3))
+    await asyncio.sleep(0.01)
+    assert not wait_task.done()
+
+    buffer.put(0, None)
+    outputs = list(buffer.pop_ready())
+    assert outputs == [None, [1, volume], {"x": 2}]
+    # Modal objects in held outputs come back as the caller's own handles, even when they were spilled.
+    assert outputs[1][1] is volume
+    assert len(buffer) == 0
+    await asyncio.wait_for(wait_task, timeout=1)
+    assert "max_held=3" in buffer.stats()
+    buffer.close()
+
+
+@pytest.mark.parametrize("spill", ["0", "1"])
+def test_map_small_reorder_window(client, servicer, monkeypatch, spill):
+    monkeypatch.setenv("MODAL_MAP_REORDER_WINDOW", "2")
+    monkeypatch.setenv("MODAL_MAP_REORDER_SPILL", spill)
+    app = App()
+    pow2 = app.function()(_pow2)
+    servicer.function_body(_pow2)
+    with app.run(client=client):
+        assert list(pow2.map(range(20))) == [x**2 for x in range(20)]
+
+
+@pytest.mark.asyncio
+async def test_batched_input_feeder(monkeypatch):
+    from modal.parallel_map import _feed_raw_input_queue
+
+    monkeypatch.setattr("modal.parallel_map.MAP_FEED_BATCH_SIZE", 3)
+    monkeypatch.setenv("MODAL_MAP_FEED_MAX_DELAY", "0.05")
+    batches: asyncio.Queue = asyncio.Queue()
+
+    async def put(item):
+        await batches.put([item])
+
+    # Stands in for a SynchronizedQueue, recording each hop into the synchronicity thread.
+    queue = SimpleNamespace(put=SimpleNamespace(aio=put), put_many=SimpleNamespace(aio=batches.put))
+    stall = asyncio.Event()
+
+    async def input_gen():
+        for i in range(7):
+            yield i
+        await stall.wait()  # a slow input iterator still gets its earlier inputs handed over
+        yield 7
+
+    feed_task = asyncio.create_task(_feed_raw_input_queue(queue, input_gen(), {"k": 1}, "throughput"))
+    assert await batches.get() == [(0, {"k": 1}), (1, {"k": 1}), (2, {"k": 1})]
+    assert await batches.get() == [(3, {"k": 1}), (4, {"k": 1}), (5, {"k": 1})]
+    assert await asyncio.wait_for(batches.get(), timeout=1) == [(6, {"k": 1})]  # flushed after the max delay
+
+    stall.set()
+    await feed_task
+    assert await batches.get() == [(7, {"k": 1})]
+    assert await batches.get() == [None]
+
+
+@pytest.mark.asyncio
+async def test_batched_input_feeder_flush_failure(monkeypatch):
+    from modal.parallel_map import _feed_raw_input_queue
+
+    monkeypatch.setenv("MODAL_MAP_FEED_MAX_DELAY", "0.01")
+
+    handed_over: list = []
+
+    async def put_many(items):
+        if not handed_over:
+            handed_over.append(None)
+            raise RuntimeError("queue closed")
+        handed_over.extend(items)
+
+    queue = SimpleNamespace(put_many=SimpleNamespace(aio=put_many))
+
+    async def input_gen():
+        yield 0
+        await asyncio.sleep(0.1)  # the first input is flushed, and fails, while waiting for the next one
+        yield 1
+
+    # The input dropped by the failed timed flush makes the feeder fail, instead of the map waiting for it forever.
+    with pytest.raises(RuntimeError, match="queue closed"):
+        await asyncio.wait_for(_feed_raw_input_queue(queue, input_gen(), {}, "throughput"), timeout=1)
+
+
+@pytest.mark.parametrize("feed_mode", ["throughput", "latency"])
+def test_map_feed_mode(client, servicer, feed_mode):
+    app = App()
+    pow2 = app.function()(_pow2)
+    servicer.function_body(_pow2)
+    with app.run(client=client):
+        assert list(pow2.map(range(10), feed_mode=feed_mode)) == [x**2 for x in range(10)]
+        with pytest.raises(InvalidError, match="feed_mode"):
+            list(pow2.map(range(10), feed_mode="fast"))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("spill", ["0", "1"])
+async def test_feed_bounded_input_queue(monkeypatch, spill):
+    from modal.parallel_map import SynchronizedQueue, _feed_raw_input_queue
+
+    monkeypatch.setattr("modal.parallel_map.MAP_FEED_BATCH_SIZE", 3)
+    monkeypatch.setattr("modal.parallel_map.MAP_INPUT_SPILL_POLL_INTERVAL", 0.001)
+    monkeypatch.setenv("MODAL_MAP_FEED_MAX_DELAY", "0.001")
+    monkeypatch.setenv("MODAL_MAP_INPUT_SPILL", spill)
+    queue = SynchronizedQueue()
+    await queue.init.aio(4)
+    exhausted = asyncio.Event()
+
+    async def input_gen():
+        for i in range(20):
+            yield i
+        exhausted.set()
+
+    feed_task = asyncio.create_task(_feed_raw_input_queue(queue, input_gen(), {}, "throughput"))
+    # Nothing is read from the queue yet: without spill the input iterator has to wait, with spill it doesn't.
+    await asyncio.sleep(0.1)
+    assert exhausted.is_set() == (spill == "1")
+    assert await queue.room.aio() == 0
+
+    received = [await queue.get.aio() for _ in range(21)]
+    assert received == [(i, {}) for i in range(20)] + [None]
+    await asyncio.wait_for(feed_task, timeout=1)
+
+
+def test_input_spill_keeps_modal_objects(client):
+    from modal.parallel_map import _InputSpill
+
+    hydrated = modal.Dict.from_name("spilled-dict", create_if_missing=True)
+    hydrated.hydrate(client)
+    unhydrated = modal.Volume.from_name("spilled-volume")
+    spill = _InputSpill()
+    spill.push(((hydrated, [1, 2]), {"volume": unhydrated}))
+    spill.push(((3,), {}))
+    # Modal objects come back as the same handles, still bound to their client.
+    args, kwargs = spill.pop()
+    assert args[0] is hydrated and args[0].client is client
+    assert args[1] == [1, 2]
+    assert kwargs["volume"] is unhydrated
+    assert spill.pop() == ((3,), {})
+    spill.close()
+
+
+@pytest.mark.asyncio
+async def test_input_backlog():
+    from modal.parallel_map import _InputBacklog
+
+    backlog = _InputBacklog(max_inputs=3, max_bytes=100)
+    await backlog.add(60)
+    # Adding 50 more bytes would go over the limit.
+    add_task = asyncio.create_task(backlog.add(50))
+    await asyncio.sleep(0.01)
+    assert not add_task.done()
+    backlog.remove(1, 60)
+    await asyncio.wait_for(add_task, timeout=1)
+
+    # An input larger than the limit still gets through once the backlog is empty.
+    backlog.remove(1, 50)
+    await asyncio.wait_for(backlog.add(500), timeout=1)
+    backlog.remove(1, 500)
+
+    for _ in range(3):
+        await backlog.add(1)
+    add_task = asyncio.create_task(backlog.add(1))
+    await asyncio.sleep(0.01)
+    assert not add_task.done()
+    backlog.remove(3, 3)
+    await asyncio.wait_for(add_task, timeout=1)
+    assert backlog.stats() == "held=1 held_bytes=1 max_held_bytes=500"
+
+
+@pytest.mark.parametrize("spill", ["0", "1"])
+@pytest.mark.parametrize("input_plane", [False, True])
+def test_map_bounded_inputs(client, servicer, monkeypatch, spill, input_plane):
+    monkeypatch.setattr("modal.parallel_map.MAP_INPUT_QUEUE_SIZE", 3)
+    monkeypatch.setattr("modal.parallel_map.MAP_FEED_BATCH_SIZE", 5)
+    monkeypatch.setenv("MODAL_MAP_INPUT_BUFFER_BYTES", "100")
+    monkeypatch.setenv("MODAL_MAP_INPUT_SPILL", spill)
+    app = App()
+    options = {"experimental_options": {"input_plane_region": "us-east"}} if input_plane else {}
+    pow2 = app.function(**options)(_pow2)
+    servicer.function_body(_pow2)
+    with app.run(client=client):
+        assert list(pow2.map(range(50))) == [x**2 for x in range(50)]
+        pow2.spawn_map(range(50))
+
+
+class _FakeGetOutputs:
+    name = "FunctionGetOutputs"
+
+    def __init__(self):
+        self.requests = []
+        self.ready: dict[int, api_pb2.FunctionGetOutputsItem] = {}
+        self.changed = asyncio.Event()
+
+    async def __call__(self, request, metadata=None, timeout=None):
+        self.requests.append(request)
+        while not any(request.start_idx <= idx <= request.end_idx for idx in self.ready):
+            self.changed.clear()
+            await self.changed.wait()
+        outputs = [item for idx, item in self.ready.items() if request.start_idx <= idx <= request.end_idx]
+        return api_pb2.FunctionGetOutputsResponse(outputs=outputs)
+
+    def finish(self, idx):
+        self.ready[idx] = api_pb2.FunctionGetOutputsItem(idx=idx)
+        self.changed.set()
+
+
+@pytest.mark.asyncio
+async def test_output_poller_shares_polls():
+    from modal._functions import _OutputPoller
+
+    get_outputs = _FakeGetOutputs()
+    poller = _OutputPoller(SimpleNamespace(FunctionGetOutputs=get_outputs))
+    waiters = [
+        asyncio.create_task(poller.get_output("fc-1", idx, input_jwt=f"jwt-{idx}", clear_on_success=True))
+        for idx in range(3)
+    ]
+    await asyncio.sleep(0.01)
+    # The three waiters share one long poll.
+    assert poller.polls == 1
+    assert (get_outputs.requests[0].start_idx, get_outputs.requests[0].end_idx) == (0, 2)
+    assert get_outputs.requests[0].input_jwts == ["jwt-0", "jwt-1", "jwt-2"]
+
+    get_outputs.finish(1)
+    assert (await asyncio.wait_for(waiters[1], timeout=1)).idx == 1
+    await asyncio.sleep(0.01)
+    # Polls only cover indices that are still awaited.
+    assert poller.polls == 3
+    assert {(r.start_idx, r.end_idx, tuple(r.input_jwts)) for r in get_outputs.requests[1:]} == {
+        (0, 0, ("jwt-0",)),
+        (2, 2, ("jwt-2",)),
+    }
+    # Every waiter asked for its output to be cleared, so every poll does.
+    assert [r.clear_on_success for r in get_outputs.requests] == [True, True, True]
+
+    get_outputs.finish(0)
+    get_outputs.finish(2)
+    assert [item.idx for item in await asyncio.gather(*waiters)] == [0, 1, 2]
+    assert poller._calls == {}
+
+
+@pytest.mark.asyncio
+async def test_output_poller_merges_matching_clear_on_success():
+    from modal._functions import _OutputPoller
+
+    get_outputs = _FakeGetOutputs()
+    poller = _OutputPoller(SimpleNamespace(FunctionGetOutputs=get_outputs))
+    settings = [True, True, False]
+    waiters = [
+        asyncio.create_task(poller.get_output("fc-1", idx, clear_on_success=clear))
+        for idx, clear in enumerate(settings)
+    ]
+    await asyncio.sleep(0.01)
+    # Waiters that want their outputs cleared share a poll, but aren't merged with one that doesn't.
+    assert poller.polls == 2
+    assert sorted((r.start_idx, r.end_idx, r.clear_on_success) for r in get_outputs.requests) == [
+        (0, 1, True),
+        (2, 2, False),
+    ]
+    for idx in range(3):
+        get_outputs.finish(idx)
+    assert [item.idx for item in await asyncio.gather(*waiters)] == [0, 1, 2]
+    assert poller._calls == {}
+
+
+@pytest.mark.asyncio
+async def test_output_poller_cancelled_leader():
+    from modal._functions import _OutputPoller
+
+    get_outputs = _FakeGetOutputs()
+    poller = _OutputPoller(SimpleNamespace(FunctionGetOutputs=get_outputs))
+    leader = asyncio.create_task(poller.get_output("fc-1", 0))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(poller.get_output("fc-1", 1))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    await asyncio.sleep(0.01)
+    # The follower starts polling on its own when the leader goes away.
+    assert poller.polls == 2
+    get_outputs.finish(1)
+    assert (await asyncio.wait_for(follower, timeout=1)).idx == 1
+    assert poller._calls == {}
+
+
+@pytest.mark.asyncio
+async def test_remote_batching(client, servicer, monkeypatch):
+    monkeypatch.setenv("MODAL_REMOTE_BATCH_WINDOW", "0.05")
+    monkeypatch.setenv("MODAL_REMOTE_BATCH_SIZE", "4")
+    app = App()
+    f = app.function()(custom_exception_function)
+    servicer.function_body(custom_exception_function)
+    async with app.run.aio(client=client):
+        with servicer.intercept() as ctx:
+            results = await asyncio.gather(*(f.remote.aio(x) for x in range(6)), return_exceptions=True)
+        assert [str(r) if isinstance(r, CustomException) else r for r in results] == [0, 1, 4, 9, "bad", 25]
+        # The first four calls fill a batch, and the other two are sent when the window closes.
+        requests = ctx.get_requests("FunctionMap")
+        assert [len(r.pipelined_inputs) for r in requests] == [4, 2]
+        assert [[item.idx for item in r.pipelined_inputs] for r in requests] == [[0, 1, 2, 3], [0, 1]]
+
+        # A call on its own is sent as usual.
+        with servicer.intercept() as ctx:
+            assert await f.remote.aio(3) == 9
+        [request] = ctx.get_requests("FunctionMap")
+        assert request.function_call_type == api_pb2.FUNCTION_CALL_TYPE_UNARY
+
+
+@pytest.mark.asyncio
+async def test_remote_batching_cancelled_call(client, servicer, monkeypatch):
+    monkeypatch.setenv("MODAL_REMOTE_BATCH_WINDOW", "0.2")
+    monkeypatch.setenv("MODAL_REMOTE_BATCH_SIZE", "4")
+    app = App()
+    f = app.function()(custom_exception_function)
+    servicer.function_body(custom_exception_function)
+    async with app.run.aio(client=client):
+        with servicer.intercept() as ctx:
+            calls = [asyncio.create_task(f.remote.aio(x)) for x in (2, 3, 5)]
+            await asyncio.sleep(0.05)  # all three are waiting for their batch to be sent
+            calls[1].cancel()
+            assert await calls[0] == 4
+            assert await calls[2] == 25
+            with pytest.raises(asyncio.CancelledError):
+                await calls[1]
+        # The cancelled call isn't submitted.
+        [request] = ctx.get_requests("FunctionMap")
+        assert [item.idx for item in request.pipelined_inputs] == [0, 1]
+        assert [deserialize(item.input.args, client)[0] for item in request.pipelined_inputs] == [(2,), (5,)]
+
+        # A batch whose calls were all cancelled isn't sent at all.
+        with servicer.intercept() as ctx:
+            call = asyncio.create_task(f.remote.aio(7))
+            await asyncio.sleep(0.05)
+            call.cancel()
+            await asyncio.sleep(0.3)
+        assert not ctx.get_requests("FunctionMap")
+
+
+@pytest.mark.parametrize("input_plane", [False, True])
+def test_map_dedupe(client, servicer, input_plane):
+    app = App()
+    options = {"experimental_options": {"input_plane_region": "us-east"}} if input_plane else {}
+    f = app.function(**options)(custom_exception_function)
+    servicer.function_body(custom_exception_function)
+    inputs = [1, 2, 1, 4, 3, 2, 4, 1, 5, 1]
+    expected = [x * x if x != 4 else "bad" for x in inputs]
+    with app.run(client=client):
+        with servicer.intercept() as ctx:
+            outputs = list(f.map(inputs, dedupe=True, return_exceptions=True, wrap_returned_exceptions=False))
+        assert [str(o) if isinstance(o, CustomException) else o for o in outputs] == expected
+        sent = ctx.get_requests("MapStartOrContinue" if input_plane else "FunctionPutInputs")
+        assert sum(len(r.items if input_plane else r.inputs) for r in sent) == 5
+
+        outputs = f.map(
+            inputs, dedupe=True, order_outputs=False, return_exceptions=True, wrap_returned_exceptions=False
+        )
+        assert sorted(16 if isinstance(o, CustomException) else o for o in outputs) == sorted(x * x for x in inputs)
+
+        assert list(f.starmap([(3,), (3,)], dedupe=True)) == [9, 9]
+        with pytest.raises(CustomException):
+            list(f.map(inputs, dedupe=True))
+
+
+@pytest.mark.parametrize("order_outputs", [True, False])
+def test_map_deduplicator(order_outputs):
+    from modal.parallel_map import _MapDeduplicator
+
+    dedupe = _MapDeduplicator(order_outputs=order_outputs, first_idx=0)
+    assert [dedupe.add(x) for x in [b"a", b"b", b"a"]] == [True, True, False]
+    assert list(dedupe.fan_out(1, "B")) == ([] if order_outputs else ["B"])
+    assert list(dedupe.fan_out(0, "A")) == (["A", "B", "A"] if order_outputs else ["A", "A"])
+    # A duplicate whose result is already known, and one with an out-of-band buffer.
+    assert dedupe.add([memoryview(b"b")]) is False
+    assert list(dedupe.flush()) == ["B"]
+    assert dedupe.stats() == "distinct=2 duplicates=2"
+
+
+def test_map_input_chunks_respect_byte_limit(client, servicer, monkeypatch):
+    monkeypatch.setattr("modal.parallel_map.MAP_INVOCATION_CHUNK_MAX_BYTES", 1000)
+    app = App()
+    length = app.function()(_len)
+    servicer.function_body(_len)
+    with servicer.intercept() as ctx:
+        with app.run(client=client):
+            assert list(length.map([b"x" * 300] * 10)) == [300] * 10
+
+    put_inputs_requests = ctx.get_requests("FunctionPutInputs")
+    assert sum(len(r.inputs) for r in put_inputs_requests) == 10
+    for request in put_inputs_requests:
+        assert len(request.inputs) <= 3
+
+
+def test_map_serialize_workers(client, servicer):
+    app = App()
+    pow2 = app.function()(_pow2)
+    servicer.function_body(_pow2)
+    with app.run(client=client):
+        assert list(pow2.map(range(100), serialize_workers=4)) == [x**2 for x in range(100)]
+        assert list(pow2.starmap([(x,) for x in range(10)], serialize_workers=1)) == [x**2 for x in range(10)]
+        with pytest.raises(InvalidError, match="serialize_workers"):
+            list(pow2.map(range(3), serialize_workers=0))
+        with pytest.raises(InvalidError, match="serialize_workers"):
+            list(pow2.map(range(3), serialize_workers=True))
+
+
+@pytest.mark.asyncio
+async def test_map_serialize_workers_async(client, servicer):
+    app = App()
+    pow2 = app.function()(_pow2)
+    servicer.function_body(_pow2)
+    async with app.run(client=client):
+        res = [r async for r in pow2.map.aio(range(20), serialize_workers=2)]
+    assert res == [x**2 for x in range(20)]
+
+
 def test_batching_config(client, servicer):
     from test.supports.batching_config import CONFIG_VALS, app
 
@@ -1,15 +1,21 @@
 # Copyright Modal Labs 2023
 import functools
 import pytest
+import threading
 import time
 
 from grpclib import Status
 
 from modal import fastapi_endpoint, method
-from modal._serialization import serialize_data_format
+from modal._serialization import (
+    deserialize_data_format as serialization_deserialize_data_format,
+    serialize_data_format,
+)
 from modal._utils import async_utils
 from modal._utils.function_utils import (
+    DESERIALIZE_IN_THREAD_MIN_SIZE,
     FunctionInfo,
+    _process_result,
     _stream_function_call_data,
     callable_has_non_self_non_default_params,
     callable_has_non_self_params,
@@ -151,3 +157,24 @@ def has_global_ref():
 def test_global_variable_extraction(func):
     info = FunctionInfo(func)
     assert info.get_globals().get("GLOBAL_VARIABLE") == GLOBAL_VARIABLE
+
+
+@pytest.mark.asyncio
+async def test_process_result_deserializes_large_results_in_thread(monkeypatch):
+    threads = []
+
+    def deserialize_data_format(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return serialization_deserialize_data_format(*args, **kwargs)
+
+    monkeypatch.setattr("modal._utils.function_utils.deserialize_data_format", deserialize_data_format)
+    for value in [b"x" * DESERIALIZE_IN_THREAD_MIN_SIZE, b"small"]:
+        result = api_pb2.GenericResult(
+            status=api_pb2.GenericResult.GENERIC_STATUS_SUCCESS,
+            data=serialize_data_format(value, api_pb2.DATA_FORMAT_PICKLE),
+        )
+        assert await _process_result(result, api_pb2.DATA_FORMAT_PICKLE, None) == value
+
+    # The large result is unpickled off the event loop, the small one isn't worth the thread hop.
+    assert threads[0] is not threading.current_thread()
+    assert threads[1] is threading.current_thread()
@@ -281,3 +281,21 @@ async def test_get_outputs_completes_before_function_retry():
     response_items = [InputJwtData.of(i, 2).to_jwt() for i in range(count)]
     manager.handle_retry_response(response_items)
     assert len(manager) == 0
+
+
+@pytest.mark.asyncio
+async def test_lost_inputs_retry_budget(monkeypatch):
+    monkeypatch.setattr("modal.parallel_map.MAP_LOST_INPUT_RETRY_BUDGET", 3)
+    monkeypatch.setattr("modal.parallel_map.MAP_LOST_INPUT_RETRY_JITTER", 0)
+    await add_items()
+    await handle_put_inputs_response(_MapItemState.WAITING_FOR_OUTPUT)
+
+    await manager.handle_check_inputs_response([(i, True) for i in range(count)])
+    assert len(retry_queue) == 3
+    assert (manager.lost_inputs_retried, manager.lost_inputs_deferred) == (3, count - 3)
+    # Inputs over the budget are still waiting for output, so the next check round reports them again.
+    assert [idx for idx, _ in manager.get_input_idxs_waiting_for_output()] == list(range(3, count))
+
+    await manager.handle_check_inputs_response([(i, True) for i in range(3, count)])
+    assert len(retry_queue) == 6
+    assert manager.lost_inputs_retried == 6
@@ -1,18 +1,25 @@
 # Copyright Modal Labs 2022
 import inspect
+import pickle
 import pytest
 import random
 import typing
+import zlib
 
-from modal import Queue
+from modal import Queue, _serialization
 from modal._serialization import (
+    CompressionStats,
     apply_defaults,
     deserialize,
+    deserialize_compressed,
     deserialize_data_format,
+    deserialize_oob,
     deserialize_proto_params,
     get_callable_schema,
     serialize,
+    serialize_compressed,
     serialize_data_format,
+    serialize_oob,
     serialize_proto_params,
     signature_to_parameter_specs,
     validate_parameter_values,
@@ -57,6 +64,109 @@ async def test_asgi_roundtrip():
         assert asgi_obj == asgi_obj_roundtrip
 
 
+class _Buffered:
+    """Pickles its data as a `PickleBuffer` with protocol 5, like numpy arrays do."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce_ex__(self, protocol):
+        if protocol >= 5:
+            return _Buffered, (pickle.PickleBuffer(self.data),)
+        return _Buffered, (self.data,)
+
+
+@pytest.mark.parametrize("writable", [True, False])
+def test_oob_roundtrip(writable):
+    large = bytearray(random.randbytes(1_000_000))
+    small = bytearray(b"small")
+    frames = serialize_oob(((_Buffered(large), _Buffered(small)), {"x": 1}))
+
+    # Header, pickle stream, and only the large buffer out-of-band, still referencing the original memory.
+    assert len(frames) == 3
+    assert frames[2].obj is large
+
+    payload = b"".join(frames)
+    (large_rt, small_rt), kwargs = deserialize_oob(bytearray(payload) if writable else payload, None)
+    assert kwargs == {"x": 1}
+    assert bytes(large_rt.data) == large
+    assert bytes(small_rt.data) == small
+    # Buffers are always writable, just like after unpickling in-band.
+    assert not memoryview(large_rt.data).readonly
+
+    assert deserialize_data_format(payload, api_pb2.DATA_FORMAT_PICKLE_OOB, None)[1] == {"x": 1}
+    assert deserialize_data_format(
+        serialize_data_format(kwargs, api_pb2.DATA_FORMAT_PICKLE_OOB), api_pb2.DATA_FORMAT_PICKLE_OOB, None
+    ) == {"x": 1}
+
+
+def test_oob_malformed():
+    payload = b"".join(serialize_oob(_Buffered(bytearray(100_000))))
+    with pytest.raises(DeserializationError, match="unexpected length"):
+        deserialize_oob(payload[:-1], None)
+    with pytest.raises(DeserializationError, match="malformed header"):
+        deserialize_oob(b"\x01", None)
+
+
+def test_compressed_roundtrip():
+    stats = CompressionStats()
+    compressible = {"rows": [{"name": "modal", "value": i % 7} for i in range(10_000)]}
+    incompressible = random.randbytes(100_000)
+
+    payload = serialize_compressed(compressible, stats)
+    assert len(payload) < len(serialize(compressible)) // 4
+    assert deserialize_compressed(payload, None) == compressible
+    # Random data and small pickles are stored as is, just behind the codec byte.
+    assert serialize_compressed(incompressible, stats) == b"\x00" + serialize(incompressible)
+    assert serialize_compressed(42, stats) == b"\x00" + serialize(42)
+    assert (
+        deserialize_data_format(
+            serialize_data_format(incompressible, api_pb2.DATA_FORMAT_PICKLE_COMPRESSED),
+            api_pb2.DATA_FORMAT_PICKLE_COMPRESSED,
+            None,
+        )
+        == incompressible
+    )
+
+    assert stats.payloads == 3
+    assert stats.compressed_payloads == 1
+    assert stats.ratio() > 1
+
+
+def test_compressed_malformed():
+    with pytest.raises(DeserializationError, match="Unknown compression codec"):
+        deserialize_compressed(b"\x7f" + serialize(42), None)
+    with pytest.raises(DeserializationError, match="corrupt"):
+        deserialize_compressed(b"\x01" + serialize(42), None)
+    payload = serialize_compressed(list(range(100_000)))
+    assert payload[:1] == b"\x01"
+    with pytest.raises(DeserializationError, match="truncated"):
+        deserialize_compressed(payload[:-10], None)
+
+
+def test_compressed_size_limit(monkeypatch):
+    monkeypatch.setattr("modal._serialization.COMPRESSION_MAX_DECOMPRESSED_SIZE", 1_000_000)
+    # A few KiB that would decompress to 10 MB.
+    bomb = b"\x01" + zlib.compress(b"\x00" * 10_000_000)
+    assert len(bomb) < 20_000
+    with pytest.raises(DeserializationError, match="decompresses to more than 1000000 bytes"):
+        deserialize_compressed(bomb, None)
+
+
+def test_firewall_deserialize(monkeypatch):
+    monkeypatch.setattr("modal._serialization._firewall", None)
+    payload = serialize({"index": 1, "tags": ["a", "b"]})
+    assert deserialize(payload, None, use_firewall=True) == {"index": 1, "tags": ["a", "b"]}
+    firewall = _serialization._firewall
+    assert firewall is not None
+    # The firewall is constructed once, and reused for later results.
+    assert deserialize(bytearray(payload), None, use_firewall=True) == {"index": 1, "tags": ["a", "b"]}
+    assert _serialization._firewall is firewall
+
+    with pytest.raises(DeserializationError):
+        deserialize(pickle.dumps(print), None, use_firewall=True)
+
+
 def test_deserialization_error(client):
     # Curated object that we should not be able to deserialize
     obj = (
@@ -0,0 +1,176 @@
+# Copyright Modal Labs 2025
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+
+from grpclib import GRPCError, Status
+
+from modal import App
+from modal._utils import trace_utils
+from modal._utils.trace_utils import add_span_processor, current_span, remove_span_processor, span
+from modal.parallel_map import _traced_map
+
+
+class RecordingProcessor:
+    def __init__(self):
+        self.started = []
+        self.ended = []
+
+    def on_start(self, s):
+        self.started.append(s)
+
+    def on_end(self, s):
+        self.ended.append(s)
+
+
+@pytest.fixture
+def recorder():
+    processor = RecordingProcessor()
+    add_span_processor(processor)
+    yield processor
+    remove_span_processor(processor)
+
+
+def test_spans_are_noop_without_processors():
+    with span("outer", {"a": 1}) as s:
+        s.set_attribute("b", 2)
+        s.add("retries")
+        assert current_span() is s
+    assert s.attributes == {}
+
+
+@pytest.mark.asyncio
+async def test_span_nesting(recorder):
+    async def child(i):
+        with span("child", {"i": i}):
+            current_span().add("retries", i)
+
+    with pytest.raises(ValueError):
+        with span("root") as root:
+            # Tasks inherit the current span.
+            await asyncio.gather(child(1), child(2))
+            raise ValueError("boom")
+
+    assert [s.name for s in recorder.started] == ["root", "child", "child"]
+    children = [s for s in recorder.ended if s.name == "child"]
+    assert {s.parent_span_id for s in children} == {root.span_id}
+    assert {s.trace_id for s in children} == {root.trace_id}
+    assert sorted(s.attributes["retries"] for s in children) == [1, 2]
+    assert root.parent_span_id is None
+    assert root.status_code == "ERROR" and root.status_message == "ValueError: boom"
+    assert root.end_time_unix_nano >= root.start_time_unix_nano
+    assert trace_utils._current_span.get() is None
+
+
+def _square(x):
+    return x * x
+
+
+def test_trace_file(client, servicer, monkeypatch, tmp_path):
+    trace_file = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("MODAL_TRACE_FILE", str(trace_file))
+    app = App()
+    square = app.function()(_square)
+    servicer.function_body(_square)
+    with app.run(client=client):
+        assert square.remote(3) == 9
+        assert list(square.map(range(3))) == [0, 1, 4]
+    trace_utils._close_file_exporters()
+    assert trace_utils._file_exporters == {}
+
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    by_id = {s["span_id"]: s for s in spans}
+
+    def ancestors(s):
+        names = []
+        while s["parent_span_id"]:
+            s = by_id[s["parent_span_id"]]
+            names.append(s["name"])
+        return names
+
+    [call] = [s for s in spans if s["name"] == "modal.call"]
+    assert call["attributes"]["function.name"] == "_square"
+    [process_result] = [s for s in spans if s["name"] == "modal.process_result" and "modal.call" in ancestors(s)]
+    assert ancestors(process_result) == ["modal.invocation.run_function", "modal.call"]
+    assert process_result["attributes"]["result.bytes"] > 0
+    [serialize] = [s for s in spans if s["name"] == "modal.serialize"]
+    assert ancestors(serialize) == ["modal.invocation.create", "modal.call"]
+
+    [map_span] = [s for s in spans if s["name"] == "modal.map"]
+    assert map_span["attributes"]["inputs.created"] == 3
+    map_inputs = [s for s in spans if s["name"] == "modal.create_input" and ancestors(s) == ["modal.map"]]
+    assert sorted(s["attributes"]["input.idx"] for s in map_inputs) == [0, 1, 2]
+
+
+def test_file_span_exporter_close(tmp_path):
+    trace_file = tmp_path / "spans.jsonl"
+    with trace_utils.FileSpanExporter(str(trace_file)) as exporter:
+        exporter.on_end(trace_utils.Span("first", "t" * 32, None, {}))
+        # Every span is on disk as soon as it ends, without waiting for the file to be closed.
+        assert json.loads(trace_file.read_text())["name"] == "first"
+    # Spans that end after the exporter was closed are dropped.
+    exporter.on_end(trace_utils.Span("late", "t" * 32, None, {}))
+    exporter.close()
+    assert [json.loads(line)["name"] for line in trace_file.read_text().splitlines()] == ["first"]
+
+
+def test_opentelemetry_processor(monkeypatch):
+    pytest.importorskip("opentelemetry.trace")
+    monkeypatch.setenv("MODAL_TRACE_OTEL", "1")
+    with span("outer"):
+        with span("inner", {"bytes": 10, "ids": ["a"]}):
+            pass
+    # Every OpenTelemetry span that was started was also ended.
+    assert trace_utils._otel_processor._spans == {}
+
+
+def test_processors_resolved_once_per_trace(monkeypatch):
+    calls = []
+    active_processors = trace_utils._active_processors
+
+    def counting_active_processors():
+        calls.append(None)
+        return active_processors()
+
+    monkeypatch.setattr(trace_utils, "_active_processors", counting_active_processors)
+    with span("outer"):
+        with span("inner"):
+            assert current_span() is trace_utils._NOOP_SPAN
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_map_span_ends_on_failure(client, servicer, recorder):
+    app = App()
+    square = app.function()(_square)
+
+    async def failing_function_map(servicer, stream):
+        await stream.recv_message()
+        raise GRPCError(Status.INVALID_ARGUMENT, "bad map")
+
+    async with app.run.aio(client=client):
+        with servicer.intercept() as ctx:
+            ctx.set_responder("FunctionMap", failing_function_map)
+            with pytest.raises(GRPCError):
+                [x async for x in square.map.aio(range(3))]
+
+    [map_span] = [s for s in recorder.started if s.name == "modal.map"]
+    assert map_span in recorder.ended
+    assert map_span.status_code == "ERROR" and "bad map" in map_span.status_message
+
+
+@pytest.mark.asyncio
+async def test_map_span_ends_on_early_close(recorder):
+    @_traced_map
+    async def fake_map(function, *, map_span):
+        for i in range(3):
+            yield i
+
+    outputs = fake_map(SimpleNamespace(object_id="fu-123"))
+    assert await outputs.__anext__() == 0
+    await outputs.aclose()
+
+    [map_span] = recorder.ended
+    # A map that's closed before all outputs are yielded isn't reported as successful.
+    assert map_span.status_code == "ERROR" and map_span.status_message.startswith("GeneratorExit")